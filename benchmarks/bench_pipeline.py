@@ -0,0 +1,177 @@
+"""Offline end-to-end benchmark: ingest -> review -> publish.
+
+Starts local fakes for KIE, OpenAI and the Bot API (``benchmarks/fakes.py``), points the
+app at them and drives ``ingest_and_build_draft``, ``send_to_review`` and
+``publish_queue_tick`` against a throwaway SQLite database. No network, no credits.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pipeline --drafts 50 --concurrency 10 --kie 3:0.6 --openai 1:0.3
+
+Latencies are ``median[:sigma]`` in seconds (lognormal).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parents[1]
+_WORKDIR = Path(tempfile.mkdtemp(prefix="poster-bench-"))
+
+# Settings are read at import time: configure the app before importing it.
+os.environ.update(
+    {
+        "TELEGRAM_BOT_TOKEN": "123456:bench-token",
+        "DATABASE_URL": f"sqlite+aiosqlite:///{_WORKDIR / 'bench.db'}",
+        "ADMIN_REVIEW_CHAT_ID": "-1000000000001",
+        "DESTINATION_CHANNEL": "-1000000000002",
+        "KIE_API_KEY": "bench",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_PROXY": "",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    }
+)
+sys.path.insert(0, str(_ROOT))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+from benchmarks.fakes import FakeBotApi, FakeKie, FakeOpenAI, Latency  # noqa: E402
+from src.common.config import settings  # noqa: E402
+from src.common.logging import setup_logging  # noqa: E402
+from src.infra.db.base import async_session_maker  # noqa: E402
+from src.infra.db.init_db import init_db  # noqa: E402
+from src.infra.db.repositories import DraftRepo  # noqa: E402
+from src.infra.kie.client import KieClient  # noqa: E402
+from src.infra.openai.rewriter import OpenAIRewriter  # noqa: E402
+from src.usecases.ingest_and_build_draft import ingest_and_build_draft  # noqa: E402
+from src.usecases.publish_queue import publish_queue_tick  # noqa: E402
+from src.usecases.send_to_review import send_to_review  # noqa: E402
+
+_timings: dict[str, list[float]] = defaultdict(list)
+
+
+def _timed(stage: str, fn):
+    async def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _timings[stage].append(time.perf_counter() - t0)
+
+    return wrapper
+
+
+# Per-provider stage timings (the real clients run unchanged underneath).
+KieClient.generate = _timed("kie", KieClient.generate)  # type: ignore[method-assign]
+OpenAIRewriter.caption_from_image = _timed("openai", OpenAIRewriter.caption_from_image)  # type: ignore[method-assign]
+
+
+def _pct(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+async def _one(i: int, bot: Bot, sem: asyncio.Semaphore) -> None:
+    async with sem:
+        async with async_session_maker() as db:
+            t0 = time.perf_counter()
+            draft_id = await ingest_and_build_draft(
+                db=db,
+                source_chat_id=-1009000000000,
+                source_message_id=i,
+                original_text=f"Исходный пост #{i} ✨ вечерний город",
+                source_image_urls=[f"{settings.kie_api_base}/files/source_{i}.png"],
+            )
+            t1 = time.perf_counter()
+            await send_to_review(db=db, bot=bot, draft_id=draft_id)
+            t2 = time.perf_counter()
+            await DraftRepo(db).set_status(draft_id, "approved")
+            _timings["ingest"].append(t1 - t0)
+            _timings["review"].append(t2 - t1)
+
+
+async def run(args: argparse.Namespace) -> None:
+    kie = FakeKie(seed=1, task=Latency.parse(args.kie), create=Latency.parse(args.kie_create))
+    oai = FakeOpenAI(seed=2, latency=Latency.parse(args.openai))
+    tg = FakeBotApi(seed=3, latency=Latency.parse(args.bot))
+    for srv in (kie, oai, tg):
+        await srv.start()
+
+    settings.kie_api_base = kie.base_url
+    settings.kie_poll_interval_sec = args.poll_interval
+    settings.openai_base_url = f"{oai.base_url}/v1"
+    settings.publish_batch_size = args.drafts
+    settings.ingest_concurrency = args.concurrency
+    settings.kie_hedge_per_hour = args.hedge_per_hour
+    settings.kie_hedge_min_samples = args.hedge_min_samples
+
+    os.chdir(_WORKDIR)  # media goes to ./data/media
+    await init_db()
+    bot = Bot(token=settings.telegram_bot_token, session=AiohttpSession(api=TelegramAPIServer.from_base(tg.base_url)))
+
+    tracemalloc.start()
+    sem = asyncio.Semaphore(args.concurrency)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_one(i, bot, sem) for i in range(1, args.drafts + 1)))
+    t_ready = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    async with async_session_maker() as db:
+        published = await publish_queue_tick(db=db, bot=bot)
+    t_publish = time.perf_counter() - t1
+    _timings["publish"].append(t_publish / max(published, 1))
+    total = time.perf_counter() - t0
+    _cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    await bot.session.close()
+    for srv in (kie, oai, tg):
+        await srv.stop()
+
+    print(f"drafts={args.drafts} concurrency={args.concurrency} kie={args.kie} openai={args.openai} bot={args.bot}")
+    print(f"ready for review: {t_ready:.2f}s  ({args.drafts / t_ready * 60:.1f} drafts/min)")
+    print(f"published {published} in {t_publish:.2f}s; end-to-end {total:.2f}s ({published / total * 60:.1f} drafts/min)")
+    print(f"\n{'stage':<10}{'n':>6}{'p50, s':>10}{'p95, s':>10}{'max, s':>10}")
+    for stage in ("kie", "openai", "ingest", "review", "publish"):
+        vals = _timings.get(stage) or []
+        print(f"{stage:<10}{len(vals):>6}{_pct(vals, 50):>10.3f}{_pct(vals, 95):>10.3f}{max(vals, default=0):>10.3f}")
+    print(f"\nKIE calls: {dict(kie.calls)}")
+    print(f"OpenAI calls: {dict(oai.calls)}")
+    print(f"Bot API calls: {dict(tg.calls)}")
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak traced memory: {peak / 1024 / 1024:.1f} MiB; max RSS: {rss_mb:.1f} MiB")
+    print(f"workdir: {_WORKDIR}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--drafts", type=int, default=20)
+    p.add_argument("--concurrency", type=int, default=5)
+    p.add_argument("--kie", default="2:0.5", help="KIE task completion time, median[:sigma] seconds")
+    p.add_argument("--kie-create", default="0.05", help="KIE createTask latency")
+    p.add_argument("--openai", default="0.8:0.3", help="OpenAI response latency")
+    p.add_argument("--bot", default="0.03:0.3", help="Bot API latency per call")
+    p.add_argument("--poll-interval", type=float, default=0.25, help="KIE_POLL_INTERVAL_SEC for the run")
+    p.add_argument("--hedge-per-hour", type=int, default=0, help="KIE_HEDGE_PER_HOUR for the run (0 = no hedging)")
+    p.add_argument("--hedge-min-samples", type=int, default=10, help="KIE_HEDGE_MIN_SAMPLES for the run")
+    args = p.parse_args()
+    setup_logging()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Micro-benchmark: UTF-16 clipping/chunking in ``src.common.tg_text``.
+
+Compares the current offset-index implementation with the previous
+binary-search-with-re-encoding one on emoji-heavy Russian text.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_tg_text
+"""
+from __future__ import annotations
+
+import random
+import time
+from typing import Callable, List
+
+from src.common.tg_text import chunk_text, tg_utf16_clip, tg_utf16_len
+
+
+# --- previous implementation (kept here only as the baseline) ---
+
+def _legacy_clip(text: str, limit: int, *, ellipsis: str = "…") -> str:
+    t = (text or "").strip()
+    if limit <= 0:
+        return ""
+    if tg_utf16_len(t) <= limit:
+        return t
+    target = max(0, limit - tg_utf16_len(ellipsis))
+    if target <= 0:
+        return ellipsis[:limit]
+    lo, hi = 0, len(t)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if tg_utf16_len(t[:mid]) <= target:
+            lo = mid
+        else:
+            hi = mid - 1
+    return t[:lo].rstrip() + ellipsis
+
+
+def _legacy_chunk(text: str, *, limit: int = 4096) -> List[str]:
+    t = (text or "").strip()
+    if not t:
+        return []
+    chunks: List[str] = []
+    while t:
+        if tg_utf16_len(t) <= limit:
+            chunks.append(t)
+            break
+        lo, hi = 0, len(t)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if tg_utf16_len(t[:mid]) <= limit:
+                lo = mid
+            else:
+                hi = mid - 1
+        prefix = t[:lo]
+        split_at = prefix.rfind("\n\n")
+        if split_at != -1 and split_at > 0:
+            cut = split_at + 2
+        else:
+            split_at = prefix.rfind("\n")
+            if split_at != -1 and split_at > 0:
+                cut = split_at + 1
+            else:
+                cut = lo
+        part = t[:cut].strip()
+        if part:
+            chunks.append(part)
+        t = t[cut:].strip()
+    return chunks
+
+
+# --- corpus ---
+
+_WORDS = "кадр свет тень настроение палитра история город вечер море улыбка детали стиль".split()
+_EMOJI = "✨🔥✅📸🌅🎞️💫🖤🌿🫶"
+
+
+def _make_text(n_chars: int, seed: int = 42) -> str:
+    rnd = random.Random(seed)
+    out: List[str] = []
+    size = 0
+    while size < n_chars:
+        r = rnd.random()
+        if r < 0.15:
+            tok = rnd.choice(_EMOJI)
+        elif r < 0.20:
+            tok = "\n"
+        elif r < 0.22:
+            tok = "\n\n"
+        else:
+            tok = rnd.choice(_WORDS)
+        out.append(tok)
+        size += len(tok) + 1
+    return " ".join(out)
+
+
+def _bench(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    print(f"{'case':<28}{'legacy, ms':>12}{'current, ms':>13}{'speedup':>10}")
+    for n_chars in (2_000, 20_000, 200_000):
+        text = _make_text(n_chars)
+        assert chunk_text(text, limit=4096) == _legacy_chunk(text, limit=4096)
+        assert tg_utf16_clip(text, 1024) == _legacy_clip(text, 1024)
+
+        repeat = 20 if n_chars <= 20_000 else 3
+        for name, old, new in (
+            ("clip 1024", lambda: _legacy_clip(text, 1024), lambda: tg_utf16_clip(text, 1024)),
+            ("chunk 4096", lambda: _legacy_chunk(text, limit=4096), lambda: chunk_text(text, limit=4096)),
+        ):
+            t_old = _bench(old, repeat) * 1000
+            t_new = _bench(new, repeat) * 1000
+            print(f"{name + f' ({n_chars} ch)':<28}{t_old:>12.2f}{t_new:>13.2f}{t_old / t_new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Local stand-ins for KIE, OpenAI (Responses API) and the Telegram Bot API.
+
+All three run in-process on 127.0.0.1 (aiohttp), so the pipeline can be driven end-to-end
+without network access or credits. Latencies are drawn from lognormal distributions
+described by a median and a sigma (sigma=0 gives a constant latency).
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import math
+import random
+import struct
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+
+@dataclass(frozen=True)
+class Latency:
+    median: float = 0.0
+    sigma: float = 0.0
+
+    def sample(self, rnd: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median
+        return rnd.lognormvariate(math.log(self.median), self.sigma)
+
+    @classmethod
+    def parse(cls, value: str) -> "Latency":
+        """``"2.0"`` or ``"2.0:0.6"`` (median seconds[:sigma])."""
+        median, _, sigma = value.partition(":")
+        return cls(float(median), float(sigma or 0.0))
+
+
+def _png(width: int = 64, height: int = 64) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    raw = b"".join(b"\x00" + bytes([120, 80, 200]) * width for _ in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+@dataclass
+class FakeServer:
+    """Base class: one aiohttp app on an ephemeral port, with per-route call counters."""
+
+    seed: int = 0
+    calls: Counter = field(default_factory=Counter)
+
+    def __post_init__(self) -> None:
+        self.rnd = random.Random(self.seed)
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    def routes(self) -> list[web.RouteDef]:
+        raise NotImplementedError
+
+    async def start(self) -> str:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.add_routes(self.routes())
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+
+@dataclass
+class FakeKie(FakeServer):
+    """createTask / recordInfo / result download. A task succeeds ``task`` seconds after creation."""
+
+    create: Latency = field(default_factory=Latency)
+    task: Latency = field(default_factory=lambda: Latency(2.0, 0.5))
+    download: Latency = field(default_factory=Latency)
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        self._ids = itertools.count(1)
+        self._ready_at: dict[str, float] = {}
+        self._png = _png()
+
+    def routes(self) -> list[web.RouteDef]:
+        return [
+            web.post("/jobs/createTask", self._create),
+            web.get("/jobs/recordInfo", self._record),
+            web.get("/files/{task_id}.png", self._file),
+        ]
+
+    async def _create(self, request: web.Request) -> web.Response:
+        self.calls["createTask"] += 1
+        await request.json()
+        await asyncio.sleep(self.create.sample(self.rnd))
+        task_id = f"task_{next(self._ids)}"
+        self._ready_at[task_id] = time.monotonic() + self.task.sample(self.rnd)
+        return web.json_response({"code": 200, "msg": "success", "data": {"taskId": task_id}})
+
+    async def _record(self, request: web.Request) -> web.Response:
+        self.calls["recordInfo"] += 1
+        task_id = request.query.get("taskId", "")
+        ready_at = self._ready_at.get(task_id)
+        if ready_at is None:
+            return web.json_response({"code": 404, "msg": "task not found"})
+        if time.monotonic() < ready_at:
+            return web.json_response({"code": 200, "data": {"taskId": task_id, "state": "generating"}})
+        result = {"resultUrls": [f"{self.base_url}/files/{task_id}.png"]}
+        return web.json_response(
+            {"code": 200, "data": {"taskId": task_id, "state": "success", "resultJson": json.dumps(result)}}
+        )
+
+    async def _file(self, request: web.Request) -> web.Response:
+        self.calls["download"] += 1
+        await asyncio.sleep(self.download.sample(self.rnd))
+        return web.Response(body=self._png, content_type="image/png")
+
+
+@dataclass
+class FakeOpenAI(FakeServer):
+    """``POST /v1/responses`` returning the caption JSON the rewriter asks for."""
+
+    latency: Latency = field(default_factory=lambda: Latency(1.0, 0.3))
+
+    def routes(self) -> list[web.RouteDef]:
+        return [web.post("/v1/responses", self._responses)]
+
+    async def _responses(self, request: web.Request) -> web.Response:
+        self.calls["responses"] += 1
+        await request.read()
+        await asyncio.sleep(self.latency.sample(self.rnd))
+        n = self.calls["responses"]
+        payload = {
+            "caption_html": f"✦\n\n<b>Тихий вечер</b> #{n} 🌅\n<i>Свет мягко ложится на город.</i>\n\nЕсли откликается — попробуй\n👇",
+            "promptika_prompt": "Вечерний город в тёплом свете, мягкие тени, кинематографичный кадр.",
+        }
+        return web.json_response(
+            {
+                "id": f"resp_{n}",
+                "object": "response",
+                "created_at": int(time.time()),
+                "status": "completed",
+                "model": "fake-model",
+                "output": [
+                    {
+                        "type": "message",
+                        "id": f"msg_{n}",
+                        "status": "completed",
+                        "role": "assistant",
+                        "content": [{"type": "output_text", "text": json.dumps(payload, ensure_ascii=False), "annotations": []}],
+                    }
+                ],
+                "parallel_tool_calls": False,
+                "tool_choice": "auto",
+                "tools": [],
+                "error": None,
+                "incomplete_details": None,
+                "instructions": None,
+                "metadata": {},
+            }
+        )
+
+
+@dataclass
+class FakeBotApi(FakeServer):
+    """``/bot<token>/<method>``: accepts any method and returns a plausible Message."""
+
+    latency: Latency = field(default_factory=lambda: Latency(0.05, 0.3))
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        self._message_ids = itertools.count(1)
+
+    def routes(self) -> list[web.RouteDef]:
+        return [web.post("/bot{token}/{method}", self._method)]
+
+    async def _method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        form = await request.post()
+        await asyncio.sleep(self.latency.sample(self.rnd))
+        chat_id = str(form.get("chat_id") or "0")
+        chat = {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else -1001, "type": "channel"}
+        message = {"message_id": next(self._message_ids), "date": int(time.time()), "chat": chat}
+        if method == "sendMediaGroup":
+            return web.json_response({"ok": True, "result": [message]})
+        if method in {"editMessageReplyMarkup", "editMessageMedia", "editMessageText"}:
+            return web.json_response({"ok": True, "result": message})
+        if method.startswith("send") or method == "copyMessage":
+            return web.json_response({"ok": True, "result": message})
+        return web.json_response({"ok": True, "result": True})
@@ -13,6 +13,8 @@ class Settings(BaseSettings):
     admin_ids_csv: str | None = Field(default=None, alias="ADMIN_IDS")
     admin_review_chat_id: int | None = Field(default=None, alias="ADMIN_REVIEW_CHAT_ID")
     destination_channel: str | None = Field(default=None, alias="DESTINATION_CHANNEL")
+    # Several destinations: "<chat> | <button text> | <bot username>" per line or ";" (see src/common/destinations.py).
+    destinations: str | None = Field(default=None, alias="DESTINATIONS")
 
     userbot_sender_id: int | None = Field(default=None, alias="USERBOT_SENDER_ID")
     ingest_bot_username: str | None = Field(default=None, alias="INGEST_BOT_USERNAME")
@@ -21,9 +23,25 @@ class Settings(BaseSettings):
     telegram_api_hash: str | None = Field(default=None, alias="TELEGRAM_API_HASH")
     telegram_session_file: str = Field(default="pyrogram", alias="TELEGRAM_SESSION_FILE")
     telegram_session_string: str | None = Field(default=None, alias="TELEGRAM_SESSION_STRING")
+    # Several userbot accounts: comma/newline separated "name:session_string" entries (name optional).
+    # Channels are spread over them by consistent hashing; TELEGRAM_SESSION_STRING is used if empty.
+    telegram_session_strings: str | None = Field(default=None, alias="TELEGRAM_SESSION_STRINGS")
+    userbot_shard_heartbeat_sec: float = Field(default=30, alias="USERBOT_SHARD_HEARTBEAT_SEC")
+    userbot_shard_ttl_sec: float = Field(default=120, alias="USERBOT_SHARD_TTL_SEC")
+    # Outbound token bucket per userbot session: one request per interval on average, bursts up to BURST.
+    userbot_forward_interval_sec: float = Field(default=1.0, alias="USERBOT_FORWARD_INTERVAL_SEC")
+    userbot_forward_burst: int = Field(default=5, alias="USERBOT_FORWARD_BURST")
+    # Non-FloodWait delivery failures are retried with exponential backoff (FloodWait is waited out).
+    userbot_forward_max_attempts: int = Field(default=5, alias="USERBOT_FORWARD_MAX_ATTEMPTS")
+    userbot_forward_retry_base_sec: float = Field(default=2.0, alias="USERBOT_FORWARD_RETRY_BASE_SEC")
+    # Delivery method that worked per source chat is reused; forward is re-tried after this long.
+    userbot_delivery_reprobe_sec: float = Field(default=6 * 3600, alias="USERBOT_DELIVERY_REPROBE_SEC")
 
     openai_api_key: str | None = Field(default=None, alias="OPENAI_API_KEY")
     openai_model: str = Field(default="gpt-4o-mini", alias="OPENAI_MODEL")
+    openai_base_url: str | None = Field(default=None, alias="OPENAI_BASE_URL")
+    # HTTP proxy for OpenAI as host:port:user:pass. Unset or empty disables the proxy.
+    openai_proxy: str | None = Field(default=None, alias="OPENAI_PROXY")
     openai_system_instructions: str = Field(default="You are a helpful editor.", alias="OPENAI_SYSTEM_INSTRUCTIONS")
     # Caption template. If omitted, DEFAULT_REWRITE_TEMPLATE is used.
     rewrite_template: str = Field(default=DEFAULT_REWRITE_TEMPLATE, alias="REWRITE_TEMPLATE")
@@ -40,16 +58,59 @@ class Settings(BaseSettings):
     kie_model: str = Field(default="google/nano-banana-edit", alias="KIE_MODEL")
     kie_output_format: str = Field(default="png", alias="KIE_OUTPUT_FORMAT")
     kie_image_size: str = Field(default="3:4", alias="KIE_IMAGE_SIZE")
-    kie_poll_interval_sec: int = Field(default=10, alias="KIE_POLL_INTERVAL_SEC")
+    kie_poll_interval_sec: float = Field(default=10, alias="KIE_POLL_INTERVAL_SEC")
     kie_max_attempts: int = Field(default=120, alias="KIE_MAX_ATTEMPTS")
     kie_api_key: str | None = Field(default=None, alias="KIE_API_KEY")
+    # Hedged KIE tasks: if a task runs longer than KIE_HEDGE_PERCENTILE of the last completion
+    # times (needs KIE_HEDGE_MIN_SAMPLES of them), start a duplicate and take the first result.
+    # KIE_HEDGE_PER_HOUR caps the extra tasks; 0 disables hedging.
+    kie_hedge_per_hour: int = Field(default=0, alias="KIE_HEDGE_PER_HOUR")
+    kie_hedge_percentile: float = Field(default=90, alias="KIE_HEDGE_PERCENTILE")
+    kie_hedge_min_samples: int = Field(default=20, alias="KIE_HEDGE_MIN_SAMPLES")
     kie_generate_path: str = Field(default="/generate", alias="KIE_GENERATE_PATH")
     kie_images_count: int = Field(default=2, alias="KIE_IMAGES_COUNT")
 
+    # Circuit breakers for KIE/OpenAI: open after N consecutive failures, probe again after
+    # CIRCUIT_OPEN_SEC (doubling on failed probes up to CIRCUIT_MAX_OPEN_SEC).
+    circuit_failure_threshold: int = Field(default=3, alias="CIRCUIT_FAILURE_THRESHOLD")
+    circuit_open_sec: float = Field(default=60, alias="CIRCUIT_OPEN_SEC")
+    circuit_max_open_sec: float = Field(default=900, alias="CIRCUIT_MAX_OPEN_SEC")
+
+    # Ingest claims: a source being generated is claimed in the DB; duplicates (other processes)
+    # poll every INGEST_CLAIM_POLL_SEC. Claims older than INGEST_CLAIM_TTL_SEC are taken over.
+    ingest_claim_ttl_sec: float = Field(default=1800, alias="INGEST_CLAIM_TTL_SEC")
+    ingest_claim_poll_sec: float = Field(default=3, alias="INGEST_CLAIM_POLL_SEC")
+    # Fair ingest scheduling: at most INGEST_CONCURRENCY posts are built at once, shared across
+    # source channels by weight (channels.weight / channels.max_in_flight); manual posts go first.
+    ingest_concurrency: int = Field(default=4, alias="INGEST_CONCURRENCY")
+    ingest_source_max_in_flight: int = Field(default=0, alias="INGEST_SOURCE_MAX_IN_FLIGHT")
+    ingest_policy_ttl_sec: float = Field(default=30, alias="INGEST_POLICY_TTL_SEC")
+
+    # Userbot catch-up on startup: posts missed while it was down, per channel (newest first, capped).
+    catchup_max_posts: int = Field(default=200, alias="CATCHUP_MAX_POSTS")
+    catchup_concurrency: int = Field(default=4, alias="CATCHUP_CONCURRENCY")
+
+    # Userbot history backfill: posts are forwarded in batches; the next batch starts when the
+    # previous one has drafts (or after BACKFILL_BATCH_TIMEOUT_SEC).
+    backfill_batch_size: int = Field(default=5, alias="BACKFILL_BATCH_SIZE")
+    backfill_forward_interval_sec: float = Field(default=2, alias="BACKFILL_FORWARD_INTERVAL_SEC")
+    backfill_batch_timeout_sec: float = Field(default=900, alias="BACKFILL_BATCH_TIMEOUT_SEC")
+
+    # Image candidates generated concurrently per ingested post (1 = off, max 10). With K > 1 the
+    # review chat gets all candidates as an album and the reviewer picks one before captioning.
+    # Can be overridden from the admin panel (INGEST_CANDIDATES setting).
+    ingest_candidates: int = Field(default=1, alias="INGEST_CANDIDATES")
+
     caption_emojis: str = Field(default="✨🔥✅", alias="CAPTION_EMOJIS")
 
     publish_every_minutes: int = Field(default=30, alias="PUBLISH_EVERY_MINUTES")
     publish_batch_size: int = Field(default=1, alias="PUBLISH_BATCH_SIZE")
+    # A claimed draft stays "publishing" this long; after that another publisher may take it over.
+    publish_lease_sec: int = Field(default=300, alias="PUBLISH_LEASE_SEC")
+    # A draft that failed for some destinations goes back to the queue (base * 2^attempt) this many
+    # times; then it ends as "partially_published" (or "failed" if no destination got it).
+    publish_max_attempts: int = Field(default=5, alias="PUBLISH_MAX_ATTEMPTS")
+    publish_retry_base_sec: float = Field(default=60.0, alias="PUBLISH_RETRY_BASE_SEC")
 
     external_bot_username: str = Field(default="PromptikaBot", alias="EXTERNAL_BOT_USERNAME")
     external_button_text: str = Field(default="Попробовать", alias="EXTERNAL_BUTTON_TEXT")
@@ -58,6 +119,45 @@ class Settings(BaseSettings):
     resolver_bind: str = Field(default="0.0.0.0", alias="RESOLVER_BIND")
     resolver_port: int = Field(default=8080, alias="RESOLVER_PORT")
 
+    # Signed media URLs for KIE reference images: the resolver serves MEDIA_ROOT at
+    # <MEDIA_PUBLIC_BASE_URL>/media/... Empty base URL or secret -> Telegram file URLs are used.
+    media_root: str = Field(default="data/media", alias="MEDIA_ROOT")
+    media_public_base_url: str | None = Field(default=None, alias="MEDIA_PUBLIC_BASE_URL")
+    media_url_secret: str | None = Field(default=None, alias="MEDIA_URL_SECRET")
+    media_url_ttl_sec: int = Field(default=900, alias="MEDIA_URL_TTL_SEC")
+
+    # Bot API send/edit budget (Telegram: ~30 msg/s overall, ~20 msg/min per group or channel, ~1 msg/s per user).
+    # TelegramRetryAfter is waited out and retried up to BOT_API_MAX_RETRIES times.
+    bot_api_global_per_sec: float = Field(default=25, alias="BOT_API_GLOBAL_PER_SEC")
+    bot_api_group_per_min: float = Field(default=20, alias="BOT_API_GROUP_PER_MIN")
+    bot_api_private_per_sec: float = Field(default=1, alias="BOT_API_PRIVATE_PER_SEC")
+    bot_api_max_retries: int = Field(default=3, alias="BOT_API_MAX_RETRIES")
+
+    # Webhook mode for the admin bot (polling when WEBHOOK_BASE_URL is empty). Telegram posts updates to
+    # <WEBHOOK_BASE_URL><WEBHOOK_PATH> with WEBHOOK_SECRET in X-Telegram-Bot-Api-Secret-Token.
+    webhook_base_url: str | None = Field(default=None, alias="WEBHOOK_BASE_URL")
+    webhook_path: str = Field(default="/telegram/webhook", alias="WEBHOOK_PATH")
+    webhook_secret: str | None = Field(default=None, alias="WEBHOOK_SECRET")
+    webhook_bind: str = Field(default="0.0.0.0", alias="WEBHOOK_BIND")
+    webhook_port: int = Field(default=8081, alias="WEBHOOK_PORT")
+    webhook_workers: int = Field(default=1, alias="WEBHOOK_WORKERS")
+    # FSM (panel dialogs) lives in the DB: states idle for FSM_STATE_TTL_SEC are dropped; reads are cached
+    # for FSM_CACHE_TTL_SEC (keep it short when several workers serve updates; 0 disables the cache).
+    fsm_state_ttl_sec: int = Field(default=24 * 3600, alias="FSM_STATE_TTL_SEC")
+    fsm_cache_ttl_sec: float = Field(default=1.0, alias="FSM_CACHE_TTL_SEC")
+    # A running regeneration holds leases.regen:<draft_id>; other workers attach instead of starting one.
+    regen_lease_sec: int = Field(default=900, alias="REGEN_LEASE_SEC")
+
+    # Prometheus /metrics listeners (0 = disabled). The resolver API serves /metrics on its own port.
+    metrics_bind: str = Field(default="0.0.0.0", alias="METRICS_BIND")
+    admin_bot_metrics_port: int = Field(default=0, alias="ADMIN_BOT_METRICS_PORT")
+    userbot_metrics_port: int = Field(default=0, alias="USERBOT_METRICS_PORT")
+
+    # Tracing export: "" (off), "file" (OTLP/JSON lines in TRACE_FILE) or "otlp" (OTLP/HTTP collector).
+    trace_export: str = Field(default="", alias="TRACE_EXPORT")
+    trace_file: str = Field(default="data/traces.jsonl", alias="TRACE_FILE")
+    otlp_endpoint: str = Field(default="http://localhost:4318", alias="OTLP_ENDPOINT")
+
     database_url: str = Field(default="sqlite+aiosqlite:///./data/app.db", alias="DATABASE_URL")
 
     tz: str = Field(default="Asia/Tashkent", alias="TZ")
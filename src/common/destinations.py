@@ -0,0 +1,36 @@
+"""Publish destinations.
+
+DESTINATIONS (setting or env) lists the channels a draft is published to, one per line
+(or separated by ";"): ``<chat> | <button text> | <bot username>``. Button text and bot
+username are optional and default to EXTERNAL_BUTTON_TEXT / EXTERNAL_BOT_USERNAME. When
+it is empty, DESTINATION_CHANNEL is the only destination.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Destination:
+    chat: str
+    button_text: str | None = None
+    bot_username: str | None = None
+
+
+def parse_destinations(raw: str | None) -> list[Destination]:
+    out: list[Destination] = []
+    seen: set[str] = set()
+    for line in (raw or "").replace(";", "\n").splitlines():
+        fields = [f.strip() for f in line.split("|")]
+        if not fields[0] or fields[0] in seen:
+            continue
+        seen.add(fields[0])
+        out.append(
+            Destination(
+                chat=fields[0],
+                button_text=(fields[1] if len(fields) > 1 else "") or None,
+                bot_username=((fields[2] if len(fields) > 2 else "").lstrip("@")) or None,
+            )
+        )
+    return out
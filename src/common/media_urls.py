@@ -0,0 +1,65 @@
+"""Short-lived signed URLs for files under MEDIA_ROOT (served by the resolver API).
+
+KIE fetches reference images by URL. Instead of Telegram file URLs (a Bot API call per
+image, the bot token inside the URL, the 20 MB get_file limit) we hand out
+``<MEDIA_PUBLIC_BASE_URL>/media/<path>?exp=<unix>&sig=<hmac>`` links to our own disk.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from src.common.config import settings
+
+
+def media_urls_enabled() -> bool:
+    return bool(settings.media_public_base_url and settings.media_url_secret)
+
+
+def _signature(rel_path: str, expires: int) -> str:
+    key = (settings.media_url_secret or "").encode("utf-8")
+    mac = hmac.new(key, f"{rel_path}\n{expires}".encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(mac[:18]).decode("ascii")
+
+
+def media_relpath(path: str | Path) -> str | None:
+    """Path relative to MEDIA_ROOT (posix), or None if the file lies outside it."""
+    root = Path(settings.media_root).resolve()
+    try:
+        return Path(path).resolve().relative_to(root).as_posix()
+    except ValueError:
+        return None
+
+
+def signed_media_url(path: str | Path, *, ttl_sec: int | None = None) -> str | None:
+    """Signed URL for a local media file, or None if media URLs are not configured."""
+    if not media_urls_enabled():
+        return None
+    rel = media_relpath(path)
+    if rel is None:
+        return None
+    expires = int(time.time()) + int(ttl_sec or settings.media_url_ttl_sec)
+    base = settings.media_public_base_url.rstrip("/")
+    return f"{base}/media/{quote(rel)}?exp={expires}&sig={_signature(rel, expires)}"
+
+
+def verify_media_signature(rel_path: str, expires: int, sig: str) -> bool:
+    if not settings.media_url_secret or expires < time.time():
+        return False
+    return hmac.compare_digest(_signature(rel_path, expires), sig or "")
+
+
+def resolve_media_path(rel_path: str) -> Path | None:
+    """Absolute path of ``rel_path`` inside MEDIA_ROOT; None on traversal attempts."""
+    root = Path(settings.media_root).resolve()
+    p = (root / rel_path).resolve()
+    try:
+        p.relative_to(root)
+    except ValueError:
+        return None
+    return p
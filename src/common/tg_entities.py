@@ -0,0 +1,184 @@
+"""Telegram HTML -> (plain text, MessageEntity offsets) compiler.
+
+Captions come from OpenAI as Telegram HTML. Instead of sending them with parse_mode="HTML"
+and learning about bad markup from a TelegramBadRequest, we compile them once when the
+caption is saved and send ``text`` + ``entities`` afterwards.
+
+Entities are plain dicts in Bot API shape (type/offset/length/url/language/custom_emoji_id);
+offsets and lengths are in UTF-16 code units, as Telegram expects.
+"""
+
+from __future__ import annotations
+
+import html as _html
+import json
+import re as _re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from src.common.tg_text import Utf16Index, chunk_spans, strip_html, tg_utf16_len
+
+
+class TgHtmlError(ValueError):
+    """Markup Telegram would reject ("Can't parse entities")."""
+
+
+_TAG_TYPES = {
+    "b": "bold",
+    "strong": "bold",
+    "i": "italic",
+    "em": "italic",
+    "u": "underline",
+    "ins": "underline",
+    "s": "strikethrough",
+    "strike": "strikethrough",
+    "del": "strikethrough",
+    "tg-spoiler": "spoiler",
+    "span": "spoiler",  # only with class="tg-spoiler"
+    "a": "text_link",
+    "code": "code",
+    "pre": "pre",
+    "blockquote": "blockquote",
+    "tg-emoji": "custom_emoji",
+}
+
+_TOKEN_RE = _re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9-]*)((?:\s[^<>]*)?)>|<|[^<]+")
+_ATTR_RE = _re.compile(r"""([a-zA-Z][\w-]*)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?""")
+
+
+@dataclass(frozen=True)
+class CompiledCaption:
+    text: str
+    entities: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def utf16_len(self) -> int:
+        return tg_utf16_len(self.text)
+
+    def entities_json(self) -> str:
+        return json.dumps(self.entities, ensure_ascii=False)
+
+    @classmethod
+    def from_db(cls, text: Optional[str], entities_json: Optional[str]) -> Optional["CompiledCaption"]:
+        if text is None:
+            return None
+        try:
+            v = json.loads(entities_json or "[]")
+        except Exception:
+            return None
+        return cls(text=text, entities=v if isinstance(v, list) else [])
+
+
+def _attrs(raw: str) -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for m in _ATTR_RE.finditer(raw or ""):
+        val = m.group(2) if m.group(2) is not None else m.group(3) if m.group(3) is not None else m.group(4)
+        out[m.group(1).lower()] = _html.unescape(val or "")
+    return out
+
+
+def compile_html(html: str) -> CompiledCaption:
+    """Compile the Telegram HTML subset; raise TgHtmlError on markup Telegram would reject."""
+    src = (html or "").strip()
+    parts: List[str] = []
+    pos = 0  # UTF-16 offset of the end of ``parts``
+    stack: List[tuple[str, Dict[str, Any], int]] = []  # (tag, entity, start offset)
+    entities: List[Dict[str, Any]] = []
+
+    for m in _TOKEN_RE.finditer(src):
+        tok = m.group(0)
+        name = (m.group(2) or "").lower()
+        if not name:
+            if tok == "<":
+                raise TgHtmlError(f"Unescaped '<' at position {m.start()}")
+            text = _html.unescape(tok)
+            parts.append(text)
+            pos += tg_utf16_len(text)
+            continue
+
+        if name not in _TAG_TYPES:
+            raise TgHtmlError(f"Unsupported tag <{name}>")
+
+        if m.group(1):  # closing tag
+            if not stack or stack[-1][0] != name:
+                raise TgHtmlError(f"Unmatched end tag </{name}>")
+            _tag, ent, start = stack.pop()
+            if name == "code" and stack and stack[-1][0] == "pre" and ent.get("language"):
+                # <pre><code class="language-x"> is a single pre entity with a language.
+                stack[-1][1]["language"] = ent["language"]
+                continue
+            if ent["type"] == "code":
+                ent.pop("language", None)  # inline code has no language in the Bot API
+            if pos > start:
+                ent["offset"] = start
+                ent["length"] = pos - start
+                entities.append(ent)
+            continue
+
+        attrs = _attrs(m.group(3) or "")
+        ent: Dict[str, Any] = {"type": _TAG_TYPES[name]}
+        if name == "span" and attrs.get("class") != "tg-spoiler":
+            raise TgHtmlError('<span> is only supported with class="tg-spoiler"')
+        if name == "a":
+            if not attrs.get("href"):
+                raise TgHtmlError("<a> without href")
+            ent["url"] = attrs["href"]
+        elif name == "tg-emoji":
+            if not attrs.get("emoji-id"):
+                raise TgHtmlError("<tg-emoji> without emoji-id")
+            ent["custom_emoji_id"] = attrs["emoji-id"]
+        elif name == "blockquote" and "expandable" in attrs:
+            ent["type"] = "expandable_blockquote"
+        elif name in {"pre", "code"}:
+            lang = attrs.get("class", "")
+            if lang.startswith("language-"):
+                ent["language"] = lang[len("language-"):]
+        stack.append((name, ent, pos))
+
+    if stack:
+        raise TgHtmlError(f"Unclosed tag <{stack[-1][0]}>")
+
+    entities.sort(key=lambda e: (e["offset"], -e["length"]))
+    return CompiledCaption(text="".join(parts), entities=entities)
+
+
+def compile_caption(html: str) -> tuple[CompiledCaption, Optional[str]]:
+    """Lenient ``compile_html``: return (compiled, error_or_none).
+
+    Malformed markup degrades to plain text without entities, which Telegram always accepts.
+    """
+    try:
+        return compile_html(html), None
+    except TgHtmlError as e:
+        return CompiledCaption(text=strip_html(html)), str(e)
+
+
+def _slice_entities(entities: List[Dict[str, Any]], a: int, b: int) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for e in entities:
+        s = max(a, int(e["offset"]))
+        t = min(b, int(e["offset"]) + int(e["length"]))
+        if t > s:
+            out.append({**e, "offset": s - a, "length": t - s})
+    return out
+
+
+def split_compiled(c: CompiledCaption, *, limit: int, first_limit: Optional[int] = None) -> List[CompiledCaption]:
+    """Split into parts of at most ``limit`` UTF-16 units (the first one ``first_limit``).
+
+    Cuts prefer a paragraph break, then a newline, then a space, then a hard cut; entities
+    crossing a cut are clipped into both parts.
+    """
+    t = c.text
+    if not t.strip():
+        return []
+    first = limit if first_limit is None else first_limit
+    if tg_utf16_len(t) <= first:
+        return [c]
+
+    index = Utf16Index(t)
+    spans = chunk_spans(t, limit=limit, first_limit=first, separators=("\n\n", "\n", " "), index=index)
+    return [
+        CompiledCaption(text=t[a:b], entities=_slice_entities(c.entities, index.offset(a), index.offset(b)))
+        for a, b in spans
+    ]
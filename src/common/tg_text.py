@@ -2,7 +2,8 @@ from __future__ import annotations
 
 import html as _html
 import re as _re
-from typing import Iterable, List, Tuple, Optional
+from bisect import bisect_left
+from typing import List, Optional, Tuple
 
 
 # Telegram (Bot API) limits are defined in "UTF-16 code units" for many entity-related constraints.
@@ -12,6 +13,42 @@ def tg_utf16_len(text: str) -> int:
     return len(t.encode("utf-16-le")) // 2
 
 
+_ASTRAL_RE = _re.compile("[\U00010000-\U0010FFFF]")
+
+
+class Utf16Index:
+    """UTF-16 offset index over a string, built in a single pass.
+
+    Only code points outside the BMP (emoji etc.) take two UTF-16 units, so it is enough
+    to remember where they are: ``offset(i) = i + <astral chars before i>``. Lookups are
+    a ``bisect`` over that (usually short) list instead of re-encoding prefixes.
+    """
+
+    __slots__ = ("text", "_astral")
+
+    def __init__(self, text: str, *, end: int | None = None) -> None:
+        self.text = text or ""
+        end = len(self.text) if end is None else min(end, len(self.text))
+        self._astral = [m.start() for m in _ASTRAL_RE.finditer(self.text, 0, end)]
+
+    def offset(self, i: int) -> int:
+        """UTF-16 length of ``text[:i]``."""
+        return i + bisect_left(self._astral, i)
+
+    def cut(self, start: int, limit: int) -> int:
+        """Largest code point index ``i >= start`` with ``offset(i) - offset(start) <= limit``."""
+        base = self.offset(start) + limit
+        # Every code point is at least one unit wide, so the answer is <= start + limit.
+        lo, hi = start, min(len(self.text), start + max(limit, 0))
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.offset(mid) <= base:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+
 def tg_utf16_clip(text: str, limit: int, *, ellipsis: str = "…") -> str:
     t = (text or "").strip()
     if limit <= 0:
@@ -24,16 +61,9 @@ def tg_utf16_clip(text: str, limit: int, *, ellipsis: str = "…") -> str:
     if target <= 0:
         return ellipsis[:limit]
 
-    # Binary search over code points; UTF-16 length is monotonic w.r.t prefix.
-    lo, hi = 0, len(t)
-    while lo < hi:
-        mid = (lo + hi + 1) // 2
-        if tg_utf16_len(t[:mid]) <= target:
-            lo = mid
-        else:
-            hi = mid - 1
-
-    return t[:lo].rstrip() + ellipsis
+    # The cut is within the first `target` code points; no need to index the rest.
+    cut = Utf16Index(t, end=target + 1).cut(0, target)
+    return t[:cut].rstrip() + ellipsis
 
 
 _TAG_RE = _re.compile(r"<[^>]*>")
@@ -53,70 +83,62 @@ def strip_html(text: str) -> str:
     return t.strip()
 
 
-def prepare_photo_caption(
-    caption_html: str,
+def chunk_spans(
+    text: str,
     *,
-    caption_limit: int = 1024,
-) -> tuple[str, Optional[str], Optional[str]]:
-    """Return (caption_for_photo, overflow_text_or_none, parse_mode_or_none).
-
-    Strategy:
-    - If the caption fits, keep it as-is and mark parse_mode='HTML' (since we generate Telegram HTML).
-    - If it does NOT fit, switch to plain text (strip HTML) for safety and clip it.
-      Also return the full plain text as overflow (caller may send as follow-up messages).
+    limit: int,
+    first_limit: Optional[int] = None,
+    separators: Tuple[str, ...] = ("\n\n", "\n"),
+    index: Optional[Utf16Index] = None,
+) -> List[Tuple[int, int]]:
+    """(start, end) code point spans of ``text`` cut into parts of at most ``limit`` UTF-16 units.
+
+    The first part may have its own ``first_limit``. Each part ends on the last separator
+    that fits, tried in ``separators`` order, then a hard cut; whitespace around the cuts is
+    dropped. With the UTF-16 index built once, the split is linear in the text length.
     """
-    raw = (caption_html or "").strip()
-    if tg_utf16_len(raw) <= caption_limit:
-        return raw, None, "HTML"
-
-    plain = strip_html(raw)
-    head = tg_utf16_clip(plain, caption_limit)
-    return head, plain, None
+    t = text or ""
+    index = index or Utf16Index(t)
+    n = len(t)
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    while start < n and t[start].isspace():
+        start += 1
+    cur = limit if first_limit is None else first_limit
+    while start < n:
+        if index.offset(n) - index.offset(start) <= cur:
+            end = nxt = n
+        else:
+            # lo is the max prefix (in code points) within the limit
+            lo = index.cut(start, cur)
+            # Fall back to a hard cut (always make progress).
+            end = nxt = max(lo, start + 1)
+            for sep in separators:
+                at = t.rfind(sep, start, lo)
+                if at > start:
+                    end, nxt = at, at + len(sep)
+                    break
+        while end > start and t[end - 1].isspace():
+            end -= 1
+        if end > start:
+            spans.append((start, end))
+        # Skip the whitespace the next part would strip anyway.
+        start = nxt
+        while start < n and t[start].isspace():
+            start += 1
+        cur = limit
+    return spans
 
 
 def chunk_text(text: str, *, limit: int = 4096) -> List[str]:
-    """Split long text into Telegram-safe chunks by UTF-16 length."""
+    """Split long text into Telegram-safe chunks by UTF-16 length.
+
+    Each chunk ends on the last paragraph break (blank line) that fits, then the last
+    newline, then a hard cut (see ``chunk_spans``).
+    """
     t = (text or "").strip()
     if not t:
         return []
-
-    chunks: List[str] = []
-    while t:
-        if tg_utf16_len(t) <= limit:
-            chunks.append(t)
-            break
-
-        # Try to split on a paragraph boundary first.
-        cut = None
-        # Find last \n\n within limit
-        # Walk back a bit for performance
-        window = t[: min(len(t), 5000)]
-        # We'll binary search the cut point in code points.
-        lo, hi = 0, len(t)
-        while lo < hi:
-            mid = (lo + hi + 1) // 2
-            if tg_utf16_len(t[:mid]) <= limit:
-                lo = mid
-            else:
-                hi = mid - 1
-        # lo is max prefix within limit
-        prefix = t[:lo]
-
-        # Prefer splitting on last double newline or single newline.
-        split_at = prefix.rfind("\n\n")
-        if split_at != -1 and split_at > 0:
-            cut = split_at + 2
-        else:
-            split_at = prefix.rfind("\n")
-            if split_at != -1 and split_at > 0:
-                cut = split_at + 1
-            else:
-                # Fall back to a hard cut.
-                cut = lo
-
-        part = t[:cut].strip()
-        if part:
-            chunks.append(part)
-        t = t[cut:].strip()
-
-    return chunks
+    if tg_utf16_len(t) <= limit:
+        return [t]
+    return [t[a:b] for a, b in chunk_spans(t, limit=limit)]
@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, Asyn
 from sqlalchemy.orm import DeclarativeBase
 
 from src.common.config import settings
+from src.infra.metrics.metrics import instrument_engine
 
 
 class Base(DeclarativeBase):
@@ -27,4 +28,5 @@ def _ensure_sqlite_dir(url: str) -> None:
 
 _ensure_sqlite_dir(settings.database_url)
 engine = create_async_engine(settings.database_url, echo=False, pool_pre_ping=True)
+instrument_engine(engine)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
@@ -1,10 +1,29 @@
 from __future__ import annotations
 import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
 from src.infra.db.base import engine, Base
 
 logger = logging.getLogger(__name__)
 
+
+def _add_missing_columns(conn: Connection) -> None:
+    """create_all() does not alter existing tables: add new nullable columns in place."""
+    insp = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in existing or not col.nullable:
+                continue
+            col_type = col.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{col.name}" {col_type}'))
+            logger.info("DB: added column %s.%s", table.name, col.name)
+
+
 async def init_db() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
     logger.info("DB ready")
@@ -2,9 +2,10 @@ from __future__ import annotations
 
 from datetime import datetime
 import json
-from sqlalchemy import String, Integer, DateTime, Text
+from sqlalchemy import String, Integer, DateTime, Text, Float, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 
+from src.common.tg_entities import CompiledCaption
 from src.infra.db.base import Base
 
 
@@ -24,6 +25,16 @@ class Channel(Base):
     __tablename__ = "channels"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     username: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
+    # High-water mark: newest post id the userbot has processed (catch-up after downtime).
+    last_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Userbot session (shard) that watches and forwards this channel; see userbot_shards.
+    shard: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Telegram chat id, filled in by the userbot; ingest looks up the policy below by it.
+    chat_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Fair ingest scheduling: share of ingest slots relative to other channels (default 1) and
+    # the most posts of this channel built at once (default INGEST_SOURCE_MAX_IN_FLIGHT).
+    weight: Mapped[float | None] = mapped_column(Float, nullable=True)
+    max_in_flight: Mapped[int | None] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
 
@@ -36,15 +47,29 @@ class Draft(Base):
 
     original_text: Mapped[str] = mapped_column(Text, nullable=False)
     caption: Mapped[str] = mapped_column(Text, nullable=False)
+    # Caption compiled from Telegram HTML once on save (plain text + MessageEntity dicts, UTF-16 offsets).
+    caption_text: Mapped[str | None] = mapped_column(Text, nullable=True)
+    caption_entities_json: Mapped[str | None] = mapped_column(Text, nullable=True)
     image_prompt: Mapped[str] = mapped_column(Text, nullable=False)
     image_paths_json: Mapped[str] = mapped_column(Text, nullable=False)
 
     status: Mapped[str] = mapped_column(String(32), nullable=False, default="pending_review")
 
+    # W3C traceparent of the ingest span; review/regen/publish spans continue this trace.
+    trace_parent: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
     review_chat_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
     review_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     approved_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Destination chats (comma-separated) this draft goes to; NULL = all configured destinations.
+    destinations: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Publisher holding the draft while status is "publishing"; an expired lease is claimable again.
+    publish_owner: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    publish_lease_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Failed publish attempts so far; the draft is back in "approved" until publish_retry_at.
+    publish_attempts: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    publish_retry_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     published_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
@@ -64,6 +89,100 @@ class Draft(Base):
             pass
         return []
 
+    @property
+    def compiled_caption(self) -> CompiledCaption | None:
+        """Cached compiled caption, or None for drafts saved before the cache existed."""
+        return CompiledCaption.from_db(self.caption_text, self.caption_entities_json)
+
+
+class DraftPublication(Base):
+    """One published copy of a draft per destination; a retried draft skips these."""
+
+    __tablename__ = "draft_publications"
+    draft_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    destination: Mapped[str] = mapped_column(String(128), primary_key=True)
+    message_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    published_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class DraftTiming(Base):
+    """Per-draft stage timing ledger: one row per (draft, stage), written once."""
+
+    __tablename__ = "draft_timings"
+    __table_args__ = (UniqueConstraint("draft_id", "stage"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    draft_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    stage: Mapped[str] = mapped_column(String(32), nullable=False)
+    # Seconds for time stages; a plain count for kie_polls.
+    value: Mapped[float] = mapped_column(Float, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class UserbotShard(Base):
+    """A userbot session; alive while its heartbeat is fresh (USERBOT_SHARD_TTL_SEC)."""
+
+    __tablename__ = "userbot_shards"
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    host: Mapped[str] = mapped_column(String(255), nullable=False)
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class BackfillCheckpoint(Base):
+    """Progress of a channel history backfill (userbot), so an interrupted run resumes."""
+
+    __tablename__ = "backfill_checkpoints"
+    channel: Mapped[str] = mapped_column(String(255), primary_key=True)
+    # History is read newest -> oldest; everything newer than this id has been handled.
+    next_offset_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    scanned: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    forwarded: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    skipped: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_posts: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    since: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class IngestClaim(Base):
+    """Placeholder claimed before paid KIE/OpenAI calls: one ingest per source across processes."""
+
+    __tablename__ = "ingest_claims"
+    source_chat_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    source_message_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    owner: Mapped[str] = mapped_column(String(128), nullable=False)
+    claimed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class FsmRecord(Base):
+    """aiogram FSM state and data of one conversation (key: fsm:<bot>:<chat>:<user>:<destiny>)."""
+
+    __tablename__ = "fsm_states"
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    data: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON object
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class Lease(Base):
+    """Named, expiring ownership shared by processes (scheduler leadership, regen per draft)."""
+
+    __tablename__ = "leases"
+    name: Mapped[str] = mapped_column(String(128), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(128), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class IngestTrace(Base):
+    """Trace context handed from the userbot (capture) to the admin bot (ingest)."""
+
+    __tablename__ = "ingest_traces"
+    source_chat_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    source_message_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    trace_parent: Mapped[str] = mapped_column(String(64), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
 
 class PromptToken(Base):
     __tablename__ = "prompt_tokens"
@@ -1,13 +1,27 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime
+import logging
+from datetime import datetime, timedelta
 from typing import Optional, Sequence
 
-from sqlalchemy import select, delete, update, func
+from sqlalchemy import select, delete, update, func, case, literal, union_all, String, DateTime
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.infra.db.models import Channel, Draft, PromptToken, Admin, Setting
+from src.common.tg_entities import compile_caption
+from src.infra.db.models import BackfillCheckpoint, Channel, UserbotShard, Draft, DraftPublication, DraftTiming, FsmRecord, IngestClaim, IngestTrace, Lease, PromptToken, Admin, Setting
+from src.infra.metrics.metrics import DRAFTS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+
+def _compiled_caption_values(caption: str) -> dict:
+    """Compile caption HTML once on save; malformed markup is cached as plain text."""
+    compiled, err = compile_caption(caption)
+    if err:
+        logger.warning("Caption HTML rejected, caching plain text instead: %s", err)
+    return {"caption_text": compiled.text, "caption_entities_json": compiled.entities_json()}
 
 
 class AdminRepo:
@@ -66,6 +80,37 @@ class ChannelRepo:
         res = await self.session.execute(select(Channel).order_by(Channel.id.asc()))
         return res.scalars().all()
 
+    async def set_shards(self, assignment: dict[str, str]) -> int:
+        """Store username -> shard; returns how many channels moved."""
+        moved = 0
+        for c in await self.list():
+            shard = assignment.get(c.username.lower().lstrip("@"))
+            if shard and c.shard != shard:
+                c.shard = shard
+                moved += 1
+        await self.session.commit()
+        return moved
+
+    async def advance_watermark(self, username: str, message_id: int, *, chat_id: int | None = None) -> None:
+        """Raise the channel's last processed message id (never lowers it); store its chat id."""
+        if chat_id is not None:
+            await self.session.execute(
+                update(Channel)
+                .where(func.lower(Channel.username) == username.strip().lstrip("@").lower(), Channel.chat_id.is_(None))
+                .values(chat_id=chat_id)
+                .execution_options(synchronize_session=False)
+            )
+        await self.session.execute(
+            update(Channel)
+            .where(
+                func.lower(Channel.username) == username.strip().lstrip("@").lower(),
+                (Channel.last_message_id.is_(None)) | (Channel.last_message_id < message_id),
+            )
+            .values(last_message_id=message_id)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+
     async def add(self, username: str) -> Channel:
         username = username.strip().lstrip("@")
         obj = Channel(username=username)
@@ -74,6 +119,20 @@ class ChannelRepo:
         await self.session.refresh(obj)
         return obj
 
+    async def set_policy(self, username: str, *, weight: float | None, max_in_flight: int | None) -> Channel:
+        """Set the channel's ingest weight and cap (None = default); adds the channel if missing."""
+        username = username.strip().lstrip("@")
+        res = await self.session.execute(select(Channel).where(func.lower(Channel.username) == username.lower()))
+        obj = res.scalar_one_or_none()
+        if obj is None:
+            obj = Channel(username=username)
+            self.session.add(obj)
+        obj.weight = weight
+        obj.max_in_flight = max_in_flight
+        await self.session.commit()
+        await self.session.refresh(obj)
+        return obj
+
     async def remove(self, username: str) -> int:
         username = username.strip().lstrip("@")
         res = await self.session.execute(delete(Channel).where(Channel.username == username))
@@ -100,6 +159,8 @@ class DraftRepo:
         caption: str,
         image_prompt: str,
         image_paths: list[str],
+        trace_parent: str | None = None,
+        status: str = "pending_review",
     ) -> Draft:
         obj = Draft(
             source_chat_id=source_chat_id,
@@ -108,11 +169,14 @@ class DraftRepo:
             caption=caption,
             image_prompt=image_prompt,
             image_paths_json=json.dumps(image_paths, ensure_ascii=False),
-            status="pending_review",
+            status=status,
+            trace_parent=trace_parent,
+            **_compiled_caption_values(caption),
         )
         self.session.add(obj)
         await self.session.commit()
         await self.session.refresh(obj)
+        DRAFTS_TOTAL.labels(status=obj.status).inc()
         return obj
 
     async def get(self, draft_id: int) -> Optional[Draft]:
@@ -127,6 +191,28 @@ class DraftRepo:
             values["published_at"] = datetime.utcnow()
         await self.session.execute(update(Draft).where(Draft.id == draft_id).values(**values))
         await self.session.commit()
+        DRAFTS_TOTAL.labels(status=status).inc()
+
+    async def set_destinations(self, draft_id: int, chats: list[str] | None) -> None:
+        """Route the draft to ``chats`` only; None sends it to every configured destination."""
+        value = ",".join(chats) if chats else None
+        await self.session.execute(
+            update(Draft).where(Draft.id == draft_id).values(destinations=value, updated_at=datetime.utcnow())
+        )
+        await self.session.commit()
+
+    async def transition(self, draft_id: int, *, from_status: str, to_status: str) -> bool:
+        """Atomically move a draft between statuses; False if it was not in ``from_status``."""
+        res = await self.session.execute(
+            update(Draft)
+            .where(Draft.id == draft_id, Draft.status == from_status)
+            .values(status=to_status, updated_at=datetime.utcnow())
+        )
+        await self.session.commit()
+        if not res.rowcount:
+            return False
+        DRAFTS_TOTAL.labels(status=to_status).inc()
+        return True
 
     async def set_review_message(self, draft_id: int, *, chat_id: int, message_id: int) -> None:
         await self.session.execute(
@@ -150,6 +236,7 @@ class DraftRepo:
                 image_prompt=image_prompt,
                 image_paths_json=json.dumps(image_paths, ensure_ascii=False),
                 updated_at=datetime.utcnow(),
+                **_compiled_caption_values(caption),
             )
         )
         await self.session.commit()
@@ -164,6 +251,385 @@ class DraftRepo:
         return res.scalars().all()
 
 
+    @staticmethod
+    def _claimable(now: datetime):
+        due = Draft.publish_retry_at.is_(None) | (Draft.publish_retry_at <= now)
+        return ((Draft.status == "approved") & Draft.published_at.is_(None) & due) | (
+            (Draft.status == "publishing") & (Draft.publish_lease_until < now)
+        )
+
+    async def claim_for_publish(self, limit: int, *, owner: str, lease_sec: float) -> Sequence[Draft]:
+        """Move up to ``limit`` queued drafts to "publishing" under ``owner``'s lease.
+
+        Drafts whose lease expired (publisher died) are claimed again. Postgres skips rows
+        locked by other publishers (FOR UPDATE SKIP LOCKED); elsewhere each row is taken by a
+        conditional UPDATE, so concurrent publishers never get the same draft.
+        """
+        now = datetime.utcnow()
+        order = (Draft.approved_at.asc().nulls_last(), Draft.id.asc())
+        values = {"status": "publishing", "publish_owner": owner, "publish_lease_until": now + timedelta(seconds=lease_sec)}
+        if self.session.get_bind().dialect.name == "postgresql":
+            res = await self.session.execute(
+                select(Draft.id).where(self._claimable(now)).order_by(*order).limit(limit).with_for_update(skip_locked=True)
+            )
+            ids = list(res.scalars().all())
+            if ids:
+                await self.session.execute(
+                    update(Draft).where(Draft.id.in_(ids)).values(**values).execution_options(synchronize_session=False)
+                )
+        else:
+            res = await self.session.execute(select(Draft.id).where(self._claimable(now)).order_by(*order).limit(limit * 4))
+            ids = []
+            for draft_id in res.scalars().all():
+                if len(ids) >= limit:
+                    break
+                won = await self.session.execute(
+                    update(Draft)
+                    .where(Draft.id == draft_id, self._claimable(now))
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                if won.rowcount:
+                    ids.append(draft_id)
+        await self.session.commit()
+        if not ids:
+            return []
+        DRAFTS_TOTAL.labels(status="publishing").inc(len(ids))
+        res = await self.session.execute(
+            select(Draft).where(Draft.id.in_(ids)).order_by(*order).execution_options(populate_existing=True)
+        )
+        return res.scalars().all()
+
+    async def extend_publish_lease(self, draft_id: int, *, owner: str, lease_sec: float) -> bool:
+        """Push the claim's expiry ``lease_sec`` ahead; False if another publisher owns the draft now."""
+        res = await self.session.execute(
+            update(Draft)
+            .where(Draft.id == draft_id, Draft.status == "publishing", Draft.publish_owner == owner)
+            .values(publish_lease_until=datetime.utcnow() + timedelta(seconds=lease_sec))
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        return bool(res.rowcount)
+
+    async def finish_publish(self, draft_id: int, *, owner: str, status: str) -> bool:
+        """Set the outcome of a claimed draft; False if the lease was lost to another publisher."""
+        now = datetime.utcnow()
+        values = {"status": status, "updated_at": now, "publish_owner": None, "publish_lease_until": None}
+        if status == "published":
+            values["published_at"] = now
+        res = await self.session.execute(
+            update(Draft)
+            .where(Draft.id == draft_id, Draft.status == "publishing", Draft.publish_owner == owner)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        if not res.rowcount:
+            return False
+        DRAFTS_TOTAL.labels(status=status).inc()
+        return True
+
+    async def retry_publish(self, draft_id: int, *, owner: str, attempts: int, retry_at: datetime) -> bool:
+        """Put a claimed draft back in the queue, claimable again from ``retry_at``."""
+        res = await self.session.execute(
+            update(Draft)
+            .where(Draft.id == draft_id, Draft.status == "publishing", Draft.publish_owner == owner)
+            .values(
+                status="approved",
+                updated_at=datetime.utcnow(),
+                publish_owner=None,
+                publish_lease_until=None,
+                publish_attempts=attempts,
+                publish_retry_at=retry_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        return bool(res.rowcount)
+
+
+class DraftPublicationRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def destinations_done(self, draft_id: int) -> set[str]:
+        res = await self.session.execute(
+            select(DraftPublication.destination).where(DraftPublication.draft_id == draft_id)
+        )
+        return set(res.scalars().all())
+
+    async def add(self, draft_id: int, destination: str, message_id: int) -> None:
+        self.session.add(DraftPublication(draft_id=draft_id, destination=destination, message_id=message_id))
+        try:
+            await self.session.commit()
+        except IntegrityError:
+            await self.session.rollback()
+
+
+class DraftTimingRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def record(self, draft_id: int, stages: dict[str, float]) -> None:
+        """Insert stage values that are not recorded yet for this draft (first write wins)."""
+        stages = {k: float(v) for k, v in stages.items() if v is not None}
+        if not stages:
+            return
+        res = await self.session.execute(
+            select(DraftTiming.stage).where(DraftTiming.draft_id == draft_id, DraftTiming.stage.in_(list(stages)))
+        )
+        existing = set(res.scalars().all())
+        for stage, value in stages.items():
+            if stage not in existing:
+                self.session.add(DraftTiming(draft_id=draft_id, stage=stage, value=max(value, 0.0)))
+        await self.session.commit()
+
+    async def percentiles(self, periods: dict[str, datetime]) -> dict[str, dict[str, tuple[int, float, float]]]:
+        """{period: {stage: (n, p50, p95)}} for rows newer than each period's cutoff.
+
+        Nearest-rank percentiles with window functions, all periods in one aggregate query.
+        """
+        p = union_all(
+            *(
+                select(literal(name, String).label("period"), literal(since, DateTime).label("since"))
+                for name, since in periods.items()
+            )
+        ).cte("periods")
+        ranked = (
+            select(
+                p.c.period,
+                DraftTiming.stage,
+                DraftTiming.value,
+                func.row_number()
+                .over(partition_by=(p.c.period, DraftTiming.stage), order_by=DraftTiming.value)
+                .label("rn"),
+                func.count().over(partition_by=(p.c.period, DraftTiming.stage)).label("n"),
+            )
+            .join_from(DraftTiming, p, DraftTiming.created_at >= p.c.since)
+            .subquery()
+        )
+        q = select(
+            ranked.c.period,
+            ranked.c.stage,
+            func.max(ranked.c.n),
+            func.min(case((ranked.c.rn >= 0.5 * ranked.c.n, ranked.c.value))),
+            func.min(case((ranked.c.rn >= 0.95 * ranked.c.n, ranked.c.value))),
+        ).group_by(ranked.c.period, ranked.c.stage)
+        out: dict[str, dict[str, tuple[int, float, float]]] = {k: {} for k in periods}
+        for period, stage, n, p50, p95 in (await self.session.execute(q)).all():
+            out[period][stage] = (int(n), float(p50), float(p95))
+        return out
+
+
+class UserbotShardRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def heartbeat(self, name: str, *, host: str) -> None:
+        obj = await self.session.get(UserbotShard, name)
+        now = datetime.utcnow()
+        if obj:
+            obj.heartbeat_at, obj.host = now, host
+        else:
+            self.session.add(UserbotShard(name=name, host=host, started_at=now, heartbeat_at=now))
+        await self.session.commit()
+
+    async def alive(self, ttl_sec: float) -> list[str]:
+        since = datetime.utcnow() - timedelta(seconds=ttl_sec)
+        res = await self.session.execute(
+            select(UserbotShard.name).where(UserbotShard.heartbeat_at >= since).order_by(UserbotShard.name)
+        )
+        return list(res.scalars().all())
+
+
+class BackfillCheckpointRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def start(self, channel: str, *, limit: int | None, since: datetime | None, restart: bool = False) -> BackfillCheckpoint:
+        """Checkpoint to continue from; a finished run, changed range or ``restart`` starts over."""
+        cp = await self.session.get(BackfillCheckpoint, channel)
+        if cp is None:
+            cp = BackfillCheckpoint(channel=channel, next_offset_id=0, scanned=0, forwarded=0, skipped=0)
+            self.session.add(cp)
+        elif restart or cp.finished_at is not None or cp.max_posts != limit or cp.since != since:
+            cp.next_offset_id, cp.scanned, cp.forwarded, cp.skipped, cp.finished_at = 0, 0, 0, 0, None
+        cp.max_posts, cp.since = limit, since
+        await self.session.commit()
+        return cp
+
+    async def save(self, cp: BackfillCheckpoint) -> None:
+        cp.updated_at = datetime.utcnow()
+        await self.session.commit()
+
+
+class IngestClaimRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def try_claim(self, source_chat_id: int, source_message_id: int, *, owner: str, ttl_sec: float) -> bool:
+        """Insert the claim row; False if another live ingest holds it. Claims older than
+        ``ttl_sec`` belong to a crashed process and are taken over."""
+        stale_before = datetime.utcnow() - timedelta(seconds=ttl_sec)
+        await self.session.execute(
+            delete(IngestClaim).where(
+                IngestClaim.source_chat_id == source_chat_id,
+                IngestClaim.source_message_id == source_message_id,
+                IngestClaim.claimed_at < stale_before,
+            )
+        )
+        self.session.add(IngestClaim(source_chat_id=source_chat_id, source_message_id=source_message_id, owner=owner))
+        try:
+            await self.session.commit()
+        except IntegrityError:
+            await self.session.rollback()
+            return False
+        return True
+
+    async def touch(self, source_chat_id: int, source_message_id: int, *, owner: str) -> bool:
+        """Restart the claim's TTL; False if it is no longer ``owner``'s (it went stale and was taken over)."""
+        res = await self.session.execute(
+            update(IngestClaim)
+            .where(
+                IngestClaim.source_chat_id == source_chat_id,
+                IngestClaim.source_message_id == source_message_id,
+                IngestClaim.owner == owner,
+            )
+            .values(claimed_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        return bool(res.rowcount)
+
+    async def release(self, source_chat_id: int, source_message_id: int, *, owner: str) -> None:
+        await self.session.execute(
+            delete(IngestClaim).where(
+                IngestClaim.source_chat_id == source_chat_id,
+                IngestClaim.source_message_id == source_message_id,
+                IngestClaim.owner == owner,
+            )
+        )
+        await self.session.commit()
+
+
+class FsmRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get(self, key: str, *, ttl_sec: float) -> tuple[str | None, dict]:
+        """(state, data) for ``key``; records idle for longer than ``ttl_sec`` count as empty."""
+        obj = await self.session.get(FsmRecord, key)
+        if not obj or obj.updated_at < datetime.utcnow() - timedelta(seconds=ttl_sec):
+            return None, {}
+        return obj.state, (json.loads(obj.data) if obj.data else {})
+
+    async def put(self, key: str, *, ttl_sec: float, **fields: object) -> None:
+        """Write ``state`` and/or ``data``; a record left with neither is deleted.
+
+        A record idle for longer than ``ttl_sec`` is empty for ``get``, so the field not
+        written is cleared rather than revived with the write.
+        """
+        values: dict = {}
+        if "state" in fields:
+            values["state"] = fields["state"]
+        if "data" in fields:
+            values["data"] = json.dumps(fields["data"], ensure_ascii=False) if fields["data"] else None
+        for attempt in range(2):
+            obj = await self.session.get(FsmRecord, key)
+            if obj is None:
+                if not any(values.values()):
+                    return
+                obj = FsmRecord(key=key, state=None, data=None)
+                self.session.add(obj)
+            elif obj.updated_at < datetime.utcnow() - timedelta(seconds=ttl_sec):
+                obj.state, obj.data = None, None
+            for name, value in values.items():
+                setattr(obj, name, value)
+            obj.updated_at = datetime.utcnow()
+            if obj.state is None and obj.data is None:
+                await self.session.delete(obj)
+            try:
+                await self.session.commit()
+                return
+            except IntegrityError:
+                # Inserted concurrently by another worker: retry as an update.
+                await self.session.rollback()
+                if attempt:
+                    raise
+
+    async def purge(self, *, ttl_sec: float) -> int:
+        res = await self.session.execute(
+            delete(FsmRecord).where(FsmRecord.updated_at < datetime.utcnow() - timedelta(seconds=ttl_sec))
+        )
+        await self.session.commit()
+        return int(res.rowcount or 0)
+
+
+class LeaseRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def acquire(self, name: str, *, owner: str, ttl_sec: float) -> bool:
+        """Take or renew ``name`` for ``owner``; False while another owner's lease is live."""
+        now = datetime.utcnow()
+        await self.session.execute(delete(Lease).where(Lease.name == name, Lease.expires_at < now))
+        expires_at = now + timedelta(seconds=ttl_sec)
+        res = await self.session.execute(
+            update(Lease)
+            .where(Lease.name == name, Lease.owner == owner)
+            .values(expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount:
+            await self.session.commit()
+            return True
+        self.session.add(Lease(name=name, owner=owner, expires_at=expires_at))
+        try:
+            await self.session.commit()
+        except IntegrityError:
+            await self.session.rollback()
+            return False
+        return True
+
+    async def release(self, name: str, *, owner: str) -> None:
+        await self.session.execute(delete(Lease).where(Lease.name == name, Lease.owner == owner))
+        await self.session.commit()
+
+
+class IngestTraceRepo:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def put(self, source_chat_id: int, source_message_id: int, trace_parent: str) -> None:
+        obj = await self.session.get(IngestTrace, (source_chat_id, source_message_id))
+        if obj:
+            obj.trace_parent = trace_parent
+        else:
+            self.session.add(
+                IngestTrace(source_chat_id=source_chat_id, source_message_id=source_message_id, trace_parent=trace_parent)
+            )
+        await self.session.commit()
+
+    async def get(self, source_chat_id: int, source_message_id: int) -> Optional[str]:
+        obj = await self.session.get(IngestTrace, (source_chat_id, source_message_id))
+        return obj.trace_parent if obj else None
+
+    async def delete(self, source_chat_id: int, source_message_id: int) -> None:
+        await self.session.execute(
+            delete(IngestTrace).where(
+                IngestTrace.source_chat_id == source_chat_id, IngestTrace.source_message_id == source_message_id
+            )
+        )
+        await self.session.commit()
+
+    async def purge(self, *, ttl_sec: float) -> int:
+        res = await self.session.execute(
+            delete(IngestTrace).where(IngestTrace.created_at < datetime.utcnow() - timedelta(seconds=ttl_sec))
+        )
+        await self.session.commit()
+        return int(res.rowcount or 0)
+
+
 class PromptTokenRepo:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -1,15 +1,27 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import json
 import logging
+import time
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential
 
 from src.common.config import settings
+from src.infra.kie.hedging import KIE_HEDGE
+from src.infra.resilience.breaker import KIE_BREAKER
+from src.infra.tracing.tracer import span
+from src.infra.metrics.metrics import (
+    KIE_CREATE_SECONDS,
+    KIE_DOWNLOAD_SECONDS,
+    KIE_HEDGES_TOTAL,
+    KIE_POLL_COUNT,
+    KIE_POLL_WAIT_SECONDS,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +57,8 @@ class KieClient:
         self.create_path = settings.kie_create_path
         self.query_path = settings.kie_query_path
         self.api_key = settings.kie_api_key
+        # recordInfo calls made by this client (across tasks and retries).
+        self.poll_count = 0
 
         self.http = httpx.AsyncClient(
             timeout=httpx.Timeout(300.0, connect=30.0),
@@ -91,12 +105,15 @@ class KieClient:
     async def _create_task(self, *, model: str, input_data: dict) -> str:
         url = f"{self.base}{self.create_path}"
         payload = {"model": model, "input": input_data}
-        r = await self.http.post(url, json=payload)
+        with KIE_CREATE_SECONDS.time():
+            r = await self.http.post(url, json=payload)
         r.raise_for_status()
         result = r.json()
 
         code = result.get("code")
         if code == 402:
+            # Retrying will not bring credits back: fail fast until the breaker probes again.
+            KIE_BREAKER.trip()
             raise KIEInsufficientCreditsError(result)
         if code != 200:
             raise ValueError(f"KIE createTask failed: {result.get('msg') or result.get('message') or result}")
@@ -130,20 +147,73 @@ class KieClient:
         return {"state": state, "result": result_dict}
 
     async def _poll_task(self, *, task_id: str) -> dict:
-        import asyncio
-
+        started = time.perf_counter()
         for attempt in range(int(settings.kie_max_attempts)):
+            self.poll_count += 1
             st = await self._get_status(task_id=task_id)
             state = st["state"]
             if state == "success":
+                KIE_POLL_COUNT.observe(attempt + 1)
+                KIE_POLL_WAIT_SECONDS.observe(time.perf_counter() - started)
+                KIE_HEDGE.observe(time.perf_counter() - started)
                 return st["result"]
-            await asyncio.sleep(int(settings.kie_poll_interval_sec))
+            await asyncio.sleep(float(settings.kie_poll_interval_sec))
         raise TimeoutError(
             f"KIE task timeout after {settings.kie_max_attempts} attempts "
             f"({settings.kie_max_attempts * settings.kie_poll_interval_sec} seconds)"
         )
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=20))
+    async def _await_result(self, *, task_id: str, model: str, input_data: dict) -> tuple[str, dict]:
+        """Poll ``task_id``; hedge it with a duplicate task if it runs into the latency tail.
+
+        Returns (task_id, result) of whichever task succeeded first.
+        """
+        delay = KIE_HEDGE.delay()
+        if delay is None:
+            return task_id, await self._poll_task(task_id=task_id)
+
+        primary = asyncio.create_task(self._poll_task(task_id=task_id))
+        running: dict[asyncio.Task, str] = {primary: task_id}
+        started: dict[asyncio.Task, float] = {primary: time.perf_counter()}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return task_id, primary.result()
+            if not KIE_HEDGE.try_acquire():
+                KIE_HEDGES_TOTAL.labels(result="budget_exhausted").inc()
+                return task_id, await primary
+
+            logger.info("KIE: task %s still running after %.1fs, launching a hedge", task_id, delay)
+            try:
+                with span("kie.hedge", primary_task_id=task_id, delay=delay):
+                    hedge_id = await self._create_task(model=model, input_data=input_data)
+            except Exception as e:
+                # Including a 402 (the breaker is tripped already): the primary is paid for, keep it.
+                logger.warning("KIE: hedge createTask failed, waiting for %s: %s", task_id, e)
+                KIE_HEDGES_TOTAL.labels(result="create_failed").inc()
+                return task_id, await primary
+            KIE_HEDGES_TOTAL.labels(result="launched").inc()
+            hedge = asyncio.create_task(self._poll_task(task_id=hedge_id))
+            running[hedge] = hedge_id
+            started[hedge] = time.perf_counter()
+
+            error: BaseException | None = None
+            pending = set(running)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        KIE_HEDGES_TOTAL.labels(result="hedge_won" if t is hedge else "primary_won").inc()
+                        for loser in pending:
+                            KIE_HEDGE.observe_abandoned(time.perf_counter() - started[loser])
+                        return running[t], t.result()
+                    error = error or t.exception()
+            raise error or RuntimeError(f"KIE hedged tasks failed: {task_id}")
+        finally:
+            # The losing task is abandoned: stop polling it.
+            for t in running:
+                t.cancel()
+
     async def generate(
         self,
         *,
@@ -161,7 +231,39 @@ class KieClient:
 
         Note: Telegram file URLs (``https://api.telegram.org/file/bot<TOKEN>/...``)
         are acceptable as long as KIE can fetch them from the Internet.
+
+        The call (retries included) goes through the shared KIE circuit breaker once: while it
+        is open this raises ``CircuitOpenError`` immediately, and a draft that fails counts as
+        one breaker failure.
         """
+        async with KIE_BREAKER.guard():
+            return await self._generate(
+                prompt=prompt,
+                out_dir=out_dir,
+                n=n,
+                image_urls=image_urls,
+                output_format=output_format,
+                image_size=image_size,
+            )
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=20),
+        # Never retry cancellation (superseded regenerations), failures retries cannot fix, or
+        # a poll timeout: the task already spent the whole KIE_MAX_ATTEMPTS budget.
+        retry=retry_if_not_exception_type((asyncio.CancelledError, KIEInsufficientCreditsError, TimeoutError)),
+        reraise=True,
+    )
+    async def _generate(
+        self,
+        *,
+        prompt: str,
+        out_dir: str,
+        n: int,
+        image_urls: Optional[List[str]] = None,
+        output_format: Optional[str] = None,
+        image_size: Optional[str] = None,
+    ) -> List[str]:
         Path(out_dir).mkdir(parents=True, exist_ok=True)
 
         model = settings.kie_model
@@ -178,8 +280,10 @@ class KieClient:
         # or create multiple tasks. We'll create multiple tasks to guarantee count.
         out_paths: List[str] = []
         for i in range(n):
-            task_id = await self._create_task(model=model, input_data=input_data)
-            result = await self._poll_task(task_id=task_id)
+            with span("kie.create", model=model):
+                task_id = await self._create_task(model=model, input_data=input_data)
+            with span("kie.poll", task_id=task_id):
+                task_id, result = await self._await_result(task_id=task_id, model=model, input_data=input_data)
 
             urls = result.get("resultUrls") or result.get("result_urls") or []
             if not urls:
@@ -187,8 +291,9 @@ class KieClient:
 
             # Take first url
             img_url = urls[0]
-            img = await self.http.get(img_url)
-            img.raise_for_status()
+            with span("kie.download", task_id=task_id), KIE_DOWNLOAD_SECONDS.time():
+                img = await self.http.get(img_url)
+                img.raise_for_status()
             fp = Path(out_dir) / f"img_{i+1}.png"
             fp.write_bytes(img.content)
             out_paths.append(str(fp))
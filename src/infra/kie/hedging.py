@@ -0,0 +1,61 @@
+"""Hedging policy for KIE tasks.
+
+KIE completion times have a long tail. When a task is still running after the
+``KIE_HEDGE_PERCENTILE`` of recent completion times, ``KieClient`` launches an identical
+second task and takes whichever finishes first; the loser is abandoned (KIE has no cancel
+endpoint, its result is simply never downloaded). Hedges are capped by
+``KIE_HEDGE_PER_HOUR`` so the extra spend stays bounded; 0 disables hedging.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+
+from src.common.config import settings
+
+_WINDOW = 200
+_HOUR = 3600.0
+
+
+class HedgePolicy:
+    def __init__(self) -> None:
+        self._samples: deque[float] = deque(maxlen=_WINDOW)
+        self._launched: deque[float] = deque()
+
+    def observe(self, seconds: float) -> None:
+        """Record a completed task, from the start of polling to success.
+
+        That is the clock ``delay()`` is applied on: ``KieClient`` starts it after createTask.
+        """
+        self._samples.append(seconds)
+
+    def observe_abandoned(self, seconds: float) -> None:
+        """Record a task abandoned after losing a hedge race, at the time it ran so far.
+
+        Its real latency is at least ``seconds`` (a censored sample). Without it only the
+        winners would be recorded, and the percentile, hence the hedge delay, would keep
+        drifting down as every slow task gets hedged away.
+        """
+        self._samples.append(seconds)
+
+    def delay(self) -> float | None:
+        """Seconds to wait before hedging a new task, or None if hedging is off for now."""
+        if settings.kie_hedge_per_hour <= 0 or len(self._samples) < max(1, settings.kie_hedge_min_samples):
+            return None
+        ordered = sorted(self._samples)
+        q = min(max(settings.kie_hedge_percentile, 0.0), 100.0) / 100.0
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def try_acquire(self) -> bool:
+        """Take one hedge from the hourly budget."""
+        now = time.monotonic()
+        while self._launched and now - self._launched[0] > _HOUR:
+            self._launched.popleft()
+        if len(self._launched) >= settings.kie_hedge_per_hour:
+            return False
+        self._launched.append(now)
+        return True
+
+
+KIE_HEDGE = HedgePolicy()
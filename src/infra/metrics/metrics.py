@@ -0,0 +1,127 @@
+"""Prometheus metrics for the pipeline.
+
+One module-level registry (prometheus_client default) per process. The admin bot and the
+userbot expose it via ``start_metrics_server``; the resolver API serves it on ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest, start_http_server
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Seconds; KIE tasks run for minutes, API calls for milliseconds.
+_FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_SLOW_BUCKETS = (1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0, 180.0, 300.0, 600.0, 1200.0)
+
+KIE_CREATE_SECONDS = Histogram("poster_kie_create_seconds", "KIE createTask latency", buckets=_FAST_BUCKETS)
+KIE_POLL_COUNT = Histogram(
+    "poster_kie_poll_count", "recordInfo calls per KIE task", buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 120, 200)
+)
+KIE_POLL_WAIT_SECONDS = Histogram(
+    "poster_kie_poll_wait_seconds", "Time from KIE task creation to success", buckets=_SLOW_BUCKETS
+)
+KIE_DOWNLOAD_SECONDS = Histogram("poster_kie_download_seconds", "KIE result download time", buckets=_FAST_BUCKETS)
+KIE_HEDGES_TOTAL = Counter(
+    "poster_kie_hedges_total",
+    "Hedged KIE tasks: launched, hedge_won, primary_won, budget_exhausted, create_failed",
+    ["result"],
+)
+OPENAI_CAPTION_SECONDS = Histogram(
+    "poster_openai_caption_seconds", "OpenAI caption generation time", buckets=_SLOW_BUCKETS[:9]
+)
+DB_QUERY_SECONDS = Histogram("poster_db_query_seconds", "DB statement time", ["op"], buckets=_FAST_BUCKETS)
+BOT_API_SECONDS = Histogram("poster_bot_api_seconds", "Bot API call time", ["method"], buckets=_FAST_BUCKETS)
+BOT_API_QUEUE_DEPTH = Gauge("poster_bot_api_queue_depth", "Bot API calls waiting for a rate-limit token", ["scope"])
+BOT_API_THROTTLE_SECONDS = Histogram(
+    "poster_bot_api_throttle_seconds", "Time a Bot API call waited for rate-limit tokens", buckets=_FAST_BUCKETS
+)
+BOT_API_RETRY_AFTER_TOTAL = Counter("poster_bot_api_retry_after_total", "TelegramRetryAfter responses", ["method"])
+
+REGEN_REQUESTS_TOTAL = Counter(
+    "poster_regen_requests_total", "Regenerate clicks: started, joined (coalesced), superseded", ["outcome"]
+)
+INGEST_DUPLICATES_TOTAL = Counter(
+    "poster_ingest_duplicates_total", "Duplicate ingests that waited for the first run", ["where"]
+)
+INGEST_QUEUE_DEPTH = Gauge("poster_ingest_queue_depth", "Posts waiting for an ingest slot", ["lane"])
+INGEST_QUEUE_WAIT_SECONDS = Histogram(
+    "poster_ingest_queue_wait_seconds", "Time a post waited for an ingest slot", ["lane"], buckets=_SLOW_BUCKETS
+)
+USERBOT_OUTBOX_DEPTH = Gauge("poster_userbot_outbox_depth", "Channel posts waiting to be forwarded", ["session"])
+USERBOT_FLOODWAIT_SECONDS_TOTAL = Counter(
+    "poster_userbot_floodwait_seconds_total", "FloodWait seconds imposed on userbot sessions", ["session"]
+)
+USERBOT_DELIVERIES_TOTAL = Counter(
+    "poster_userbot_deliveries_total", "Posts handed to the ingest bot, by method that worked", ["method"]
+)
+USERBOT_SHARDS_ALIVE = Gauge("poster_userbot_shards_alive", "Userbot sessions with a fresh heartbeat")
+USERBOT_CHANNELS_MOVED_TOTAL = Counter(
+    "poster_userbot_channels_moved_total", "Channels reassigned to another userbot session"
+)
+DRAFTS_TOTAL = Counter("poster_drafts_total", "Draft status transitions", ["status"])
+FAILURES_TOTAL = Counter("poster_failures_total", "Failures by pipeline stage and cause", ["stage", "cause"])
+IN_FLIGHT = Gauge("poster_in_flight", "Jobs currently running", ["job"])
+CIRCUIT_STATE = Gauge("poster_circuit_state", "Provider circuit: 0 closed, 1 half-open, 2 open", ["provider"])
+CIRCUIT_TRANSITIONS_TOTAL = Counter("poster_circuit_transitions_total", "Circuit state changes", ["provider", "state"])
+CIRCUIT_REJECTED_TOTAL = Counter("poster_circuit_rejected_total", "Calls failed fast by an open circuit", ["provider"])
+
+
+def record_failure(stage: str, exc: BaseException) -> None:
+    FAILURES_TOTAL.labels(stage=stage, cause=type(exc).__name__).inc()
+
+
+def in_flight(job: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Decorator for coroutines: keep ``poster_in_flight{job=...}`` up while they run."""
+    gauge = IN_FLIGHT.labels(job=job)
+
+    def deco(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            gauge.inc()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                gauge.dec()
+
+        return wrapper
+
+    return deco
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every DB statement, labelled by its verb (select/insert/update/...)."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001
+        conn.info.setdefault("poster_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001
+        starts = conn.info.get("poster_query_start")
+        if not starts:
+            return
+        op = (statement.lstrip().split(None, 1) or ["?"])[0].lower()
+        DB_QUERY_SECONDS.labels(op=op).observe(time.perf_counter() - starts.pop())
+
+
+def start_metrics_server(port: int, bind: str = "0.0.0.0") -> None:
+    """Expose /metrics on a small background HTTP listener (bot/userbot processes)."""
+    if not port:
+        return
+    start_http_server(port, addr=bind)
+    logger.info("Metrics: listening on %s:%s", bind, port)
+
+
+def render_latest() -> tuple[bytes, str]:
+    """(body, content_type) for a /metrics response."""
+    return generate_latest(), CONTENT_TYPE_LATEST
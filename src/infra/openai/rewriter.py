@@ -10,6 +10,9 @@ from openai import OpenAI
 
 from src.common.config import settings
 from src.common.templates import DEFAULT_REWRITE_TEMPLATE
+from src.infra.metrics.metrics import OPENAI_CAPTION_SECONDS
+from src.infra.resilience.breaker import OPENAI_BREAKER
+from src.infra.tracing.tracer import span
 
 logger = logging.getLogger(__name__)
 
@@ -26,18 +29,21 @@ class OpenAIRewriter:
             raise ValueError("OPENAI_API_KEY is not set")
 
         # --- PROXY CONFIG (host:port:user:pass) ---
-        proxy_raw = "156.233.82.121:63464:11f1wsnM:mddvZFkM"
-        host, port, user, password = proxy_raw.split(":", 3)
-
-        # HTTP proxy URL with basic auth
-        proxy_url = f"http://{user}:{password}@{host}:{port}"
+        proxies = None
+        proxy_raw = (settings.openai_proxy or "").strip()
+        if proxy_raw:
+            host, port, user, password = proxy_raw.split(":", 3)
+
+            # HTTP proxy URL with basic auth
+            proxy_url = f"http://{user}:{password}@{host}:{port}"
+            proxies = {
+                "http://": proxy_url,
+                "https://": proxy_url,
+            }
 
         # httpx client with proxy (applies to both http and https)
         http_client = httpx.Client(
-            proxies={
-                "http://": proxy_url,
-                "https://": proxy_url,
-            },
+            proxies=proxies,
             timeout=httpx.Timeout(60.0, connect=30.0),
             # verify=True  # default; leave as-is unless your proxy uses MITM cert issues
         )
@@ -45,6 +51,7 @@ class OpenAIRewriter:
         # Pass custom http client into OpenAI
         self.client = OpenAI(
             api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url or None,
             http_client=http_client,
         )
 
@@ -132,7 +139,9 @@ class OpenAIRewriter:
                 except Exception as e:
                     raise RuntimeError(f"Failed to parse JSON from OpenAI: {e}; raw={text[:500]}")
 
-        data = await asyncio.to_thread(_call)
+        async with OPENAI_BREAKER.guard():
+            with span("openai.caption", model=settings.openai_model), OPENAI_CAPTION_SECONDS.time():
+                data = await asyncio.to_thread(_call)
 
         caption_html = str(data.get("caption_html") or "").strip()
         promptika_prompt = str(data.get("promptika_prompt") or "").strip()
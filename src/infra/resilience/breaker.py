@@ -0,0 +1,165 @@
+"""Per-provider circuit breakers (KIE, OpenAI).
+
+A breaker counts consecutive failures of calls made through ``guard()``. After
+``CIRCUIT_FAILURE_THRESHOLD`` of them it opens (``trip()`` opens it right away, e.g. when
+KIE reports that credits ran out): calls fail immediately with ``CircuitOpenError`` instead of waiting for timeouts.
+After the open period one probe call is let through (half-open); success closes the
+breaker, failure opens it again with a doubled period (capped by CIRCUIT_MAX_OPEN_SEC).
+Only the probe decides: calls let in while the breaker was still closed (a KIE task runs
+for minutes) may finish during the half-open period, and their outcome is ignored.
+
+Breakers are module-level singletons, so ingest and regenerate in the same process share
+them. State is exported as ``poster_circuit_state{provider=...}``.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from src.common.config import settings
+from src.infra.metrics.metrics import CIRCUIT_REJECTED_TOTAL, CIRCUIT_STATE, CIRCUIT_TRANSITIONS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, name: str, retry_in: float):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(f"{name} circuit is open (next probe in {retry_in:.1f}s)")
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe.
+
+    Not thread-safe: state changes happen on the event loop (``guard`` is async), which
+    is enough for the bot processes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int,
+        open_sec: float,
+        max_open_sec: float,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_sec = open_sec
+        self.max_open_sec = max(open_sec, max_open_sec)
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.current_open_sec = open_sec
+        # Token of the call probing the half-open breaker; None when no probe is running.
+        self._probe: object | None = None
+        CIRCUIT_STATE.labels(provider=name).set(0)
+
+    def _set_state(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning("Circuit %s: %s -> %s", self.name, self.state, state)
+        self.state = state
+        CIRCUIT_STATE.labels(provider=self.name).set(_STATE_VALUE[state])
+        CIRCUIT_TRANSITIONS_TOTAL.labels(provider=self.name, state=state).inc()
+
+    def retry_in(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.current_open_sec - time.monotonic())
+
+    def _before_call(self) -> object | None:
+        """Admit a call; returns its probe token when it is the half-open probe, else None."""
+        if self.state == OPEN and self.retry_in() <= 0:
+            self._set_state(HALF_OPEN)
+        if self.state == OPEN or (self.state == HALF_OPEN and self._probe is not None):
+            CIRCUIT_REJECTED_TOTAL.labels(provider=self.name).inc()
+            raise CircuitOpenError(self.name, self.retry_in())
+        if self.state == HALF_OPEN:
+            self._probe = object()
+            return self._probe
+        return None
+
+    def _after_call(self, probe: object | None, *, ok: bool) -> None:
+        if probe is not None:
+            # A probe outlived by trip() (breaker reopened meanwhile) no longer counts.
+            if probe is not self._probe:
+                return
+            self._probe = None
+            if self.state != HALF_OPEN:
+                return
+            if ok:
+                self.record_success()
+            else:
+                self._open()
+        elif self.state == CLOSED:
+            if ok:
+                self.record_success()
+            else:
+                self.record_failure()
+
+    def _open(self) -> None:
+        if self.state == HALF_OPEN:
+            self.current_open_sec = min(self.current_open_sec * 2, self.max_open_sec)
+        elif self.state == CLOSED:
+            self.current_open_sec = self.open_sec
+        self.opened_at = time.monotonic()
+        self._probe = None
+        self._set_state(OPEN)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.current_open_sec = self.open_sec
+        self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._open()
+
+    def trip(self) -> None:
+        """Open the breaker right away (a failure that retries cannot fix)."""
+        if self.state != OPEN:
+            self._open()
+
+    def reset(self) -> None:
+        self._probe = None
+        self.record_success()
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """Wrap one provider call; raises CircuitOpenError without calling when open."""
+        probe = self._before_call()
+        try:
+            yield
+        except Exception:
+            self._after_call(probe, ok=False)
+            raise
+        except BaseException:
+            # Cancellation says nothing about the provider: just free the probe slot.
+            if probe is not None and probe is self._probe:
+                self._probe = None
+            raise
+        else:
+            self._after_call(probe, ok=True)
+
+
+def _breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_threshold=settings.circuit_failure_threshold,
+        open_sec=settings.circuit_open_sec,
+        max_open_sec=settings.circuit_max_open_sec,
+    )
+
+
+KIE_BREAKER = _breaker("kie")
+OPENAI_BREAKER = _breaker("openai")
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import logging
+import os
+import socket
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from aiogram import Bot
 
 from src.common.config import settings
 from src.infra.db.base import async_session_maker
+from src.infra.db.repositories import LeaseRepo
 from src.usecases.publish_queue import publish_queue_tick
 
 logger = logging.getLogger(__name__)
@@ -25,8 +28,19 @@ def build_scheduler(bot: Bot) -> AsyncIOScheduler:
         )
     return scheduler
 
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
 async def _publish_job(bot: Bot) -> None:
+    # Every instance / webhook worker schedules the job; the lease holder runs it, so the queue
+    # drains at one PUBLISH_BATCH_SIZE per interval however many workers there are. A dead
+    # leader's lease runs out after two intervals and another worker takes over. Drafts are
+    # still claimed row by row, so a takeover never publishes a draft twice.
     async with async_session_maker() as db:
+        ttl = max(60, settings.publish_every_minutes * 60 * 2)
+        if not await LeaseRepo(db).acquire("scheduler:publish_queue", owner=_owner(), ttl_sec=ttl):
+            return
         n = await publish_queue_tick(db=db, bot=bot)
         if n:
             logger.info("Published %s post(s)", n)
@@ -5,6 +5,14 @@ class DraftCb(CallbackData, prefix="draft"):
     action: str
     draft_id: int
 
+class CandidateCb(CallbackData, prefix="cand"):
+    draft_id: int
+    index: int
+
+class DestinationCb(CallbackData, prefix="dest"):
+    draft_id: int
+    index: int
+
 class PanelCb(CallbackData, prefix="panel"):
     action: str  
     page: int = 0
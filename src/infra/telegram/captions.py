@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from aiogram.types import MessageEntity
+
+from src.common.tg_entities import CompiledCaption, compile_caption, split_compiled
+
+# Telegram limits (UTF-16 code units of the visible text).
+PHOTO_CAPTION_LIMIT = 1024
+TEXT_LIMIT = 4096
+
+
+def caption_parts(
+    caption: str,
+    compiled: Optional[CompiledCaption] = None,
+    *,
+    first_limit: int,
+    limit: int = TEXT_LIMIT,
+) -> list[CompiledCaption]:
+    """Split a caption into sendable parts; the first one fits ``first_limit``.
+
+    Uses the compiled caption cached on the draft; older drafts are compiled on the fly.
+    """
+    c = compiled if compiled is not None else compile_caption(caption)[0]
+    return split_compiled(c, limit=limit, first_limit=first_limit) or [CompiledCaption(text="")]
+
+
+def message_entities(part: CompiledCaption) -> Optional[list[MessageEntity]]:
+    return [MessageEntity(**e) for e in part.entities] or None
@@ -0,0 +1,81 @@
+"""aiogram FSM storage on the app database (table ``fsm_states``).
+
+Panel dialogs (manual post, add channel, edit setting) survive restarts and work when
+several webhook workers serve updates. One row per conversation holds the state and the
+JSON data. Rows idle for FSM_STATE_TTL_SEC are treated as empty and purged from time to
+time. A short write-through read cache (FSM_CACHE_TTL_SEC) absorbs the repeated reads
+aiogram makes while handling one update.
+"""
+
+from __future__ import annotations
+
+import copy
+import logging
+import time
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from src.common.config import settings
+from src.infra.db.base import async_session_maker
+from src.infra.db.repositories import FsmRepo
+
+logger = logging.getLogger(__name__)
+
+_PURGE_EVERY_SEC = 600.0
+
+
+class SqlStorage(BaseStorage):
+    def __init__(self) -> None:
+        self._keys = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache: dict[str, tuple[float, str | None, dict[str, Any]]] = {}
+        self._purged_at = time.monotonic()
+
+    async def _read(self, key: StorageKey) -> tuple[str | None, dict[str, Any]]:
+        k = self._keys.build(key)
+        hit = self._cache.get(k)
+        if hit and time.monotonic() < hit[0]:
+            return hit[1], hit[2]
+        async with async_session_maker() as db:
+            state, data = await FsmRepo(db).get(k, ttl_sec=settings.fsm_state_ttl_sec)
+        self._remember(k, state, data)
+        return state, data
+
+    def _remember(self, k: str, state: str | None, data: dict[str, Any]) -> None:
+        if settings.fsm_cache_ttl_sec > 0:
+            self._cache[k] = (time.monotonic() + settings.fsm_cache_ttl_sec, state, data)
+            if len(self._cache) > 10_000:
+                now = time.monotonic()
+                self._cache = {ck: v for ck, v in self._cache.items() if v[0] > now}
+
+    async def _write(self, key: StorageKey, **fields: Any) -> None:
+        k = self._keys.build(key)
+        async with async_session_maker() as db:
+            repo = FsmRepo(db)
+            await repo.put(k, ttl_sec=settings.fsm_state_ttl_sec, **fields)
+            if time.monotonic() - self._purged_at > _PURGE_EVERY_SEC:
+                self._purged_at = time.monotonic()
+                n = await repo.purge(ttl_sec=settings.fsm_state_ttl_sec)
+                if n:
+                    logger.info("FSM: purged %d stale state(s)", n)
+        hit = self._cache.pop(k, None)
+        if hit and time.monotonic() < hit[0]:
+            self._remember(k, fields.get("state", hit[1]), fields.get("data", hit[2]))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._write(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _data = await self._read(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._write(key, data=copy.deepcopy(dict(data)))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _state, data = await self._read(key)
+        return copy.deepcopy(data)
+
+    async def close(self) -> None:
+        self._cache.clear()
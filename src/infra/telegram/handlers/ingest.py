@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import logging
 import re
+from datetime import datetime, timezone
+from functools import partial
 from aiogram import Router, Bot, F
 from aiogram.types import Message
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -9,6 +11,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from src.common.config import settings
 from src.usecases.ingest_and_build_draft import ingest_and_build_draft
 from src.usecases.send_to_review import send_to_review
+from src.usecases.stage_timings import record_stage_timings
+from src.infra.db.repositories import IngestTraceRepo
+from src.infra.telegram.media import extract_best_image_file_id, reference_image_urls
+from src.infra.metrics.metrics import record_failure
+from src.infra.tracing.tracer import span
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -24,6 +31,16 @@ def _extract_forward_source(message: Message) -> tuple[int, int] | None:
             return chat.id, mid
     return None
 
+def _stage_timings(message: Message) -> dict[str, float]:
+    """Capture delay (source post -> forwarded to us) and queue wait (forwarded -> handled)."""
+    now = datetime.now(timezone.utc)
+    out: dict[str, float] = {"queue_wait": (now - message.date).total_seconds()}
+    origin_date = getattr(getattr(message, "forward_origin", None), "date", None)
+    if origin_date:
+        out["capture_delay"] = (message.date - origin_date).total_seconds()
+    return out
+
+
 def _extract_text(message: Message) -> str:
     return (message.text or message.caption or "").strip()
 
@@ -51,23 +68,6 @@ def _strip_src_tag(text: str) -> tuple[str, tuple[int, int] | None]:
     return cleaned, (chat_id, msg_id)
 
 
-async def _extract_image_urls(message: Message, bot: Bot, *, max_images: int = 3) -> list[str]:
-
-    urls: list[str] = []
-
-    if message.photo:
-        photo = message.photo[-1]
-        tg_file = await bot.get_file(photo.file_id)
-        urls.append(f"https://api.telegram.org/file/bot{settings.telegram_bot_token}/{tg_file.file_path}")
-        return urls
-
-    if message.document and message.document.mime_type and message.document.mime_type.startswith("image/"):
-        tg_file = await bot.get_file(message.document.file_id)
-        urls.append(f"https://api.telegram.org/file/bot{settings.telegram_bot_token}/{tg_file.file_path}")
-        return urls
-
-    return urls
-
 @router.message()
 async def ingest_any(message: Message, db: AsyncSession, bot: Bot):
     if settings.userbot_sender_id and message.from_user and message.from_user.id != settings.userbot_sender_id:
@@ -84,20 +84,31 @@ async def ingest_any(message: Message, db: AsyncSession, bot: Bot):
         src = (message.chat.id, message.message_id)
 
     source_chat_id, source_message_id = src
-
-    try:
-        image_urls = await _extract_image_urls(message, bot, max_images=settings.kie_images_count)
-        if not text and not image_urls:
-            return
-        draft_id = await ingest_and_build_draft(
-            db=db,
-            source_chat_id=source_chat_id,
-            source_message_id=source_message_id,
-            original_text=text or "",
-            source_image_urls=image_urls or None,
-        )
-        await send_to_review(db=db, bot=bot, draft_id=draft_id)
-        await message.answer(f"✅ Принято. Draft #{draft_id} отправлен на модерацию.")
-    except Exception as e:
-        logger.exception("Ingest failed")
-        await message.answer(f"⚠️ Ошибка ingest: {e}")
+    timings = _stage_timings(message)
+
+    trace_parent = await IngestTraceRepo(db).get(source_chat_id, source_message_id)
+    with span("ingest", parent=trace_parent, source_chat_id=source_chat_id, source_message_id=source_message_id) as sp:
+        try:
+            file_id = extract_best_image_file_id(message)
+            if not text and not file_id:
+                return
+            # Resolved inside the ingest slot: a URL built now could expire while the post is queued.
+            images = partial(reference_image_urls, bot, [file_id], local_name=f"{message.chat.id}_{message.message_id}")
+            draft_id = await ingest_and_build_draft(
+                db=db,
+                source_chat_id=source_chat_id,
+                source_message_id=source_message_id,
+                original_text=text or "",
+                source_images=images if file_id else None,
+                timings=timings,
+            )
+            await send_to_review(db=db, bot=bot, draft_id=draft_id)
+            to_review = (datetime.now(timezone.utc) - message.date).total_seconds()
+            await record_stage_timings(db, draft_id, {"to_review": to_review})
+            await IngestTraceRepo(db).delete(source_chat_id, source_message_id)
+            await message.answer(f"✅ Принято. Draft #{draft_id} отправлен на модерацию.")
+        except Exception as e:
+            logger.exception("Ingest failed")
+            record_failure("ingest", e)
+            sp.record_exception(e)
+            await message.answer(f"⚠️ Ошибка ingest: {e}")
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import logging
+import time
+from functools import partial
 from aiogram import Router, Bot, F
 from aiogram.filters import CommandStart
 from aiogram.fsm.state import StatesGroup, State
@@ -10,6 +12,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.common.config import settings, admin_ids
 from src.infra.db.repositories import AdminRepo, ChannelRepo, PromptTokenRepo, SettingRepo, DraftRepo
+from src.infra.telegram.media import reference_image_urls
 from src.infra.telegram.callbacks import PanelCb, ChannelCb, PromptCb, SettingsCb
 from src.infra.telegram.keyboards import (
     main_menu_keyboard, channels_keyboard, prompts_keyboard, settings_keyboard, manual_confirm_kb, back_to_menu_kb, PAGE_SIZE
@@ -18,7 +21,9 @@ from src.infra.telegram.keyboards import (
 from aiogram.filters import CommandStart, StateFilter
 from src.usecases.ingest_and_build_draft import ingest_and_build_draft
 from src.usecases.send_to_review import send_to_review
+from src.usecases.stage_timings import record_stage_timings, stage_stats_report
 from src.infra.db.models import Draft
+from src.infra.tracing.tracer import span
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -99,9 +104,11 @@ async def panel_nav(cb: CallbackQuery, callback_data: PanelCb, db: AsyncSession,
         keys = [
             ("ADMIN_REVIEW_CHAT_ID", str(settings.admin_review_chat_id or "")),
             ("DESTINATION_CHANNEL", str(settings.destination_channel or "")),
+            ("DESTINATIONS", settings.destinations or ""),
             ("PUBLISH_EVERY_MINUTES", str(settings.publish_every_minutes)),
             ("PUBLISH_BATCH_SIZE", str(settings.publish_batch_size)),
             ("KIE_IMAGES_COUNT", str(settings.kie_images_count)),
+            ("INGEST_CANDIDATES", str(settings.ingest_candidates)),
             ("EXTERNAL_BOT_USERNAME", settings.external_bot_username),
             ("EXTERNAL_BUTTON_TEXT", settings.external_button_text),
             ("CAPTION_EMOJIS", settings.caption_emojis),
@@ -130,6 +137,12 @@ async def panel_nav(cb: CallbackQuery, callback_data: PanelCb, db: AsyncSession,
         await cb.answer()
         return
 
+    if action == "stats":
+        text = await stage_stats_report(db)
+        await cb.message.edit_text(text, reply_markup=back_to_menu_kb())
+        await cb.answer()
+        return
+
     if action == "manual":
         await state.set_state(ManualPostStates.waiting_text)
         await cb.message.edit_text("Отправьте текст поста одним сообщением. Потом я сделаю OpenAI+KIE и поставлю в очередь.", reply_markup=back_to_menu_kb())
@@ -146,7 +159,12 @@ async def add_channel_click(cb: CallbackQuery, db: AsyncSession, state: FSMConte
         await cb.answer("Нет доступа", show_alert=True)
         return
     await state.set_state("add_channel_wait")
-    await cb.message.edit_text("Отправьте @username канала-источника (пример: @mychannel).", reply_markup=back_to_menu_kb())
+    await cb.message.edit_text(
+        "Отправьте @username канала-источника (пример: @mychannel).\n"
+        "Необязательно: вес и лимит одновременных постов, например: @mychannel 2 1.\n"
+        "Для уже добавленного канала это меняет вес и лимит.",
+        reply_markup=back_to_menu_kb(),
+    )
     await cb.answer()
 
 
@@ -155,14 +173,29 @@ async def add_channel_text(message: Message, db: AsyncSession, state: FSMContext
     uid = message.from_user.id if message.from_user else 0
     if not await _ensure_admin(db, uid):
         return
-    username = message.text.strip()
+    username, *policy = message.text.split() or [""]
     if not username.startswith("@"):
         await message.answer("Нужно указать @username. Попробуйте ещё раз.", reply_markup=back_to_menu_kb())
         return
     repo = ChannelRepo(db)
-    await repo.add(username)
+    if not policy:
+        await repo.add(username)
+        await state.clear()
+        await message.answer("✅ Канал добавлен.", reply_markup=main_menu_keyboard())
+        return
+    try:
+        weight = float(policy[0].replace(",", "."))
+        max_in_flight = int(policy[1]) if len(policy) > 1 else None
+        if weight <= 0 or (max_in_flight is not None and max_in_flight < 0):
+            raise ValueError
+    except ValueError:
+        await message.answer("Вес — положительное число, лимит — целое (0 = без лимита).", reply_markup=back_to_menu_kb())
+        return
+    await repo.set_policy(username, weight=weight, max_in_flight=max_in_flight or None)
     await state.clear()
-    await message.answer("✅ Канал добавлен.", reply_markup=main_menu_keyboard())
+    await message.answer(
+        f"✅ Канал {username}: вес {weight:g}, лимит {max_in_flight or 'нет'}.", reply_markup=main_menu_keyboard()
+    )
 
 
 @router.callback_query(ChannelCb.filter())
@@ -281,25 +314,22 @@ async def manual_confirm(cb: CallbackQuery, db: AsyncSession, state: FSMContext,
         return
     source_chat_id = cb.message.chat.id
     source_message_id = cb.message.message_id
+    started = time.monotonic()
 
     try:
-        image_urls: list[str] = []
-        for fid in file_ids:
-            try:
-                tg_file = await bot.get_file(fid)
-                image_urls.append(f"https://api.telegram.org/file/bot{settings.telegram_bot_token}/{tg_file.file_path}")
-            except Exception as e:
-                logger.warning("Manual: failed to resolve file_id to URL: %s", e)
-
-        draft_id = await ingest_and_build_draft(
-            db=db,
-            source_chat_id=source_chat_id,
-            source_message_id=source_message_id,
-            original_text=text,
-            source_image_urls=image_urls or None,
-        )
+        images = partial(reference_image_urls, bot, file_ids, local_name=f"manual_{source_chat_id}_{source_message_id}")
+        with span("ingest.manual", source_chat_id=source_chat_id, source_message_id=source_message_id):
+            draft_id = await ingest_and_build_draft(
+                db=db,
+                source_chat_id=source_chat_id,
+                source_message_id=source_message_id,
+                original_text=text,
+                source_images=images if file_ids else None,
+                priority=True,
+            )
 
         await send_to_review(db=db, bot=bot, draft_id=draft_id)
+        await record_stage_timings(db, draft_id, {"to_review": time.monotonic() - started})
 
         await state.clear()
         await cb.message.edit_text(
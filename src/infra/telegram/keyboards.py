@@ -3,7 +3,7 @@ from __future__ import annotations
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from src.infra.telegram.callbacks import DraftCb
+from src.infra.telegram.callbacks import CandidateCb, DestinationCb, DraftCb
 
 def review_keyboard(draft_id: int) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
@@ -11,7 +11,17 @@ def review_keyboard(draft_id: int) -> InlineKeyboardMarkup:
     kb.button(text="❌ Отклонить", callback_data=DraftCb(action="reject", draft_id=draft_id).pack())
     # Open regen menu (img/caption/all)
     kb.button(text="🔁 Реген", callback_data=DraftCb(action="regen_menu", draft_id=draft_id).pack())
-    kb.adjust(3)
+    kb.button(text="📍 Каналы", callback_data=DraftCb(action="dest_menu", draft_id=draft_id).pack())
+    kb.adjust(3, 1)
+    return kb.as_markup()
+
+def destinations_keyboard(draft_id: int, chats: list[str], selected: set[str]) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    for i, chat in enumerate(chats):
+        mark = "✅" if chat in selected else "▫️"
+        kb.button(text=f"{mark} {chat}", callback_data=DestinationCb(draft_id=draft_id, index=i).pack())
+    kb.button(text="🔙 Назад", callback_data=DraftCb(action="dest_back", draft_id=draft_id).pack())
+    kb.adjust(1)
     return kb.as_markup()
 
 def regen_keyboard(draft_id: int) -> InlineKeyboardMarkup:
@@ -22,6 +32,19 @@ def regen_keyboard(draft_id: int) -> InlineKeyboardMarkup:
     kb.adjust(1)
     return kb.as_markup()
 
+def regen_progress_keyboard(draft_id: int, text: str) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text=text, callback_data=DraftCb(action="regen_status", draft_id=draft_id).pack())
+    return kb.as_markup()
+
+def candidates_keyboard(draft_id: int, count: int) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    for i in range(count):
+        kb.button(text=f"🖼 {i + 1}", callback_data=CandidateCb(draft_id=draft_id, index=i).pack())
+    kb.adjust(5)
+    kb.row(InlineKeyboardButton(text="❌ Отклонить", callback_data=DraftCb(action="reject", draft_id=draft_id).pack()))
+    return kb.as_markup()
+
 def url_keyboard(text: str, url: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=text, url=url)]])
 
@@ -36,7 +59,8 @@ def main_menu_keyboard() -> InlineKeyboardMarkup:
     kb.button(text="📡 Каналы", callback_data=PanelCb(action="channels", page=0))
     kb.button(text="⚙️ Настройки", callback_data=PanelCb(action="settings", page=0))
     kb.button(text="📤 Очередь", callback_data=PanelCb(action="queue", page=0))
-    kb.adjust(1)
+    kb.button(text="📈 Статистика", callback_data=PanelCb(action="stats", page=0))
+    kb.adjust(1, 1, 1, 1, 2)
     return kb.as_markup()
 
 def back_to_menu_kb() -> InlineKeyboardMarkup:
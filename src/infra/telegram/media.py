@@ -1,11 +1,22 @@
 from __future__ import annotations
 
+import logging
+import time
 from io import BytesIO
+from pathlib import Path
 from typing import Optional
 
 from aiogram import Bot
 from aiogram.types import Message
 
+from src.common.config import settings
+from src.common.media_urls import media_urls_enabled, signed_media_url
+
+logger = logging.getLogger(__name__)
+
+_PURGE_EVERY_SEC = 600.0
+_sources_purged_at = 0.0
+
 
 def extract_best_image_file_id(message: Message) -> Optional[str]:
     if message.photo:
@@ -20,3 +31,54 @@ async def tg_file_id_to_bytes(bot: Bot, file_id: str) -> bytes:
     buf = BytesIO()
     await bot.download_file(tg_file.file_path, destination=buf)
     return buf.getvalue()
+
+
+def _purge_sources(sources: Path) -> None:
+    """Delete downloaded source images whose signed URLs have expired (nobody can fetch them)."""
+    global _sources_purged_at
+    if time.monotonic() - _sources_purged_at < _PURGE_EVERY_SEC:
+        return
+    _sources_purged_at = time.monotonic()
+    cutoff = time.time() - settings.media_url_ttl_sec
+    removed = 0
+    for p in sources.iterdir():
+        try:
+            if p.is_file() and p.stat().st_mtime < cutoff:
+                p.unlink()
+                removed += 1
+        except OSError:
+            logger.warning("Media: failed to remove %s", p, exc_info=True)
+    if removed:
+        logger.info("Media: purged %d expired source image(s)", removed)
+
+
+async def reference_image_url(bot: Bot, file_id: str, *, local_name: str) -> str:
+    """URL KIE can fetch a Telegram image from.
+
+    With signed media URLs configured the file is saved under MEDIA_ROOT/sources (get_file
+    plus a download, so the 20 MB Bot API limit still applies) and served by the resolver,
+    so the bot token never leaves our infrastructure. Files older than MEDIA_URL_TTL_SEC are
+    purged from there. Otherwise this is the Telegram file URL.
+    """
+    tg_file = await bot.get_file(file_id)
+    if media_urls_enabled():
+        suffix = Path(tg_file.file_path or "").suffix or ".jpg"
+        dest = Path(settings.media_root) / "sources" / f"{local_name}{suffix}"
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        _purge_sources(dest.parent)
+        await bot.download_file(tg_file.file_path, destination=dest)
+        url = signed_media_url(dest)
+        if url:
+            return url
+    return f"https://api.telegram.org/file/bot{settings.telegram_bot_token}/{tg_file.file_path}"
+
+
+async def reference_image_urls(bot: Bot, file_ids: list[str], *, local_name: str) -> list[str]:
+    """``reference_image_url`` for each image; images that cannot be resolved are skipped."""
+    urls: list[str] = []
+    for i, fid in enumerate(file_ids):
+        try:
+            urls.append(await reference_image_url(bot, fid, local_name=f"{local_name}_{i}"))
+        except Exception as e:
+            logger.warning("Media: failed to resolve file_id to URL: %s", e)
+    return urls
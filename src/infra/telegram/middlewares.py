@@ -1,11 +1,107 @@
 from __future__ import annotations
+import logging
+import time
 from typing import Any, Awaitable, Callable, Dict
-from aiogram import BaseMiddleware
+from aiogram import BaseMiddleware, Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
 from aiogram.types import TelegramObject
+from src.common.config import settings
 from src.infra.db.base import async_session_maker
+from src.infra.metrics.metrics import (
+    BOT_API_QUEUE_DEPTH,
+    BOT_API_RETRY_AFTER_TOTAL,
+    BOT_API_SECONDS,
+    BOT_API_THROTTLE_SECONDS,
+    record_failure,
+)
+from src.infra.resilience.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
 
 class DbSessionMiddleware(BaseMiddleware):
     async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]], event: TelegramObject, data: Dict[str, Any]) -> Any:
         async with async_session_maker() as session:
             data["db"] = session
             return await handler(event, data)
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware: time every outgoing Bot API call and count failures."""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot, method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        name = type(method).__name__
+        with BOT_API_SECONDS.labels(method=name).time():
+            try:
+                return await make_request(bot, method)
+            except Exception as e:
+                record_failure("bot_api", e)
+                raise
+
+
+# Methods that count against Telegram's message limits (reads such as getFile/getChat do not).
+_LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward", "Delete")
+
+
+class BotApiRateLimitMiddleware(BaseRequestMiddleware):
+    """Bot session middleware: keep sends/edits under Telegram's limits and retry 429s.
+
+    Every limited call takes a token from its chat's bucket (groups/channels:
+    BOT_API_GROUP_PER_MIN, private chats: BOT_API_PRIVATE_PER_SEC) and then from the global
+    bucket (BOT_API_GLOBAL_PER_SEC). TelegramRetryAfter pauses the chat's bucket (the global
+    one for chatless calls) for the given time and the call is repeated.
+
+    Buckets live in the process. In webhook mode each of the WEBHOOK_WORKERS processes gets an
+    equal share of every rate, so together they stay within the limits.
+    """
+
+    def __init__(self) -> None:
+        self._share = max(1, settings.webhook_workers) if settings.webhook_base_url else 1
+        global_rate = settings.bot_api_global_per_sec / self._share
+        self._global = TokenBucket(global_rate, max(1, int(global_rate)))
+        self._chats: dict[str, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        key = str(chat_id)
+        bucket = self._chats.get(key)
+        if bucket is None:
+            if key.startswith("-") or key.startswith("@"):
+                # Groups and channels: 20/min, a short burst is tolerated.
+                bucket = TokenBucket(settings.bot_api_group_per_min / 60 / self._share, max(1, 3 // self._share))
+            else:
+                bucket = TokenBucket(settings.bot_api_private_per_sec / self._share, 1)
+            self._chats[key] = bucket
+        return bucket
+
+    async def _acquire(self, bucket: TokenBucket, scope: str) -> None:
+        BOT_API_QUEUE_DEPTH.labels(scope=scope).inc()
+        try:
+            await bucket.acquire()
+        finally:
+            BOT_API_QUEUE_DEPTH.labels(scope=scope).dec()
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot, method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        name = type(method).__name__
+        if not name.startswith(_LIMITED_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        chat_bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            if chat_bucket is not None:
+                await self._acquire(chat_bucket, "chat")
+            await self._acquire(self._global, "global")
+            BOT_API_THROTTLE_SECONDS.observe(time.monotonic() - started)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                BOT_API_RETRY_AFTER_TOTAL.labels(method=name).inc()
+                (chat_bucket or self._global).pause(float(e.retry_after))
+                attempt += 1
+                if attempt > settings.bot_api_max_retries:
+                    raise
+                logger.warning("Bot API: %s to chat %s hit RetryAfter %ss (attempt %d)", name, chat_id, e.retry_after, attempt)
@@ -4,26 +4,28 @@ import logging
 from pathlib import Path
 
 from aiogram import Bot
-from aiogram.types import FSInputFile
+from aiogram.types import FSInputFile, InputMediaPhoto
 
-from src.infra.telegram.keyboards import review_keyboard
-from src.common.tg_text import prepare_photo_caption, tg_utf16_clip
+from src.common.tg_entities import CompiledCaption
+from src.infra.telegram.captions import PHOTO_CAPTION_LIMIT, TEXT_LIMIT, caption_parts, message_entities
+from src.infra.telegram.keyboards import candidates_keyboard, review_keyboard
 
 logger = logging.getLogger(__name__)
 
-PHOTO_CAPTION_LIMIT = 1024
-TEXT_LIMIT = 4096
-
-
-def _clip(text: str, limit: int) -> str:
-    return tg_utf16_clip(text or "", limit)
-
 
 class AdminNotifier:
     def __init__(self, bot: Bot):
         self.bot = bot
 
-    async def send_draft(self, *, chat_id: int, draft_id: int, caption: str, image_paths: list[str]) -> int:
+    async def send_draft(
+        self,
+        *,
+        chat_id: int,
+        draft_id: int,
+        caption: str,
+        image_paths: list[str],
+        compiled: CompiledCaption | None = None,
+    ) -> int:
         if not chat_id:
             raise ValueError("ADMIN_REVIEW_CHAT_ID is not set")
 
@@ -31,20 +33,36 @@ class AdminNotifier:
             img_path = image_paths[0]
             if not Path(img_path).exists():
                 logger.warning("Image path does not exist: %s", img_path)
-            cap_for_photo, _overflow, cap_parse_mode = prepare_photo_caption(caption, caption_limit=PHOTO_CAPTION_LIMIT)
+            head = caption_parts(caption, compiled, first_limit=PHOTO_CAPTION_LIMIT)[0]
             msg = await self.bot.send_photo(
                 chat_id=chat_id,
                 photo=FSInputFile(img_path),
-                caption=cap_for_photo,
-                parse_mode=cap_parse_mode,
+                caption=head.text,
+                caption_entities=message_entities(head),
                 reply_markup=review_keyboard(draft_id),
             )
             return msg.message_id
 
+        head = caption_parts(caption, compiled, first_limit=TEXT_LIMIT)[0]
         msg = await self.bot.send_message(
             chat_id=chat_id,
-            text=_clip(caption, TEXT_LIMIT) or f"Draft #{draft_id}",
-            parse_mode="HTML",
+            text=head.text or f"Draft #{draft_id}",
+            entities=message_entities(head),
             reply_markup=review_keyboard(draft_id),
         )
         return msg.message_id
+
+    async def send_candidates(self, *, chat_id: int, draft_id: int, image_paths: list[str]) -> int:
+        """Send image candidates as one album plus a picker message; returns the picker message id."""
+        if not chat_id:
+            raise ValueError("ADMIN_REVIEW_CHAT_ID is not set")
+
+        media = [InputMediaPhoto(media=FSInputFile(p), caption=f"Вариант {i + 1}") for i, p in enumerate(image_paths)]
+        album = await self.bot.send_media_group(chat_id=chat_id, media=media)
+        msg = await self.bot.send_message(
+            chat_id=chat_id,
+            text=f"🖼 Draft #{draft_id}: выберите картинку (подпись будет сгенерирована для выбранной)",
+            reply_to_message_id=album[0].message_id if album else None,
+            reply_markup=candidates_keyboard(draft_id, len(image_paths)),
+        )
+        return msg.message_id
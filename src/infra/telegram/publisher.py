@@ -1,22 +1,31 @@
 from __future__ import annotations
 
 import logging
+from dataclasses import dataclass, field
+
 from aiogram import Bot
-from aiogram.types import FSInputFile
+from aiogram.types import FSInputFile, InlineKeyboardMarkup, InputMediaPhoto, Message
 from src.common.deeplink import make_external_bot_url
 from src.common.config import settings
-from src.common.tg_text import prepare_photo_caption, chunk_text
+from src.common.tg_entities import CompiledCaption
+from src.infra.telegram.captions import PHOTO_CAPTION_LIMIT, TEXT_LIMIT, caption_parts, message_entities
 from src.infra.telegram.keyboards import url_keyboard
 
 logger = logging.getLogger(__name__)
 
-# Telegram API limit for photo captions is 1024 characters.
-_CAPTION_LIMIT = 1024
+MEDIA_GROUP_LIMIT = 10  # items per send_media_group
+
+
+@dataclass(frozen=True)
+class PublishResult:
+    message_id: int
+    # Telegram file_ids of the posted photos, in image order: later destinations reuse them.
+    file_ids: list[str] = field(default_factory=list)
+
 
+def _photo_file_id(msg: Message) -> str | None:
+    return msg.photo[-1].file_id if getattr(msg, "photo", None) else None
 
-def _split_caption(text: str) -> tuple[str, str | None, str | None]:
-    """Return (caption_for_photo, overflow_text_or_none, parse_mode_or_none)."""
-    return prepare_photo_caption(text, caption_limit=_CAPTION_LIMIT)
 
 class ChannelPublisher:
     def __init__(self, bot: Bot):
@@ -31,40 +40,100 @@ class ChannelPublisher:
         token: str,
         bot_username: str | None = None,
         button_text: str | None = None,
-    ) -> None:
+        compiled: CompiledCaption | None = None,
+        file_ids: list[str] | None = None,
+    ) -> PublishResult:
+        """Post a draft; ``file_ids`` (from an earlier destination) replace uploading ``image_paths``."""
+        photos: list[str | FSInputFile] = (
+            list(file_ids) if file_ids and len(file_ids) == len(image_paths) else [FSInputFile(p) for p in image_paths]
+        )
         bname = (bot_username or settings.external_bot_username).lstrip("@")
         btext = button_text or settings.external_button_text
         url = make_external_bot_url(bname, token)
 
-        cap_for_photo, full_text, cap_parse_mode = _split_caption(caption)
-
         if not image_paths:
             # For text-only posts Telegram allows much longer messages.
-            await self.bot.send_message(destination, full_text or cap_for_photo, reply_markup=url_keyboard(btext, url))
-            return
+            head, *rest = caption_parts(caption, compiled, first_limit=TEXT_LIMIT)
+            msg = await self.bot.send_message(
+                destination, head.text, entities=message_entities(head), reply_markup=url_keyboard(btext, url)
+            )
+            for part in rest:
+                await self.bot.send_message(
+                    chat_id=destination,
+                    text=part.text,
+                    entities=message_entities(part),
+                    reply_to_message_id=msg.message_id,
+                )
+            return PublishResult(message_id=msg.message_id)
+
+        # Photo captions are limited to 1024; the rest goes to follow-up messages.
+        head, *rest = caption_parts(caption, compiled, first_limit=PHOTO_CAPTION_LIMIT)
+        if len(photos) > 1:
+            return await self._publish_album(
+                destination=destination, head=head, rest=rest, photos=photos, button=url_keyboard(btext, url), btext=btext
+            )
 
         msg = await self.bot.send_photo(
             chat_id=destination,
-            photo=FSInputFile(image_paths[0]),
-            caption=cap_for_photo,
-            parse_mode=cap_parse_mode,
+            photo=photos[0],
+            caption=head.text,
+            caption_entities=message_entities(head),
             reply_markup=url_keyboard(btext, url),
         )
 
-        # If caption was longer than 1024, send the full text as a follow-up message.
-        if full_text:
+        if rest:
             try:
-                for part in chunk_text(full_text, limit=4096):
+                for part in rest:
                     await self.bot.send_message(
                         chat_id=destination,
-                        text=part,
+                        text=part.text,
+                        entities=message_entities(part),
                         reply_to_message_id=msg.message_id,
                     )
             except Exception as e:
-                logger.warning("Failed to send full caption as follow-up message: %s", e)
+                logger.warning("Failed to send caption continuation as follow-up message: %s", e)
+        file_id = _photo_file_id(msg)
+        return PublishResult(message_id=msg.message_id, file_ids=[file_id] if file_id else [])
 
-        for p in image_paths[1:]:
-            try:
-                await self.bot.send_photo(chat_id=destination, photo=FSInputFile(p), reply_to_message_id=msg.message_id)
-            except Exception as e:
-                logger.warning("Failed to send extra photo: %s", e)
+    async def _publish_album(
+        self,
+        *,
+        destination: str,
+        head: CompiledCaption,
+        rest: list[CompiledCaption],
+        photos: list[str | FSInputFile],
+        button: InlineKeyboardMarkup,
+        btext: str,
+    ) -> PublishResult:
+        """Several images: one send_media_group (caption on the first item), then the overflow.
+
+        Albums cannot carry an inline keyboard, so the button goes on the last follow-up
+        message (or on a short message of its own when the caption fits the album).
+        """
+        first_id = 0
+        file_ids: list[str | None] = []
+        for start in range(0, len(photos), MEDIA_GROUP_LIMIT):
+            chunk = photos[start : start + MEDIA_GROUP_LIMIT]
+            media = [InputMediaPhoto(media=p) for p in chunk]
+            if start == 0:
+                media[0] = InputMediaPhoto(media=chunk[0], caption=head.text, caption_entities=message_entities(head))
+            if len(media) == 1:
+                sent = [await self.bot.send_photo(chat_id=destination, photo=media[0].media, reply_to_message_id=first_id or None)]
+            else:
+                sent = await self.bot.send_media_group(chat_id=destination, media=media, reply_to_message_id=first_id or None)
+            first_id = first_id or sent[0].message_id
+            file_ids.extend(_photo_file_id(m) for m in sent)
+
+        parts = rest or [CompiledCaption(text=btext)]
+        try:
+            for i, part in enumerate(parts):
+                await self.bot.send_message(
+                    chat_id=destination,
+                    text=part.text,
+                    entities=message_entities(part),
+                    reply_to_message_id=first_id,
+                    reply_markup=button if i == len(parts) - 1 else None,
+                )
+        except Exception as e:
+            logger.warning("Failed to send album caption continuation / button: %s", e)
+        return PublishResult(message_id=first_id, file_ids=[f for f in file_ids if f] if all(file_ids) else [])
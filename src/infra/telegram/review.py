@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+from datetime import datetime
 from pathlib import Path
 
 from aiogram import Bot, Router
@@ -9,15 +10,34 @@ from aiogram.types import CallbackQuery, FSInputFile, InputMediaPhoto
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.common.config import settings
-from src.infra.db.repositories import DraftRepo
-from src.infra.telegram.callbacks import DraftCb
-from src.infra.telegram.keyboards import review_keyboard, regen_keyboard
-from src.common.tg_text import prepare_photo_caption, tg_utf16_clip
-from src.usecases.regenerate import regenerate_draft
+from src.common.media_urls import signed_media_url
+from src.infra.db.models import Draft
+from src.infra.db.repositories import DraftRepo, SettingRepo
+from src.infra.telegram.callbacks import CandidateCb, DestinationCb, DraftCb
+from src.infra.telegram.keyboards import (
+    candidates_keyboard,
+    destinations_keyboard,
+    regen_keyboard,
+    regen_progress_keyboard,
+    review_keyboard,
+)
+from src.infra.telegram.captions import PHOTO_CAPTION_LIMIT, TEXT_LIMIT, caption_parts, message_entities
+from src.usecases.choose_candidate import choose_candidate
+from src.usecases.publish_queue import configured_destinations
+from src.usecases.regen_flights import regenerate_single_flight
+from src.usecases.send_to_review import send_to_review
+from src.infra.tracing.tracer import span
+from src.usecases.stage_timings import record_stage_timings
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+_REGEN_STAGES = {
+    "kie": "🖼 Генерирую картинку…",
+    "openai": "📝 Пишу подпись…",
+    "save": "💾 Сохраняю…",
+}
+
 
 def _tg_file_url(bot_token: str, file_path: str) -> str:
     return f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
@@ -39,16 +59,18 @@ async def _render_review_message(cb: CallbackQuery, *, draft_id: int, db: AsyncS
         return
 
     try:
+        caption = d.caption or "(пусто)"
         if d.image_paths:
-            cap_for_photo, _overflow, cap_parse_mode = prepare_photo_caption(d.caption or "(пусто)")
+            head = caption_parts(caption, d.compiled_caption, first_limit=PHOTO_CAPTION_LIMIT)[0]
             media = InputMediaPhoto(
                 media=FSInputFile(d.image_paths[0]),
-                caption=cap_for_photo,
-                parse_mode=cap_parse_mode,
+                caption=head.text,
+                caption_entities=message_entities(head),
             )
             await cb.message.edit_media(media=media, reply_markup=review_keyboard(d.id))
         else:
-            await cb.message.edit_text(tg_utf16_clip(d.caption or "(пусто)", 4096), reply_markup=review_keyboard(d.id), parse_mode="HTML")
+            head = caption_parts(caption, d.compiled_caption, first_limit=TEXT_LIMIT)[0]
+            await cb.message.edit_text(head.text or "(пусто)", entities=message_entities(head), reply_markup=review_keyboard(d.id))
     except TelegramBadRequest as e:
         if "message is not modified" in str(e):
             return
@@ -56,6 +78,63 @@ async def _render_review_message(cb: CallbackQuery, *, draft_id: int, db: AsyncS
         await cb.message.answer(f"⚠️ Не удалось обновить сообщение: {e}")
 
 
+async def _routing(db: AsyncSession, d: Draft) -> tuple[list[str], set[str]]:
+    """(configured destination chats, the ones this draft goes to)."""
+    chats = [t.chat for t in await configured_destinations(SettingRepo(db))]
+    wanted = {c.strip() for c in (d.destinations or "").split(",") if c.strip()}
+    return chats, (wanted & set(chats)) if wanted else set(chats)
+
+
+@router.callback_query(DestinationCb.filter())
+async def on_destination(cb: CallbackQuery, callback_data: DestinationCb, db: AsyncSession):
+    """Toggle one destination of a draft under review."""
+    draft_id = int(callback_data.draft_id)
+    d = await DraftRepo(db).get(draft_id)
+    if not d or d.status not in {"pending_review", "approved"}:
+        await cb.answer("Draft уже не на модерации", show_alert=False)
+        return
+    chats, selected = await _routing(db, d)
+    if not 0 <= callback_data.index < len(chats):
+        await cb.answer("Список каналов изменился", show_alert=False)
+        await _safe_edit_reply_markup(cb, destinations_keyboard(draft_id, chats, selected))
+        return
+    chat = chats[callback_data.index]
+    selected ^= {chat}
+    if not selected:
+        await cb.answer("Нужен хотя бы один канал", show_alert=True)
+        return
+    # Every configured channel selected: store NULL, so channels added later are included too.
+    await DraftRepo(db).set_destinations(draft_id, None if selected == set(chats) else [c for c in chats if c in selected])
+    await cb.answer()
+    await _safe_edit_reply_markup(cb, destinations_keyboard(draft_id, chats, selected))
+
+
+@router.callback_query(CandidateCb.filter())
+async def on_candidate(cb: CallbackQuery, callback_data: CandidateCb, db: AsyncSession, bot: Bot):
+    draft_id = int(callback_data.draft_id)
+    index = int(callback_data.index)
+
+    d = await DraftRepo(db).get(draft_id)
+    if not d or d.status != "choosing":
+        await cb.answer("Вариант уже выбран", show_alert=False)
+        await _safe_edit_reply_markup(cb, None)
+        return
+    count = len(d.image_paths)
+
+    await cb.answer(f"⏳ Вариант {index + 1}: генерирую подпись...", show_alert=False)
+    await _safe_edit_reply_markup(cb, None)
+
+    with span("review.choose", parent=d.trace_parent, draft_id=draft_id, index=index):
+        ok = await choose_candidate(db=db, draft_id=draft_id, index=index)
+        if not ok:
+            d = await DraftRepo(db).get(draft_id)
+            if d and d.status == "choosing":
+                await _safe_edit_reply_markup(cb, candidates_keyboard(draft_id, count))
+            return
+        await cb.message.edit_text(f"✅ Draft #{draft_id}: выбран вариант {index + 1}")
+        await send_to_review(db=db, bot=bot, draft_id=draft_id)
+
+
 @router.callback_query(DraftCb.filter())
 async def on_review(cb: CallbackQuery, callback_data: DraftCb, db: AsyncSession, bot: Bot):
     draft_id = int(callback_data.draft_id)
@@ -74,14 +153,19 @@ async def on_review(cb: CallbackQuery, callback_data: DraftCb, db: AsyncSession,
         # Approve means: publish the ALREADY generated draft (no regen here).
         await cb.answer("✅ Одобрено", show_alert=False)
 
-        await draft_repo.set_status(draft_id, "approved")
+        with span("review.approve", parent=d.trace_parent, draft_id=draft_id):
+            await draft_repo.set_status(draft_id, "approved")
+            # Drafts go to review right after creation, so this is the reviewers' wait.
+            approval_wait = (datetime.utcnow() - d.created_at).total_seconds()
+            await record_stage_timings(db, draft_id, {"approval_wait": approval_wait})
         await _safe_edit_reply_markup(cb, None)
         await cb.message.answer(f"✅ Draft #{draft_id} ОДОБРЕН и поставлен в очередь")
         return
 
     if action == "reject":
         await cb.answer("❌ Отклонено", show_alert=False)
-        await draft_repo.set_status(draft_id, "rejected")
+        with span("review.reject", parent=d.trace_parent, draft_id=draft_id):
+            await draft_repo.set_status(draft_id, "rejected")
         await _safe_edit_reply_markup(cb, None)
         await cb.message.answer(f"❌ Draft #{draft_id} ОТКЛОНЁН")
         return
@@ -95,6 +179,27 @@ async def on_review(cb: CallbackQuery, callback_data: DraftCb, db: AsyncSession,
         await _safe_edit_reply_markup(cb, regen_keyboard(draft_id))
         return
 
+    # -----------------
+    # Destinations
+    # -----------------
+    if action == "dest_menu":
+        chats, selected = await _routing(db, d)
+        if len(chats) < 2:
+            await cb.answer("Настроен один канал публикации", show_alert=True)
+            return
+        await cb.answer()
+        await _safe_edit_reply_markup(cb, destinations_keyboard(draft_id, chats, selected))
+        return
+
+    if action == "dest_back":
+        await cb.answer()
+        await _safe_edit_reply_markup(cb, review_keyboard(draft_id))
+        return
+
+    if action == "regen_status":
+        await cb.answer("⏳ Регенерация уже идёт", show_alert=False)
+        return
+
     # -----------------
     # Regen execution
     # -----------------
@@ -102,29 +207,44 @@ async def on_review(cb: CallbackQuery, callback_data: DraftCb, db: AsyncSession,
         # Answer quickly, otherwise callback may expire
         await cb.answer("⏳ Регенерирую...", show_alert=False)
 
-        # Optional reference image: try to use the photo in the current review message
+        # Optional reference image: the draft image on our disk (signed resolver URL),
+        # otherwise the photo in the current review message via Telegram.
         reference_urls: list[str] = []
         try:
-            if cb.message and cb.message.photo:
+            local_url = signed_media_url(d.image_paths[0]) if d.image_paths else None
+            if local_url:
+                reference_urls.append(local_url)
+            elif cb.message and cb.message.photo:
                 ph = cb.message.photo[-1]
                 tg_file = await bot.get_file(ph.file_id)
                 reference_urls.append(_tg_file_url(settings.telegram_bot_token, tg_file.file_path))
         except Exception:
             logger.exception("Regen: failed to build reference URL")
 
-        ok = await regenerate_draft(
-            db=db,
-            draft_id=draft_id,
-            mode=action,
-            reference_image_urls=reference_urls or None,
-        )
+        async def progress(stage: str) -> None:
+            text = f"⏳ {_REGEN_STAGES.get(stage, stage)}"
+            await _safe_edit_reply_markup(cb, regen_progress_keyboard(draft_id, text))
+
+        # One regeneration per draft: duplicate clicks attach to it, a different mode
+        # supersedes it. Only the request that owns the final run updates the message.
+        with span("review.regen", parent=d.trace_parent, draft_id=draft_id, mode=action):
+            outcome = await regenerate_single_flight(
+                draft_id=draft_id,
+                mode=action,
+                reference_image_urls=reference_urls or None,
+                progress=progress,
+            )
+        if outcome.joined or outcome.superseded:
+            return
 
-        if not ok:
+        if not outcome.ok:
             await cb.message.answer("⚠️ Регенерация не удалась (KIE/AI вернули ошибку или пустой результат).")
             # Return to main keyboard anyway
             await _safe_edit_reply_markup(cb, review_keyboard(draft_id))
             return
 
+        # The regeneration wrote through its own session: drop our cached copy of the draft.
+        db.expire_all()
         await _render_review_message(cb, draft_id=draft_id, db=db)
         return
 
@@ -0,0 +1,227 @@
+"""Minimal OpenTelemetry-compatible tracer.
+
+Spans follow the W3C trace context model (16-byte trace id, 8-byte span id) and are
+exported in OTLP/JSON, either appended to a local JSON-lines file or POSTed to an OTLP/HTTP
+collector (``<endpoint>/v1/traces``). Export happens on a background thread, so it works
+the same under aiogram and Pyrogram event loops.
+
+A trace crosses processes as a ``traceparent`` string ("00-<trace_id>-<span_id>-01"):
+the userbot stores it per source post (``ingest_traces``), the draft keeps its own copy
+(``drafts.trace_parent``) for review, regen and publish.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterator, Optional, TypeVar
+
+import httpx
+
+from src.common.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_STATUS_UNSET, _STATUS_ERROR = 0, 2
+_KIND_INTERNAL = 1
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str = ""
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status_code: int = _STATUS_UNSET
+    status_message: str = ""
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status_code = _STATUS_ERROR
+        self.status_message = f"{type(exc).__name__}: {exc}"[:500]
+
+    def to_otlp(self) -> dict:
+        out: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": _KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+        if self.parent_span_id:
+            out["parentSpanId"] = self.parent_span_id
+        return out
+
+
+def _otlp_value(v: Any) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    """Return (trace_id, span_id) from a W3C traceparent, or None if malformed."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("poster_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_traceparent() -> str | None:
+    s = _current.get()
+    return s.traceparent if s else None
+
+
+@contextmanager
+def span(name: str, *, parent: str | None = None, **attributes: Any) -> Iterator[Span]:
+    """Run a block inside a span.
+
+    ``parent`` (a traceparent) continues a trace started elsewhere; otherwise the current
+    span is the parent, and without one a new trace starts.
+    """
+    remote = parse_traceparent(parent) if parent else None
+    cur = _current.get()
+    if remote:
+        trace_id, parent_id = remote
+    elif cur:
+        trace_id, parent_id = cur.trace_id, cur.span_id
+    else:
+        trace_id, parent_id = secrets.token_hex(16), ""
+    s = Span(name=name, trace_id=trace_id, span_id=secrets.token_hex(8), parent_span_id=parent_id, attributes=dict(attributes))
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.record_exception(e)
+        raise
+    finally:
+        _current.reset(token)
+        s.end_ns = time.time_ns()
+        _exporter.submit(s)
+
+
+def traced(name: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Decorator for coroutines: run the whole call inside ``span(name)``."""
+
+    def deco(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            with span(name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return deco
+
+
+class _Exporter:
+    """Batches finished spans and ships them from a daemon thread."""
+
+    def __init__(self) -> None:
+        self.service_name = "poster"
+        self.mode = ""
+        self._q: "queue.Queue[Span]" = queue.Queue(maxsize=10_000)
+        self._thread: threading.Thread | None = None
+
+    def configure(self, service_name: str) -> None:
+        self.service_name = service_name
+        self.mode = (settings.trace_export or "").strip().lower()
+        if self.mode not in {"", "file", "otlp"}:
+            logger.warning("Tracing: unknown TRACE_EXPORT=%r, export disabled", self.mode)
+            self.mode = ""
+        if self.mode and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+            logger.info("Tracing: exporting spans (%s) as service %s", self.mode, service_name)
+
+    def submit(self, s: Span) -> None:
+        if not self.mode:
+            return
+        try:
+            self._q.put_nowait(s)
+        except queue.Full:
+            pass  # never block the pipeline on tracing
+
+    def _payload(self, spans: list[Span]) -> dict:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": self.service_name}},
+                            {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": "poster"}, "spans": [s.to_otlp() for s in spans]}],
+                }
+            ]
+        }
+
+    def _ship(self, spans: list[Span], http: httpx.Client | None) -> None:
+        payload = self._payload(spans)
+        if self.mode == "file":
+            path = Path(settings.trace_file)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        elif http is not None:
+            r = http.post(f"{settings.otlp_endpoint.rstrip('/')}/v1/traces", json=payload)
+            r.raise_for_status()
+
+    def _run(self) -> None:
+        http = httpx.Client(timeout=10.0) if self.mode == "otlp" else None
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + 2.0
+            while len(batch) < 256:
+                try:
+                    batch.append(self._q.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._ship(batch, http)
+            except Exception as e:
+                logger.warning("Tracing: export of %d span(s) failed: %s", len(batch), e)
+
+
+_exporter = _Exporter()
+
+
+def init_tracing(service_name: str) -> None:
+    """Call once per process (admin-bot / userbot / resolver)."""
+    _exporter.configure(service_name)
@@ -0,0 +1,170 @@
+"""Channel history backfill.
+
+Pages through ``get_chat_history`` (newest -> oldest) for the last N posts and/or posts
+since a date, and hands them to the ingest bot in batches, exactly like live posts. After
+each batch it waits until the admin bot has drafts for it (so 2,000 posts do not become
+2,000 concurrent KIE jobs), then stores a checkpoint: an interrupted run resumes where it
+stopped. Posts that already have a draft are skipped.
+
+    python -m src.main_userbot --backfill @channel --limit 2000
+    python -m src.main_userbot --backfill @channel --since 2026-01-01
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from pyrogram.types import Message as PyroMessage
+
+from src.common.config import settings
+from src.infra.db.base import async_session_maker
+from src.infra.db.repositories import BackfillCheckpointRepo, DraftRepo
+from src.infra.userbot.watcher import _extract_text, forward_to_ingest
+
+logger = logging.getLogger(__name__)
+
+
+async def _flood_sleep(e: FloodWait, what: str) -> None:
+    wait = float(e.value or 0) + 1
+    logger.warning("Backfill: FloodWait %.0fs on %s", wait, what)
+    await asyncio.sleep(wait)
+
+
+def _is_post(msg: PyroMessage) -> bool:
+    """Same selection as the live watcher: skip service messages and textless album items."""
+    if getattr(msg, "service", None) or getattr(msg, "empty", False):
+        return False
+    if msg.media_group_id and not _extract_text(msg):
+        return False
+    return bool(_extract_text(msg) or msg.photo or msg.document)
+
+
+async def _history(client: Client, chat_id: int, offset_id: int) -> AsyncIterator[PyroMessage]:
+    """get_chat_history from ``offset_id`` (exclusive), restarting after FloodWait."""
+    while True:
+        try:
+            async for msg in client.get_chat_history(chat_id, offset_id=offset_id):
+                if offset_id and msg.id >= offset_id:
+                    continue
+                offset_id = msg.id
+                yield msg
+            return
+        except FloodWait as e:
+            await _flood_sleep(e, "get_chat_history")
+
+
+async def _wait_for_drafts(chat_id: int, message_ids: list[int]) -> int:
+    """Wait until the ingest bot has drafts for ``message_ids``; returns how many appeared."""
+    deadline = time.monotonic() + settings.backfill_batch_timeout_sec
+    pending = set(message_ids)
+    while pending:
+        async with async_session_maker() as db:
+            repo = DraftRepo(db)
+            for mid in list(pending):
+                if await repo.by_source(chat_id, mid):
+                    pending.discard(mid)
+        if not pending or time.monotonic() > deadline:
+            break
+        await asyncio.sleep(5)
+    if pending:
+        logger.warning("Backfill: no drafts after %.0fs for msg_ids=%s", settings.backfill_batch_timeout_sec, sorted(pending))
+    return len(message_ids) - len(pending)
+
+
+async def _forward_batch(client: Client, batch: list[PyroMessage], *, username: str) -> list[int]:
+    forwarded: list[int] = []
+    for msg in batch:
+        delivered = False
+        while not delivered:
+            try:
+                await forward_to_ingest(client, msg, username=username)
+                delivered = True
+            except FloodWait as e:
+                await _flood_sleep(e, f"forward msg_id={msg.id}")
+            except Exception:
+                logger.exception("Backfill: msg_id=%s could not be delivered, skipped", msg.id)
+                break
+        if not delivered:
+            continue
+        forwarded.append(msg.id)
+        await asyncio.sleep(settings.backfill_forward_interval_sec)
+    return forwarded
+
+
+async def backfill_channel(
+    client: Client,
+    channel: str,
+    *,
+    limit: int | None = None,
+    since: datetime | None = None,
+    restart: bool = False,
+) -> None:
+    """Backfill ``channel`` (username or id). ``limit`` counts posts, ``since`` is UTC."""
+    if not settings.ingest_bot_username:
+        raise ValueError("INGEST_BOT_USERNAME is not set")
+    if not limit and not since:
+        raise ValueError("Backfill needs --limit and/or --since")
+
+    chat = await client.get_chat(channel)
+    username = (getattr(chat, "username", "") or "").lower()
+    key = username or str(chat.id)
+
+    async with async_session_maker() as db:
+        cp_repo = BackfillCheckpointRepo(db)
+        cp = await cp_repo.start(key, limit=limit, since=since, restart=restart)
+        if cp.next_offset_id:
+            logger.info("Backfill: resuming %s below msg_id=%s (%s posts scanned)", key, cp.next_offset_id, cp.scanned)
+
+        since_aware = since.replace(tzinfo=timezone.utc) if since else None
+        batch: list[PyroMessage] = []
+        last_seen = cp.next_offset_id
+
+        async def flush() -> None:
+            new = []
+            async with async_session_maker() as lookup:
+                drafts = DraftRepo(lookup)
+                for msg in batch:
+                    if await drafts.by_source(chat.id, msg.id):
+                        cp.skipped += 1
+                    else:
+                        new.append(msg)
+            if new:
+                ids = await _forward_batch(client, new, username=username)
+                cp.forwarded += len(ids)
+                ready = await _wait_for_drafts(chat.id, ids)
+                logger.info("Backfill: %s batch of %d forwarded, %d drafts ready", key, len(ids), ready)
+            batch.clear()
+            cp.next_offset_id = last_seen
+            await cp_repo.save(cp)
+
+        async for msg in _history(client, chat.id, cp.next_offset_id):
+            # Pyrogram dates are naive local time; astimezone() interprets them as such.
+            posted = msg.date.astimezone(timezone.utc) if msg.date else None
+            if since_aware and posted and posted < since_aware:
+                break
+            if limit and cp.scanned >= limit:
+                break
+            last_seen = msg.id
+            if not _is_post(msg):
+                continue
+            cp.scanned += 1
+            batch.append(msg)
+            if len(batch) >= max(1, settings.backfill_batch_size):
+                await flush()
+
+        await flush()
+        cp.finished_at = datetime.utcnow()
+        await cp_repo.save(cp)
+        logger.info(
+            "Backfill: %s done, posts=%s forwarded=%s skipped(existing)=%s",
+            key,
+            cp.scanned,
+            cp.forwarded,
+            cp.skipped,
+        )
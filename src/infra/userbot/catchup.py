@@ -0,0 +1,87 @@
+"""Startup catch-up: posts published while the userbot was down.
+
+Pyrogram only delivers live updates. The watcher stores a high-water mark per channel
+(``channels.last_message_id``); on startup every allowed channel's gap is fetched (newest
+first, at most CATCHUP_MAX_POSTS) and fed oldest-first through the same handler as live
+posts. Channels run concurrently with bounded parallelism. Channels without a mark get
+one at their current newest post, so the next downtime is covered.
+
+Duplicates with live updates arriving during catch-up are dropped by ingest (one draft
+per source).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from pyrogram.types import Message as PyroMessage
+
+from src.common.config import settings
+from src.infra.db.base import async_session_maker
+from src.infra.db.repositories import ChannelRepo
+from src.infra.userbot.watcher import handle_channel_post, owns_channel
+
+logger = logging.getLogger(__name__)
+
+
+async def _gap(client: Client, username: str, last_message_id: int | None) -> list[PyroMessage]:
+    """Posts newer than ``last_message_id``, oldest first (just the newest one without a mark)."""
+    limit = 1 if last_message_id is None else max(1, settings.catchup_max_posts)
+    while True:
+        try:
+            out: list[PyroMessage] = []
+            async for msg in client.get_chat_history(username, limit=limit):
+                if last_message_id is not None and msg.id <= last_message_id:
+                    break
+                out.append(msg)
+            out.reverse()
+            return out
+        except FloodWait as e:
+            logger.warning("Catch-up: FloodWait %ss on %s", e.value, username)
+            await asyncio.sleep(float(e.value or 0) + 1)
+
+
+async def _catch_up_channel(client: Client, username: str, last_message_id: int | None, sem: asyncio.Semaphore) -> int:
+    async with sem:
+        try:
+            gap = await _gap(client, username, last_message_id)
+        except Exception:
+            logger.exception("Catch-up: failed to read history of %s", username)
+            return 0
+
+        if last_message_id is None:
+            if gap:
+                async with async_session_maker() as db:
+                    await ChannelRepo(db).advance_watermark(username, gap[-1].id, chat_id=gap[-1].chat.id if gap[-1].chat else None)
+                logger.info("Catch-up: %s has no mark yet, starting at msg_id=%s", username, gap[-1].id)
+            return 0
+
+        if len(gap) >= settings.catchup_max_posts:
+            logger.warning("Catch-up: %s gap is larger than %s posts, older ones are skipped", username, settings.catchup_max_posts)
+        for msg in gap:
+            await handle_channel_post(client, msg)
+        if gap:
+            logger.info("Catch-up: %s, %d missed post(s) queued", username, len(gap))
+        return len(gap)
+
+
+async def catch_up(client: Client, usernames: set[str] | None = None) -> None:
+    """Fetch and handle posts missed since each channel's high-water mark.
+
+    Only channels owned by ``client``'s session, optionally narrowed to ``usernames``
+    (channels that just moved to it).
+    """
+    async with async_session_maker() as db:
+        rows = [(c.username.lower().lstrip("@"), c.last_message_id) for c in await ChannelRepo(db).list() if c.username]
+    channels = [
+        (u, mark) for u, mark in rows if (usernames is None or u in usernames) and await owns_channel(client, u)
+    ]
+    if not channels:
+        return
+
+    sem = asyncio.Semaphore(max(1, settings.catchup_concurrency))
+    counts = await asyncio.gather(*(_catch_up_channel(client, u, mark, sem) for u, mark in channels))
+    logger.info("Catch-up: done, %d channel(s), %d post(s)", len(channels), sum(counts))
@@ -4,6 +4,22 @@ from pyrogram import Client
 from src.common.config import settings
 
 
+def session_entries() -> list[tuple[str, str]]:
+    """(shard name, session string) pairs from TELEGRAM_SESSION_STRINGS ("name:string", name optional)."""
+    raw = (settings.telegram_session_strings or "").replace("\n", ",")
+    out: list[tuple[str, str]] = []
+    for i, item in enumerate(x.strip() for x in raw.split(",")):
+        if not item:
+            continue
+        name, sep, value = item.partition(":")
+        if not sep:
+            name, value = f"userbot{i + 1}", item
+        out.append((name.strip(), value.strip()))
+    if len({n for n, _ in out}) != len(out):
+        raise ValueError("TELEGRAM_SESSION_STRINGS: duplicate session names")
+    return out
+
+
 def build_userbot() -> Client:
     if not settings.telegram_api_id or not settings.telegram_api_hash:
         raise ValueError("TELEGRAM_API_ID and TELEGRAM_API_HASH are required")
@@ -19,3 +35,22 @@ def build_userbot() -> Client:
         in_memory=use_string,
         workdir=None if use_string else "data",
     )
+
+
+def build_userbots() -> list[Client]:
+    """One client per TELEGRAM_SESSION_STRINGS entry (client.name is the shard name), or the single userbot."""
+    entries = session_entries()
+    if not entries:
+        return [build_userbot()]
+    if not settings.telegram_api_id or not settings.telegram_api_hash:
+        raise ValueError("TELEGRAM_API_ID and TELEGRAM_API_HASH are required")
+    return [
+        Client(
+            name=name,
+            api_id=settings.telegram_api_id,
+            api_hash=settings.telegram_api_hash,
+            session_string=value,
+            in_memory=True,
+        )
+        for name, value in entries
+    ]
@@ -0,0 +1,135 @@
+"""Shard coordinator for several userbot sessions (TELEGRAM_SESSION_STRINGS).
+
+Every USERBOT_SHARD_HEARTBEAT_SEC each local session that still answers ``get_me`` writes a
+heartbeat to ``userbot_shards``. Sessions whose heartbeat is older than USERBOT_SHARD_TTL_SEC
+are dead; channels are placed on a consistent-hash ring of the live ones and the result is
+stored in ``channels.shard``. The placement is deterministic, so several userbot processes
+sharing the database compute the same answer.
+
+When channels move to a local session it joins them (public channels) and catches up from
+their high-water marks, so posts seen by nobody while the old session was dying are not lost.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import socket
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+
+from src.common.config import settings
+from src.infra.db.base import async_session_maker
+from src.infra.db.repositories import ChannelRepo, UserbotShardRepo
+from src.infra.metrics.metrics import USERBOT_CHANNELS_MOVED_TOTAL, USERBOT_SHARDS_ALIVE
+from src.infra.userbot.catchup import catch_up
+from src.infra.userbot.shards import assign_channels
+from src.infra.userbot.watcher import invalidate_channel_cache
+
+logger = logging.getLogger(__name__)
+
+
+async def _healthy(client: Client) -> bool:
+    if not client.is_connected:
+        return False
+    try:
+        await client.get_me()
+        return True
+    except FloodWait:
+        return True  # rate-limited, but the session itself is fine
+    except Exception as e:
+        logger.warning("Userbot %s: health check failed: %s", client.name, e)
+        return False
+
+
+async def _heartbeat(clients: list[Client]) -> None:
+    host = socket.gethostname()
+    for client in clients:
+        if await _healthy(client):
+            async with async_session_maker() as db:
+                await UserbotShardRepo(db).heartbeat(client.name, host=host)
+
+
+async def _take_over(client: Client, usernames: set[str], *, catch_up_moved: bool = True) -> None:
+    for username in sorted(usernames):
+        try:
+            await client.join_chat(username)
+        except FloodWait as e:
+            logger.warning("Userbot %s: FloodWait %ss joining %s", client.name, e.value, username)
+            await asyncio.sleep(float(e.value or 0) + 1)
+        except Exception as e:
+            logger.warning("Userbot %s: cannot join %s: %s", client.name, username, e)
+    if catch_up_moved:
+        await catch_up(client, usernames)
+
+
+# Local session name -> channels it is watching, as this process last placed them. Takeovers
+# are computed against this, not channels.shard: another process may have stored the new
+# placement first, and this one still has to join and catch up the channels it gained.
+_watching: dict[str, set[str]] = {}
+
+
+async def rebalance(clients: list[Client]) -> dict[str, set[str]]:
+    """Place channels on the live shards; returns the channels each local session gained.
+
+    A session seen for the first time starts from the channels stored for it (what it
+    watched before a restart).
+    """
+    async with async_session_maker() as db:
+        alive = await UserbotShardRepo(db).alive(settings.userbot_shard_ttl_sec)
+        USERBOT_SHARDS_ALIVE.set(len(alive))
+        if not alive:
+            return {}
+        repo = ChannelRepo(db)
+        channels = {c.username.lower().lstrip("@"): c.shard for c in await repo.list() if c.username}
+        assignment = assign_channels(sorted(channels), alive)
+        moved = {u: s for u, s in assignment.items() if channels.get(u) != s}
+        if moved:
+            await repo.set_shards(assignment)
+
+    if moved:
+        USERBOT_CHANNELS_MOVED_TOTAL.inc(len(moved))
+        invalidate_channel_cache()
+        logger.info("Userbot shards: alive=%s, %d channel(s) reassigned: %s", alive, len(moved), moved)
+    gained: dict[str, set[str]] = {}
+    for client in clients:
+        if client.name not in _watching:
+            _watching[client.name] = {u for u, s in channels.items() if s == client.name}
+        owned = {u for u, s in assignment.items() if s == client.name}
+        new = owned - _watching[client.name]
+        _watching[client.name] = owned
+        if new:
+            gained[client.name] = new
+    if gained and not moved:
+        invalidate_channel_cache()  # placed by another process
+    return gained
+
+
+async def run_coordinator(clients: list[Client]) -> None:
+    """Heartbeat + rebalance loop; runs for the lifetime of the userbot process.
+
+    The first placement is followed by the regular startup catch-up of every session.
+    """
+    by_name = {c.name: c for c in clients}
+    takeovers: set[asyncio.Task] = set()
+    first = True
+    while True:
+        try:
+            await _heartbeat(clients)
+            gained = await rebalance(clients)
+            if first:
+                await asyncio.gather(*(_take_over(by_name[s], u, catch_up_moved=False) for s, u in gained.items()))
+                for client in clients:
+                    task = asyncio.create_task(catch_up(client))
+                    takeovers.add(task)
+                    task.add_done_callback(takeovers.discard)
+                first = False
+            else:
+                for shard, usernames in gained.items():
+                    task = asyncio.create_task(_take_over(by_name[shard], usernames))
+                    takeovers.add(task)
+                    task.add_done_callback(takeovers.discard)
+        except Exception:
+            logger.exception("Userbot shards: coordinator tick failed")
+        await asyncio.sleep(max(1.0, settings.userbot_shard_heartbeat_sec))
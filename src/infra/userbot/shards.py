@@ -0,0 +1,61 @@
+"""Userbot sharding primitives: the consistent-hash ring and per-session outbound rate limits.
+
+Each userbot session is a shard. Channels are placed on a hash ring of the live shards
+(``VNODES`` points per shard), so when a shard dies only its channels move and they spread
+over the survivors; when it comes back the same channels return to it.
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import logging
+
+from src.common.config import settings
+from src.infra.resilience.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+VNODES = 64
+
+# Shards (sessions) running in this process; stays empty for the single, unsharded userbot.
+LOCAL_SHARDS: list[str] = []
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, shards: list[str], vnodes: int = VNODES):
+        points = sorted((_point(f"{s}#{i}"), s) for s in set(shards) for i in range(vnodes))
+        self._keys = [p for p, _ in points]
+        self._shards = [s for _, s in points]
+
+    def owner(self, key: str) -> str | None:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _point(key)) % len(self._keys)
+        return self._shards[i]
+
+
+def assign_channels(usernames: list[str], shards: list[str]) -> dict[str, str]:
+    """username -> shard over ``shards`` (empty when there are none)."""
+    ring = HashRing(shards)
+    out: dict[str, str] = {}
+    for u in usernames:
+        owner = ring.owner(u)
+        if owner:
+            out[u] = owner
+    return out
+
+
+_buckets: dict[str, TokenBucket] = {}
+
+
+def bucket_for(shard: str) -> TokenBucket:
+    bucket = _buckets.get(shard)
+    if bucket is None:
+        interval = settings.userbot_forward_interval_sec
+        bucket = _buckets[shard] = TokenBucket(1 / interval if interval > 0 else 0.0, settings.userbot_forward_burst)
+    return bucket
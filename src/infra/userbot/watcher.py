@@ -1,19 +1,35 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
-from typing import Set
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Set, TypeVar
 
 from pyrogram import Client, filters
+from pyrogram.errors import FloodWait
 from pyrogram.types import Message as PyroMessage
 
 from src.common.config import settings
 from src.infra.db.base import async_session_maker
-from src.infra.db.repositories import ChannelRepo
+from src.infra.db.repositories import ChannelRepo, IngestTraceRepo
+from src.infra.metrics.metrics import USERBOT_DELIVERIES_TOTAL, USERBOT_FLOODWAIT_SECONDS_TOTAL, USERBOT_OUTBOX_DEPTH, record_failure
+from src.infra.tracing.tracer import span
+from src.infra.userbot.shards import LOCAL_SHARDS, HashRing, bucket_for
 
 logger = logging.getLogger(__name__)
 
-_ALLOWED_CACHE: dict[str, object] = {"ts": 0.0, "set": set()}  # type: ignore[misc]
+T = TypeVar("T")
+
+_ALLOWED_CACHE: dict[str, object] = {"ts": 0.0, "set": set(), "owners": {}}  # type: ignore[misc]
+
+_TRACE_TTL_SEC = 24 * 3600.0
+_TRACE_PURGE_EVERY_SEC = 600.0
+_traces_purged_at = 0.0
+
+
+def invalidate_channel_cache() -> None:
+    _ALLOWED_CACHE["ts"] = 0.0
 
 
 async def _allowed_usernames(ttl_seconds: int = 30) -> Set[str]:
@@ -28,89 +44,294 @@ async def _allowed_usernames(ttl_seconds: int = 30) -> Set[str]:
         repo = ChannelRepo(db)
         rows = await repo.list()
         allowed = {c.username.lower().lstrip("@") for c in rows if c.username}
+        owners = {c.username.lower().lstrip("@"): c.shard for c in rows if c.username and c.shard}
 
     _ALLOWED_CACHE["ts"] = now
     _ALLOWED_CACHE["set"] = allowed
+    _ALLOWED_CACHE["owners"] = owners
     logger.info("Userbot: loaded %d allowed channels: %s", len(allowed), sorted(list(allowed))[:20])
     return allowed
 
 
+async def owns_channel(client: Client, username: str) -> bool:
+    """Whether ``client``'s session is the shard responsible for ``username``.
+
+    Always true without TELEGRAM_SESSION_STRINGS. Channels not assigned yet go to the local
+    session the ring picks, so they are still forwarded once until the coordinator places them.
+    """
+    if not LOCAL_SHARDS:
+        return True
+    await _allowed_usernames()
+    owners: dict = _ALLOWED_CACHE.get("owners") or {}  # type: ignore[assignment]
+    owner = owners.get(username) or HashRing(LOCAL_SHARDS).owner(username)
+    return owner == client.name
+
+
 def _extract_text(msg: PyroMessage) -> str:
     return (msg.text or msg.caption or "").strip()
 
 
-def setup_handlers(app: Client) -> None:
-    @app.on_message(filters.channel)
-    async def on_channel_post(client: Client, msg: PyroMessage):
+async def _call(client: Client, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+    """One outbound Telegram call under the session's token bucket; FloodWait pauses the bucket."""
+    bucket = bucket_for(client.name)
+    await bucket.acquire()
+    try:
+        return await fn(*args, **kwargs)
+    except FloodWait as e:
+        wait = float(e.value or 0)
+        bucket.pause(wait + 1)
+        USERBOT_FLOODWAIT_SECONDS_TOTAL.labels(client.name).inc(wait)
+        raise
+
+
+# Delivery methods, best first: forward keeps media & forward metadata; copy (media only) and
+# send (text only) embed a #src tag instead. Protected channels only allow the last ones.
+_METHODS = ("forward", "copy", "send")
+# (chat_id, is media post) -> (method that worked last, when it was learned): saves the doomed
+# attempts. Media and text are learned separately: "send" working for text says nothing about copy.
+_DELIVERY_CACHE: dict[tuple[int, bool], tuple[str, float]] = {}
+
+
+def _is_media(msg: PyroMessage) -> bool:
+    return bool(getattr(msg, 'photo', None) or getattr(msg, 'document', None) or getattr(msg, 'video', None) or getattr(msg, 'animation', None))
+
+
+def _first_method(key: tuple[int, bool]) -> int:
+    cached = _DELIVERY_CACHE.get(key)
+    if not cached or time.monotonic() - cached[1] >= settings.userbot_delivery_reprobe_sec:
+        return 0  # unknown or due for a re-probe: start with forward again
+    return _METHODS.index(cached[0])
+
+
+async def _deliver(client: Client, msg: PyroMessage, *, username: str) -> str:
+    """Try the methods from the cached one on; returns the method that worked."""
+    chat_id = getattr(msg.chat, "id", 0)
+    src_tag = f"\n\n#src:{chat_id}:{msg.id}"
+    where = username or chat_id
+    key = (chat_id, _is_media(msg))
+    last_error: Exception | None = None
+    first = _first_method(key)
+    for method in _METHODS[first:]:
         try:
-            if not settings.ingest_bot_username:
-                raise ValueError("INGEST_BOT_USERNAME is not set")
-
-            username = (getattr(msg.chat, "username", "") or "").lower().lstrip("@")
-            allowed = await _allowed_usernames()
-
-            if allowed:
-                if not username:
-                    # Private channel without username — in this implementation we can't match it
-                    logger.debug("Skip channel without username: chat_id=%s", getattr(msg.chat, "id", None))
-                    return
-                if username not in allowed:
-                    return
-
-            # If it's an album (media_group_id), forward only the item that contains caption/text.
-            # This prevents duplicates while still keeping (caption + one photo).
-            if msg.media_group_id and not _extract_text(msg):
-                logger.debug(
-                    "Skip album item without text/caption: %s msg_id=%s group=%s",
-                    username or getattr(msg.chat, "id", None),
-                    msg.id,
-                    msg.media_group_id,
+            if method == "forward":
+                await _call(client, msg.forward, settings.ingest_bot_username)
+            elif method == "copy":
+                if not _is_media(msg):
+                    continue
+                # For media messages we can override caption to include source tag.
+                cap = _extract_text(msg)
+                cap = (cap + src_tag).strip() if cap else src_tag.strip()
+                await _call(
+                    client,
+                    client.copy_message,
+                    chat_id=settings.ingest_bot_username,
+                    from_chat_id=chat_id,
+                    message_id=msg.id,
+                    caption=cap,
                 )
+            else:
+                # Text with embedded source tag (text-only posts, or media that cannot be copied).
+                t = (_extract_text(msg) + src_tag).strip()
+                await _call(client, client.send_message, settings.ingest_bot_username, t)
+        except FloodWait:
+            raise
+        except Exception as e:
+            logger.warning("Userbot: %s failed for msg_id=%s from %s (%s)", method, msg.id, where, e)
+            last_error = e
+            continue
+        cached = _DELIVERY_CACHE.get(key)
+        if not cached or cached[0] != method:
+            logger.info("Userbot: chat %s delivers %s posts via %s", where, "media" if key[1] else "text", method)
+        # Only a probe from the top (or a fall-through) dates the entry; plain hits keep the re-probe due.
+        if first == 0 or not cached or cached[0] != method:
+            _DELIVERY_CACHE[key] = (method, time.monotonic())
+        USERBOT_DELIVERIES_TOTAL.labels(method).inc()
+        logger.info("Userbot: %s msg_id=%s from %s", method, msg.id, where)
+        return method
+    if last_error is None:
+        last_error = ValueError(f"nothing to deliver for msg_id={msg.id}")
+    record_failure("userbot_forward", last_error)
+    raise last_error
+
+
+async def forward_to_ingest(client: Client, msg: PyroMessage, *, username: str = "") -> None:
+    """Hand a channel post to the ingest bot (forward, falling back to copy with a #src tag).
+
+    Also stores the capture trace context for the admin bot, which deletes it on ingest (rows
+    left older than a day are purged here). The delivery method that worked for the chat is
+    reused (re-probing forward every USERBOT_DELIVERY_REPROBE_SEC). Every Telegram call takes a
+    token from the session's bucket. FloodWait (never answered by a fallback) and failure of
+    every method are raised to the caller (outbox / backfill retry).
+    """
+    global _traces_purged_at
+    chat_id = getattr(msg.chat, "id", 0)
+    with span("userbot.capture", source_chat_id=chat_id, source_message_id=msg.id, channel=username) as sp:
+        if getattr(msg, "date", None):
+            sp.set_attribute("posted_at", int(msg.date.timestamp()))
+        # Hand the trace over to the admin bot (keyed by the source post).
+        try:
+            async with async_session_maker() as db:
+                repo = IngestTraceRepo(db)
+                await repo.put(chat_id, msg.id, sp.traceparent)
+                # Posts the bot never ingested (filtered, failed) leave their row behind.
+                if time.monotonic() - _traces_purged_at > _TRACE_PURGE_EVERY_SEC:
+                    _traces_purged_at = time.monotonic()
+                    n = await repo.purge(ttl_sec=_TRACE_TTL_SEC)
+                    if n:
+                        logger.info("Userbot: purged %d stale trace context(s)", n)
+        except Exception:
+            logger.exception("Userbot: failed to store trace context")
+
+        method = await _deliver(client, msg, username=username)
+        sp.set_attribute("delivery", method)
+
+
+async def _advance_watermark(username: str, message_id: int, chat_id: int | None = None) -> None:
+    try:
+        async with async_session_maker() as db:
+            await ChannelRepo(db).advance_watermark(username, message_id, chat_id=chat_id)
+    except Exception:
+        logger.exception("Userbot: failed to store high-water mark channel=%s msg_id=%s", username, message_id)
+
+
+@dataclass
+class _Outgoing:
+    msg: PyroMessage
+    username: str
+    forward: bool  # False: album item without text, only the high-water mark moves
+
+
+class Outbox:
+    """Outbound queue of one session: a FIFO and a worker per channel.
+
+    Update handlers only enqueue. Workers share the session's token bucket, so a burst drains
+    at the allowed rate; FloodWait is waited out and the same post retried, other failures are
+    retried with exponential backoff. A channel's mark advances only after its post is
+    delivered, so whatever is still queued at shutdown is picked up by the next catch-up.
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+        self._queues: dict[str, asyncio.Queue[_Outgoing]] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+
+    def put(self, msg: PyroMessage, *, username: str, forward: bool = True) -> None:
+        key = username or str(getattr(msg.chat, "id", 0))
+        q = self._queues.get(key)
+        if q is None:
+            q = self._queues[key] = asyncio.Queue()
+            self._workers[key] = asyncio.create_task(self._work(q))
+        q.put_nowait(_Outgoing(msg, username, forward))
+        USERBOT_OUTBOX_DEPTH.labels(self.client.name).inc()
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues.values())
+
+    async def drain(self) -> None:
+        await asyncio.gather(*(q.join() for q in list(self._queues.values())))
+
+    def close(self) -> None:
+        for task in self._workers.values():
+            task.cancel()
+        self._workers.clear()
+        self._queues.clear()
+
+    async def _work(self, q: asyncio.Queue[_Outgoing]) -> None:
+        while True:
+            item = await q.get()
+            try:
+                if item.forward:
+                    delivered = await self._deliver(item)
+                else:
+                    delivered = True
+                if delivered and item.username:
+                    await _advance_watermark(item.username, item.msg.id, item.msg.chat.id if item.msg.chat else None)
+            except Exception:
+                logger.exception("Userbot: outbox failed msg_id=%s", item.msg.id)
+            finally:
+                q.task_done()
+                USERBOT_OUTBOX_DEPTH.labels(self.client.name).dec()
+
+    async def _deliver(self, item: _Outgoing) -> bool:
+        delay = max(0.0, settings.userbot_forward_retry_base_sec)
+        attempts = max(1, settings.userbot_forward_max_attempts)
+        attempt = 0
+        while True:
+            try:
+                await forward_to_ingest(self.client, item.msg, username=item.username)
+                return True
+            except FloodWait as e:
+                # The bucket is already paused for this long; every channel of the session waits.
+                logger.warning("Userbot %s: FloodWait %ss, msg_id=%s waits in the outbox", self.client.name, e.value, item.msg.id)
+            except Exception as e:
+                attempt += 1
+                if attempt >= attempts:
+                    logger.error("Userbot: giving up on msg_id=%s from %s after %d attempts: %s", item.msg.id, item.username, attempt, e)
+                    return False
+                logger.warning("Userbot: delivery of msg_id=%s failed (%s), retry in %.0fs", item.msg.id, e, delay)
+                await asyncio.sleep(delay)
+                delay *= 2
+
+
+_outboxes: dict[str, Outbox] = {}
+
+
+def outbox_for(client: Client) -> Outbox:
+    box = _outboxes.get(client.name)
+    if box is None:
+        box = _outboxes[client.name] = Outbox(client)
+    return box
+
+
+async def handle_channel_post(client: Client, msg: PyroMessage) -> None:
+    """Filter a channel post and hand it to the ingest bot (live updates and catch-up) via the outbox."""
+    try:
+        if not settings.ingest_bot_username:
+            raise ValueError("INGEST_BOT_USERNAME is not set")
+
+        username = (getattr(msg.chat, "username", "") or "").lower().lstrip("@")
+        allowed = await _allowed_usernames()
+
+        if allowed:
+            if not username:
+                # Private channel without username — in this implementation we can't match it
+                logger.debug("Skip channel without username: chat_id=%s", getattr(msg.chat, "id", None))
                 return
+            if username not in allowed:
+                return
+        if username and not await owns_channel(client, username):
+            return
 
-            text = _extract_text(msg)
-            has_photo = bool(getattr(msg, "photo", None))
-            logger.info(
-                "Userbot: incoming post channel=%s msg_id=%s group=%s has_photo=%s text_len=%s",
+        # If it's an album (media_group_id), forward only the item that contains caption/text.
+        # This prevents duplicates while still keeping (caption + one photo).
+        if msg.media_group_id and not _extract_text(msg):
+            logger.debug(
+                "Skip album item without text/caption: %s msg_id=%s group=%s",
                 username or getattr(msg.chat, "id", None),
                 msg.id,
                 msg.media_group_id,
-                has_photo,
-                len(text),
             )
+            if username:
+                outbox_for(client).put(msg, username=username, forward=False)
+            return
 
-            # Prefer forward (keeps media & forward metadata). If it fails, try copy with embedded source tag.
-            src_tag = f"\n\n#src:{getattr(msg.chat, 'id', 0)}:{msg.id}"
-            try:
-                await msg.forward(settings.ingest_bot_username)
-                logger.info("Userbot: forwarded msg_id=%s from %s", msg.id, username or getattr(msg.chat, 'id', None))
-            except Exception as e:
-                logger.warning("Userbot: forward failed (%s). Trying copy_message.", e)
-                try:
-                    is_media = bool(getattr(msg, 'photo', None) or getattr(msg, 'document', None) or getattr(msg, 'video', None) or getattr(msg, 'animation', None))
-                    if is_media:
-                        # For media messages we can override caption to include source tag.
-                        cap = _extract_text(msg)
-                        cap = (cap + src_tag).strip() if cap else src_tag.strip()
-                        await client.copy_message(
-                            chat_id=settings.ingest_bot_username,
-                            from_chat_id=getattr(msg.chat, 'id', 0),
-                            message_id=msg.id,
-                            caption=cap,
-                        )
-                        logger.info("Userbot: copied msg_id=%s from %s", msg.id, username or getattr(msg.chat, 'id', None))
-                    else:
-                        # Text-only: send the text with embedded source tag.
-                        t = (_extract_text(msg) + src_tag).strip()
-                        if t:
-                            await client.send_message(settings.ingest_bot_username, t)
-                except Exception as e2:
-                    logger.warning("Userbot: copy/send fallback failed (%s).", e2)
-                    t = (_extract_text(msg) + src_tag).strip()
-                    if t:
-                        try:
-                            await client.send_message(settings.ingest_bot_username, t)
-                        except Exception:
-                            pass
-        except Exception:
-            logger.exception("Userbot failed in on_channel_post")
+        text = _extract_text(msg)
+        has_photo = bool(getattr(msg, "photo", None))
+        logger.info(
+            "Userbot: incoming post channel=%s msg_id=%s group=%s has_photo=%s text_len=%s",
+            username or getattr(msg.chat, "id", None),
+            msg.id,
+            msg.media_group_id,
+            has_photo,
+            len(text),
+        )
+
+        outbox_for(client).put(msg, username=username)
+    except Exception:
+        logger.exception("Userbot failed in on_channel_post")
+
+
+def setup_handlers(app: Client) -> None:
+    @app.on_message(filters.channel)
+    async def on_channel_post(client: Client, msg: PyroMessage):
+        await handle_channel_post(client, msg)
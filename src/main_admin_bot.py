@@ -3,12 +3,18 @@ from __future__ import annotations
 import asyncio
 import logging
 
+import uvicorn
 from aiogram import Bot, Dispatcher
 
 from src.common.logging import setup_logging
 from src.common.config import settings
+from src.common.destinations import parse_destinations
+from src.infra.db.base import engine
 from src.infra.db.init_db import init_db
-from src.infra.telegram.middlewares import DbSessionMiddleware
+from src.infra.telegram.fsm_storage import SqlStorage
+from src.infra.telegram.middlewares import BotApiMetricsMiddleware, BotApiRateLimitMiddleware, DbSessionMiddleware
+from src.infra.metrics.metrics import start_metrics_server
+from src.infra.tracing.tracer import init_tracing
 from src.infra.telegram.handlers.ingest import router as ingest_router
 from src.infra.telegram.handlers.panel import router as panel_router
 from src.infra.telegram.review import router as review_router
@@ -16,12 +22,27 @@ from src.infra.scheduler.scheduler import build_scheduler
 
 logger = logging.getLogger(__name__)
 
-async def main() -> None:
-    setup_logging()
-    await init_db()
 
+def build_bot() -> Bot:
     bot = Bot(token=settings.telegram_bot_token)  # no parse_mode to avoid HTML entity issues
+    # Outermost first: the limiter waits and retries, the metrics time each actual call.
+    bot.session.middleware(BotApiRateLimitMiddleware())
+    bot.session.middleware(BotApiMetricsMiddleware())
+    return bot
+
+
+def build_dispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=SqlStorage())
+    dp.message.middleware(DbSessionMiddleware())
+    dp.callback_query.middleware(DbSessionMiddleware())
+
+    dp.include_router(panel_router)
+    dp.include_router(ingest_router)
+    dp.include_router(review_router)
+    return dp
+
 
+async def check_chats(bot: Bot) -> None:
     # Lightweight sanity checks (do not fail startup; log actionable diagnostics)
     try:
         me = await bot.get_me()
@@ -32,6 +53,7 @@ async def main() -> None:
     for name, chat_id in (
         ("ADMIN_REVIEW_CHAT_ID", settings.admin_review_chat_id),
         ("DESTINATION_CHANNEL", settings.destination_channel),
+        *(("DESTINATIONS", d.chat) for d in parse_destinations(settings.destinations)),
     ):
         if not chat_id:
             continue
@@ -45,13 +67,18 @@ async def main() -> None:
                 chat_id,
                 e,
             )
-    dp = Dispatcher()
-    dp.message.middleware(DbSessionMiddleware())
-    dp.callback_query.middleware(DbSessionMiddleware())
 
-    dp.include_router(panel_router)
-    dp.include_router(ingest_router)
-    dp.include_router(review_router)
+
+async def _polling() -> None:
+    await init_db()
+    start_metrics_server(settings.admin_bot_metrics_port, settings.metrics_bind)
+    init_tracing("admin-bot")
+
+    bot = build_bot()
+    await check_chats(bot)
+    # A webhook left over from webhook mode blocks getUpdates.
+    await bot.delete_webhook()
+    dp = build_dispatcher()
 
     scheduler = build_scheduler(bot)
     scheduler.start()
@@ -59,5 +86,39 @@ async def main() -> None:
     logger.info("Admin bot started")
     await dp.start_polling(bot)
 
+
+async def _prepare_webhook() -> None:
+    if not settings.webhook_secret:
+        raise ValueError("WEBHOOK_SECRET is required in webhook mode")
+    await init_db()
+    bot = build_bot()
+    try:
+        await check_chats(bot)
+        url = settings.webhook_base_url.rstrip("/") + settings.webhook_path
+        await bot.set_webhook(url, secret_token=settings.webhook_secret, allowed_updates=["message", "callback_query"])
+        logger.info("Admin bot: webhook set to %s", url)
+    finally:
+        await bot.session.close()
+        # Workers open their own connections (a single worker runs in this process, on a new loop).
+        await engine.dispose()
+
+
+def main() -> None:
+    setup_logging()
+    if not settings.webhook_base_url:
+        asyncio.run(_polling())
+        return
+
+    # Schema and webhook are set up once here; each worker only serves updates.
+    asyncio.run(_prepare_webhook())
+    uvicorn.run(
+        "src.main_admin_webhook:app",
+        host=settings.webhook_bind,
+        port=settings.webhook_port,
+        workers=max(1, settings.webhook_workers),
+        log_config=None,
+    )
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,83 @@
+"""Admin bot in webhook mode: one ASGI app per uvicorn worker.
+
+Started by ``python -m src.main_admin_bot`` when WEBHOOK_BASE_URL is set (that process
+registers the webhook and runs WEBHOOK_WORKERS workers). Each worker verifies Telegram's
+secret token, acknowledges the update at once and handles it in the background, like
+polling does. State that must be shared between workers lives in the database: ingest
+claims, regen leases (``leases``) and the publish scheduler's leadership lease.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+
+from src.common.config import settings
+from src.common.logging import setup_logging
+from src.infra.metrics.metrics import render_latest
+from src.infra.scheduler.scheduler import build_scheduler
+from src.infra.tracing.tracer import init_tracing
+from src.main_admin_bot import build_bot, build_dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    setup_logging()
+    init_tracing("admin-bot")
+    app.state.bot = build_bot()
+    app.state.dp = build_dispatcher()
+    app.state.tasks = set()
+    scheduler = build_scheduler(app.state.bot)
+    scheduler.start()
+    logger.info("Admin bot webhook worker started")
+    try:
+        yield
+    finally:
+        scheduler.shutdown(wait=False)
+        for task in list(app.state.tasks):
+            task.cancel()
+        await app.state.bot.session.close()
+
+
+app = FastAPI(title="Admin bot webhook", lifespan=_lifespan)
+
+
+@app.get("/health")
+async def health():
+    return {"ok": True}
+
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
+@app.post(settings.webhook_path)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: str | None = Header(default=None, alias="X-Telegram-Bot-Api-Secret-Token"),
+):
+    expected = settings.webhook_secret or ""
+    if not expected or not hmac.compare_digest(x_telegram_bot_api_secret_token or "", expected):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    update = await request.json()
+    # Handlers may run for minutes (KIE); Telegram would time out and redeliver.
+    task = asyncio.create_task(_feed(request.app, update))
+    request.app.state.tasks.add(task)
+    task.add_done_callback(request.app.state.tasks.discard)
+    return {"ok": True}
+
+
+async def _feed(app: FastAPI, update: dict) -> None:
+    try:
+        await app.state.dp.feed_raw_update(app.state.bot, update)
+    except Exception:
+        logger.exception("Admin bot: update %s failed", update.get("update_id"))
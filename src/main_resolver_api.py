@@ -1,14 +1,17 @@
 from __future__ import annotations
 
 import logging
-from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 
 from src.common.logging import setup_logging
 from src.common.config import settings
+from src.common.media_urls import resolve_media_path, verify_media_signature
 from src.infra.db.init_db import init_db
 from src.infra.db.base import async_session_maker
 from src.infra.db.repositories import PromptTokenRepo
+from src.infra.metrics.metrics import render_latest
 
 logger = logging.getLogger(__name__)
 app = FastAPI(title="Prompt Resolver API", version="1.0.0")
@@ -27,6 +30,21 @@ async def _startup():
 async def health():
     return {"ok": True}
 
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/media/{path:path}")
+async def media(path: str, exp: int = Query(...), sig: str = Query(...)):
+    """Draft media for KIE reference fetches; only via signed, unexpired URLs."""
+    if not verify_media_signature(path, exp, sig):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    fp = resolve_media_path(path)
+    if fp is None or not fp.is_file():
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(fp, headers={"Cache-Control": "private, max-age=60"})
+
 @app.get("/v1/prompt/{token}", response_model=ResolveResponse)
 async def resolve_prompt(
     token: str,
@@ -1,23 +1,89 @@
 from __future__ import annotations
 
+import argparse
 import asyncio
 import logging
+from datetime import datetime
 
+from pyrogram import Client, idle
+
+from src.common.config import settings
 from src.common.logging import setup_logging
+from src.infra.metrics.metrics import start_metrics_server
+from src.infra.tracing.tracer import init_tracing
 from src.infra.db.init_db import init_db
-from src.infra.userbot.client import build_userbot
-from src.infra.userbot.watcher import setup_handlers
+from src.infra.userbot.backfill import backfill_channel
+from src.infra.userbot.catchup import catch_up
+from src.infra.userbot.client import build_userbot, build_userbots
+from src.infra.userbot.coordinator import run_coordinator
+from src.infra.userbot.shards import LOCAL_SHARDS
+from src.infra.userbot.watcher import outbox_for, setup_handlers
 
 logger = logging.getLogger(__name__)
 
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Userbot: watch source channels, or backfill one channel's history.")
+    p.add_argument("--backfill", metavar="CHANNEL", help="backfill this channel (@username or id) and exit")
+    p.add_argument("--limit", type=int, default=None, help="backfill: last N posts")
+    p.add_argument("--since", type=datetime.fromisoformat, default=None, help="backfill: posts since this UTC date")
+    p.add_argument("--restart", action="store_true", help="backfill: ignore the saved checkpoint")
+    return p.parse_args()
+
+
+async def _backfill(app: Client, args: argparse.Namespace) -> None:
+    async with app:
+        await backfill_channel(app, args.backfill, limit=args.limit, since=args.since, restart=args.restart)
+
+
+async def _watch(apps: list[Client]) -> None:
+    started: list[Client] = []
+    try:
+        for app in apps:
+            try:
+                await app.start()
+                started.append(app)
+            except Exception:
+                # A dead session must not take the others down; its channels go to the live ones.
+                if len(apps) == 1:
+                    raise
+                logger.exception("Userbot %s: failed to start", app.name)
+        if not started:
+            raise RuntimeError("No userbot session could be started")
+        # Live updates flow while the missed posts are fetched.
+        if LOCAL_SHARDS:
+            background = asyncio.create_task(run_coordinator(started))
+        else:
+            background = asyncio.create_task(catch_up(started[0]))
+        logger.info("Userbot started: %s", ", ".join(a.name for a in started))
+        await idle()
+        background.cancel()
+    finally:
+        for app in started:
+            # Queued posts are not lost: their channels' marks have not moved, catch-up resends them.
+            outbox_for(app).close()
+            await app.stop()
+
+
 def main() -> None:
+    args = _parse_args()
     setup_logging()
     asyncio.get_event_loop().run_until_complete(init_db())
 
-    app = build_userbot()
-    setup_handlers(app)
-    logger.info("Userbot started")
-    app.run()
+    if args.backfill:
+        init_tracing("userbot-backfill")
+        app = build_userbot()
+        app.run(_backfill(app, args))
+        return
+
+    start_metrics_server(settings.userbot_metrics_port, settings.metrics_bind)
+    init_tracing("userbot")
+
+    apps = build_userbots()
+    if settings.telegram_session_strings:
+        LOCAL_SHARDS.extend(app.name for app in apps)
+    for app in apps:
+        setup_handlers(app)
+    asyncio.get_event_loop().run_until_complete(_watch(apps))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.infra.db.repositories import DraftRepo, PromptTokenRepo
+from src.usecases.regenerate import regenerate_draft
+
+logger = logging.getLogger(__name__)
+
+
+async def choose_candidate(*, db: AsyncSession, draft_id: int, index: int) -> bool:
+    """Keep image candidate ``index`` of a "choosing" draft and caption it.
+
+    The draft becomes a regular "pending_review" draft with that single image. Returns False
+    if the draft is not waiting for a choice (e.g. a second click) or the index is invalid.
+    If captioning fails, the draft keeps the original text as caption and can be regenerated
+    from the review card.
+    """
+    repo = DraftRepo(db)
+    d = await repo.get(draft_id)
+    if not d or d.status != "choosing" or not 0 <= index < len(d.image_paths):
+        return False
+    chosen = d.image_paths[index]
+    if not await repo.transition(draft_id, from_status="choosing", to_status="pending_review"):
+        return False
+
+    await repo.update_content(draft_id, caption=d.caption, image_prompt=d.image_prompt, image_paths=[chosen])
+    logger.info("Choose: draft_id=%s candidate=%s path=%s", draft_id, index + 1, chosen)
+
+    if not await regenerate_draft(db=db, draft_id=draft_id, mode="regen_cap"):
+        logger.warning("Choose: caption failed draft_id=%s, keeping original text", draft_id)
+        await PromptTokenRepo(db).put(f"p_{draft_id}", d.image_prompt)
+    return True
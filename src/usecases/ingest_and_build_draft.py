@@ -1,18 +1,35 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
+import socket
+import time
+import uuid
 from pathlib import Path
+from typing import Awaitable, Callable
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.common.config import settings
 from src.common.templates import DEFAULT_KIE_REGEN_TEMPLATE, DEFAULT_REWRITE_TEMPLATE
-from src.infra.db.repositories import DraftRepo, PromptTokenRepo, SettingRepo
+from src.infra.db.repositories import DraftRepo, IngestClaimRepo, PromptTokenRepo, SettingRepo
 from src.infra.kie.client import KIEInsufficientCreditsError, KieClient
 from src.infra.openai.rewriter import OpenAIRewriter
+from src.infra.metrics.metrics import INGEST_DUPLICATES_TOTAL, in_flight, record_failure
+from src.infra.resilience.breaker import CircuitOpenError
+from src.infra.tracing.tracer import current_traceparent, span, traced
+from src.usecases.ingest_scheduler import ingest_slot
+from src.usecases.stage_timings import record_stage_timings
 
 logger = logging.getLogger(__name__)
 
+# One Telegram album holds at most 10 photos.
+MAX_CANDIDATES = 10
+
+# Sources being ingested by this process -> future of the draft id.
+_inflight: dict[tuple[int, int], asyncio.Future[int]] = {}
+
 
 async def _get_setting(db: AsyncSession, key: str, default: str) -> str:
     try:
@@ -33,6 +50,49 @@ def _format_template(template: str, *, original_text: str) -> str:
         return template + "\n\nИсходный текст: " + (original_text or "")
 
 
+async def _candidate_count(db: AsyncSession) -> int:
+    raw = await _get_setting(db, "INGEST_CANDIDATES", str(settings.ingest_candidates))
+    try:
+        return max(1, min(int(raw), MAX_CANDIDATES))
+    except ValueError:
+        return 1
+
+
+async def _generate_candidates(
+    kie: KieClient, *, prompt: str, out_dir: Path, count: int, image_urls: list[str] | None
+) -> list[str]:
+    """Run ``count`` single-image KIE generations concurrently; keep the ones that succeed."""
+    results = await asyncio.gather(
+        *(
+            kie.generate(
+                prompt=prompt,
+                out_dir=str(out_dir / f"cand_{i + 1}"),
+                n=1,
+                image_urls=image_urls,
+                output_format=settings.kie_output_format,
+                image_size=settings.kie_image_size,
+            )
+            for i in range(count)
+        ),
+        return_exceptions=True,
+    )
+    paths: list[str] = []
+    errors: list[BaseException] = []
+    for r in results:
+        if isinstance(r, BaseException):
+            errors.append(r)
+        elif r:
+            paths.append(r[0])
+    if not paths and errors:
+        raise errors[0]
+    for e in errors:
+        logger.warning("Ingest: KIE candidate failed: %s", e)
+        record_failure("kie", e)
+    return paths
+
+
+@in_flight("ingest")
+@traced("ingest.build_draft")
 async def ingest_and_build_draft(
     *,
     db: AsyncSession,
@@ -40,14 +100,129 @@ async def ingest_and_build_draft(
     source_message_id: int,
     original_text: str,
     source_image_urls: list[str] | None = None,
+    source_images: Callable[[], Awaitable[list[str]]] | None = None,
+    timings: dict[str, float] | None = None,
+    priority: bool = False,
+) -> int:
+    """Create Draft from a forwarded channel post, at most once per source.
+
+    The same source can arrive twice (userbot forward fallback, album races). The first
+    call claims the source in-process and in the DB (``ingest_claims``) before any paid
+    KIE/OpenAI call; concurrent duplicates wait for its draft id instead of generating.
+
+    The build waits for an ingest slot, shared fairly across source channels
+    (``ingest_scheduler``); ``priority`` posts (manual ones) skip the channel queue.
+    ``source_images`` resolves the reference image URLs inside the slot, right before KIE,
+    so signed (MEDIA_URL_TTL_SEC) or Telegram file URLs do not expire while queued.
+    """
+    key = (source_chat_id, source_message_id)
+    running = _inflight.get(key)
+    if running is not None:
+        logger.info("Ingest: duplicate chat=%s msg=%s, waiting for the running ingest", *key)
+        INGEST_DUPLICATES_TOTAL.labels(where="process").inc()
+        return await asyncio.shield(running)
+
+    fut: asyncio.Future[int] = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        draft_id = await _ingest_claimed(
+            db=db,
+            source_chat_id=source_chat_id,
+            source_message_id=source_message_id,
+            original_text=original_text,
+            source_image_urls=source_image_urls,
+            source_images=source_images,
+            timings=timings,
+            priority=priority,
+        )
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            fut.cancel()
+        else:
+            fut.set_exception(e)
+            fut.exception()  # retrieved: nobody may be waiting
+        raise
+    else:
+        fut.set_result(draft_id)
+        return draft_id
+    finally:
+        _inflight.pop(key, None)
+
+
+async def _ingest_claimed(
+    *,
+    db: AsyncSession,
+    source_chat_id: int,
+    source_message_id: int,
+    timings: dict[str, float] | None,
+    priority: bool,
+    **kwargs,
+) -> int:
+    """Hold the DB claim for the source while building; wait if another process holds it.
+
+    The ingest slot is taken only once the claim is ours: waiting on another process's claim
+    does not occupy one.
+    """
+    draft_repo = DraftRepo(db)
+    claims = IngestClaimRepo(db)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    waited = False
+    while not await claims.try_claim(
+        source_chat_id, source_message_id, owner=owner, ttl_sec=settings.ingest_claim_ttl_sec
+    ):
+        if not waited:
+            logger.info("Ingest: chat=%s msg=%s is claimed by another process, waiting", source_chat_id, source_message_id)
+            INGEST_DUPLICATES_TOTAL.labels(where="db").inc()
+            waited = True
+        await asyncio.sleep(settings.ingest_claim_poll_sec)
+        existing = await draft_repo.by_source(source_chat_id, source_message_id)
+        if existing:
+            return existing.id
+
+    try:
+        async with ingest_slot(db, source_chat_id, priority=priority) as queued:
+            # The TTL counts from the start of the build, not from the time spent queued.
+            if not await claims.touch(source_chat_id, source_message_id, owner=owner):
+                existing = await draft_repo.by_source(source_chat_id, source_message_id)
+                if existing:
+                    return existing.id
+                logger.warning("Ingest: claim on chat=%s msg=%s went stale while queued", source_chat_id, source_message_id)
+            timings = dict(timings or {})
+            timings["queue_wait"] = timings.get("queue_wait", 0.0) + queued
+            return await _build_draft(
+                db=db, source_chat_id=source_chat_id, source_message_id=source_message_id, timings=timings, **kwargs
+            )
+    finally:
+        try:
+            await claims.release(source_chat_id, source_message_id, owner=owner)
+        except Exception:
+            logger.exception("Ingest: failed to release claim chat=%s msg=%s", source_chat_id, source_message_id)
+
+
+async def _build_draft(
+    *,
+    db: AsyncSession,
+    source_chat_id: int,
+    source_message_id: int,
+    original_text: str,
+    source_image_urls: list[str] | None = None,
+    source_images: Callable[[], Awaitable[list[str]]] | None = None,
+    timings: dict[str, float] | None = None,
 ) -> int:
     """Create Draft from a forwarded channel post.
 
+    ``timings`` are stage timings measured by the caller (e.g. capture delay); they are
+    stored in the draft's timing ledger together with the KIE/OpenAI timings.
+
     Pipeline:
     1) Build KIE prompt (reference-image regeneration) using KIE_REGEN_TEMPLATE.
     2) KIE generates ONE image (saved on disk).
     3) OpenAI generates Telegram HTML caption based on the generated image, using REWRITE_TEMPLATE.
     4) Save draft, store Promptika prompt under token.
+
+    With INGEST_CANDIDATES > 1, step 2 generates that many images concurrently and, if more
+    than one succeeds, the draft is saved as "choosing" without a caption: the reviewer
+    picks an image (``choose_candidate``) and only that one is captioned.
     """
 
     draft_repo = DraftRepo(db)
@@ -56,6 +231,8 @@ async def ingest_and_build_draft(
         return existing.id
 
     original_text = (original_text or "").strip()
+    if source_images is not None:
+        source_image_urls = [*(source_image_urls or []), *await source_images()] or None
     logger.info(
         "Ingest: start chat=%s msg=%s images=%s text_len=%s",
         source_chat_id,
@@ -71,41 +248,75 @@ async def ingest_and_build_draft(
         settings.kie_regen_template or DEFAULT_KIE_REGEN_TEMPLATE,
     )
     kie_prompt = _format_template(kie_template, original_text=original_text)
+    candidates = await _candidate_count(db)
 
-    # 2) KIE generate (single image)
+    # 2) KIE generate (single image, or concurrent candidates)
+    timings = dict(timings or {})
     image_paths: list[str] = []
     kie = KieClient()
+    kie_started = time.monotonic()
     try:
         out_dir = Path("data/media") / f"draft_{source_chat_id}_{source_message_id}"
         logger.info(
-            "Ingest: KIE generate start draft_key=%s_%s model=%s ref_images=%s",
+            "Ingest: KIE generate start draft_key=%s_%s model=%s ref_images=%s candidates=%s",
             source_chat_id,
             source_message_id,
             settings.kie_model,
             len(source_image_urls or []),
+            candidates,
         )
-        image_paths = await kie.generate(
-            prompt=kie_prompt,
-            out_dir=str(out_dir),
-            n=1,
-            image_urls=source_image_urls,
-            output_format=settings.kie_output_format,
-            image_size=settings.kie_image_size,
-        )
-        image_paths = (image_paths or [])[:1]
+        with span("kie.generate", ref_images=len(source_image_urls or []), candidates=candidates):
+            if candidates > 1:
+                image_paths = await _generate_candidates(
+                    kie, prompt=kie_prompt, out_dir=out_dir, count=candidates, image_urls=source_image_urls
+                )
+            else:
+                image_paths = await kie.generate(
+                    prompt=kie_prompt,
+                    out_dir=str(out_dir),
+                    n=1,
+                    image_urls=source_image_urls,
+                    output_format=settings.kie_output_format,
+                    image_size=settings.kie_image_size,
+                )
+                image_paths = (image_paths or [])[:1]
         logger.info("Ingest: KIE generate done images=%s", len(image_paths))
+    except CircuitOpenError as e:
+        logger.warning("Ingest: KIE skipped, %s", e)
+        record_failure("kie", e)
+        image_paths = []
     except KIEInsufficientCreditsError as e:
         logger.error("KIE credits insufficient: %s", e)
+        record_failure("kie", e)
         image_paths = []
     except Exception as e:
         logger.exception("KIE generate failed: %s", e)
+        record_failure("kie", e)
         image_paths = []
     finally:
+        timings["kie"] = time.monotonic() - kie_started
+        timings["kie_polls"] = kie.poll_count
         try:
             await kie.close()
         except Exception:
             pass
 
+    # Candidates: the reviewer picks one first, the caption is generated for that image only.
+    if len(image_paths) > 1:
+        d = await draft_repo.create(
+            source_chat_id=source_chat_id,
+            source_message_id=source_message_id,
+            original_text=original_text,
+            caption=original_text or "(без текста)",
+            image_prompt=original_text,
+            image_paths=image_paths,
+            trace_parent=current_traceparent(),
+            status="choosing",
+        )
+        await record_stage_timings(db, d.id, timings)
+        logger.info("Ingest: draft created id=%s candidates=%s", d.id, len(image_paths))
+        return d.id
+
     # 3) OpenAI caption (based on generated image)
     caption_html = ""
     promptika_prompt = ""
@@ -123,17 +334,23 @@ async def ingest_and_build_draft(
             # Guess mime by extension (Telegram photos are usually jpg/png)
             suf = Path(img_path).suffix.lower()
             mime = "image/png" if suf == ".png" else "image/jpeg"
+            openai_started = time.monotonic()
             rr = await rewriter.caption_from_image(
                 image_bytes=img_bytes,
                 image_mime=mime,
                 original_text=original_text,
                 template=rewrite_template,
             )
+            timings["openai"] = time.monotonic() - openai_started
             caption_html = rr.caption
             promptika_prompt = rr.promptika_prompt
             logger.info("Ingest: OpenAI caption done")
+        except CircuitOpenError as e:
+            logger.warning("Ingest: OpenAI caption skipped, %s", e)
+            record_failure("openai", e)
         except Exception as e:
             logger.exception("OpenAI caption-from-image failed: %s", e)
+            record_failure("openai", e)
 
     # Fallback: if caption still empty
     if not caption_html or not promptika_prompt:
@@ -144,6 +361,7 @@ async def ingest_and_build_draft(
             logger.info("Ingest: OpenAI text-only fallback done")
         except Exception as e:
             logger.exception("OpenAI text-only fallback failed: %s", e)
+            record_failure("openai_text", e)
             # absolute fallback
             caption_html = (original_text or "").strip() or "(без текста)"
             promptika_prompt = (original_text or "").strip() or ""
@@ -156,11 +374,14 @@ async def ingest_and_build_draft(
         caption=caption_html,
         image_prompt=promptika_prompt,
         image_paths=image_paths,
+        trace_parent=current_traceparent(),
     )
 
     token = f"p_{d.id}"
     token_repo = PromptTokenRepo(db)
     await token_repo.put(token, promptika_prompt)
 
+    await record_stage_timings(db, d.id, timings)
+
     logger.info("Ingest: draft created id=%s token=%s", d.id, token)
     return d.id
@@ -0,0 +1,193 @@
+"""Fair scheduling of ingest work across source channels.
+
+At most INGEST_CONCURRENCY posts are built (KIE + OpenAI) at once. Waiting posts are
+ordered by weighted fair queuing over ``source_chat_id``: every post gets a virtual finish
+tag ``max(now, previous tag of its channel) + 1 / weight``, and the free slot goes to the
+smallest tag. A channel that dumps 50 posts gets tags 1..50, a quiet channel posting
+afterwards gets "now + 1" and runs next instead of after the whole burst. A channel with
+weight 2 gets twice the slots of a weight-1 channel while both have posts waiting.
+
+``channels.max_in_flight`` caps how many posts of one channel run at once (its other posts
+wait even when slots are free). Manual posts from the admin panel use the priority lane:
+they take the next free slot ahead of all channel posts and ignore the cap.
+
+Scheduling is per process; duplicates of a source are deduplicated before they queue.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.common.config import settings
+from src.infra.db.repositories import ChannelRepo
+from src.infra.metrics.metrics import INGEST_QUEUE_DEPTH, INGEST_QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Waiter:
+    key: int
+    start: float
+    finish: float
+    seq: int
+    fut: asyncio.Future[None]
+
+
+@dataclass
+class _Flow:
+    last_finish: float = 0.0
+    running: int = 0
+    cap: int | None = None
+    pending: deque[_Waiter] = field(default_factory=deque)
+
+
+class FairScheduler:
+    """Weighted fair queue of ingest slots keyed by source chat, plus a strict priority lane."""
+
+    def __init__(self, slots: int | None = None) -> None:
+        self._slots = slots
+        self._running = 0
+        self._vtime = 0.0
+        self._seq = itertools.count()
+        self._flows: dict[int, _Flow] = {}
+        self._priority: deque[tuple[int, asyncio.Future[None]]] = deque()
+
+    @property
+    def slots(self) -> int:
+        return max(1, self._slots if self._slots is not None else settings.ingest_concurrency)
+
+    def depth(self) -> int:
+        return len(self._priority) + sum(len(f.pending) for f in self._flows.values())
+
+    @asynccontextmanager
+    async def slot(
+        self, key: int, *, weight: float = 1.0, cap: int | None = None, priority: bool = False
+    ) -> AsyncIterator[float]:
+        """Hold one ingest slot for source ``key``; yields the seconds spent waiting for it."""
+        lane = "priority" if priority else "fair"
+        flow = self._flows.setdefault(key, _Flow())
+        flow.cap = cap if cap and cap > 0 else None
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        waiter: _Waiter | None = None
+        if priority:
+            self._priority.append((key, fut))
+        else:
+            start = max(self._vtime, flow.last_finish)
+            flow.last_finish = start + 1.0 / max(weight, 0.01)
+            waiter = _Waiter(key=key, start=start, finish=flow.last_finish, seq=next(self._seq), fut=fut)
+            flow.pending.append(waiter)
+        INGEST_QUEUE_DEPTH.labels(lane).inc()
+        queued = time.monotonic()
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            INGEST_QUEUE_DEPTH.labels(lane).dec()
+            if fut.done() and not fut.cancelled():
+                self._release(key)  # granted, but cancelled before it could run
+            else:
+                self._forget(key, fut, waiter)
+            raise
+        waited = time.monotonic() - queued
+        INGEST_QUEUE_DEPTH.labels(lane).dec()
+        INGEST_QUEUE_WAIT_SECONDS.labels(lane).observe(waited)
+        try:
+            yield waited
+        finally:
+            self._release(key)
+
+    def _forget(self, key: int, fut: asyncio.Future[None], waiter: _Waiter | None) -> None:
+        if waiter is None:
+            self._priority = deque(p for p in self._priority if p[1] is not fut)
+        else:
+            flow = self._flows.get(key)
+            if flow is not None and waiter in flow.pending:
+                flow.pending.remove(waiter)
+        self._dispatch()
+
+    def _grant(self, key: int, fut: asyncio.Future[None]) -> None:
+        self._running += 1
+        self._flows.setdefault(key, _Flow()).running += 1
+        fut.set_result(None)
+
+    def _release(self, key: int) -> None:
+        self._running -= 1
+        flow = self._flows.get(key)
+        if flow is not None:
+            flow.running -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._running < self.slots:
+            if self._priority:
+                key, fut = self._priority.popleft()
+                if not fut.done():
+                    self._grant(key, fut)
+                continue
+            best: _Waiter | None = None
+            for flow in self._flows.values():
+                if not flow.pending or (flow.cap is not None and flow.running >= flow.cap):
+                    continue
+                head = flow.pending[0]
+                if best is None or (head.finish, head.seq) < (best.finish, best.seq):
+                    best = head
+            if best is None:
+                break
+            self._flows[best.key].pending.popleft()
+            self._vtime = max(self._vtime, best.start)
+            if not best.fut.done():
+                self._grant(best.key, best.fut)
+        self._gc()
+
+    def _gc(self) -> None:
+        """Drop idle flows whose virtual clock has been caught up with (their tag no longer matters)."""
+        for key in [k for k, f in self._flows.items() if not f.pending and not f.running and f.last_finish <= self._vtime]:
+            del self._flows[key]
+
+
+scheduler = FairScheduler()
+
+# chat_id -> (weight, max_in_flight), refreshed every INGEST_POLICY_TTL_SEC.
+_policies: dict[int, tuple[float, int | None]] = {}
+_policies_loaded_at = 0.0
+
+
+async def source_policy(db: AsyncSession, source_chat_id: int) -> tuple[float, int | None]:
+    """(weight, max_in_flight) of the source channel; defaults for unknown chats."""
+    global _policies, _policies_loaded_at
+    if time.monotonic() - _policies_loaded_at > settings.ingest_policy_ttl_sec:
+        try:
+            rows = await ChannelRepo(db).list()
+        except Exception:
+            logger.exception("Ingest: failed to load channel weights, using the previous ones")
+        else:
+            _policies = {
+                c.chat_id: (c.weight if c.weight and c.weight > 0 else 1.0, c.max_in_flight)
+                for c in rows
+                if c.chat_id is not None
+            }
+        _policies_loaded_at = time.monotonic()
+    weight, cap = _policies.get(source_chat_id, (1.0, None))
+    if cap is None and settings.ingest_source_max_in_flight > 0:
+        cap = settings.ingest_source_max_in_flight
+    return weight, cap
+
+
+@asynccontextmanager
+async def ingest_slot(db: AsyncSession, source_chat_id: int, *, priority: bool = False) -> AsyncIterator[float]:
+    """Wait for this source's turn to build a draft; yields the queue wait in seconds."""
+    weight, cap = await source_policy(db, source_chat_id)
+    async with scheduler.slot(source_chat_id, weight=weight, cap=cap, priority=priority) as waited:
+        if waited > 1:
+            logger.info("Ingest: chat=%s waited %.1fs for a slot (%d queued)", source_chat_id, waited, scheduler.depth())
+        yield waited
@@ -1,55 +1,185 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from aiogram import Bot
 
 from src.common.config import settings
-from src.infra.db.repositories import DraftRepo, SettingRepo
-from src.infra.telegram.publisher import ChannelPublisher
+from src.common.destinations import Destination, parse_destinations
+from src.infra.db.base import async_session_maker
+from src.infra.db.models import Draft
+from src.infra.db.repositories import DraftPublicationRepo, DraftRepo, SettingRepo
+from src.infra.telegram.publisher import ChannelPublisher, PublishResult
+from src.infra.metrics.metrics import in_flight, record_failure
+from src.infra.tracing.tracer import span
+from src.usecases.stage_timings import record_stage_timings
 
 logger = logging.getLogger(__name__)
 
-async def publish_queue_tick(*, db: AsyncSession, bot: Bot) -> int:
-    logger.info("Publish tick started")
-    srepo = SettingRepo(db)
+
+class PublishLeaseLost(RuntimeError):
+    """The draft's publish claim expired and another publisher took it over."""
+
+
+async def _renew_lease(draft_id: int, owner: str) -> None:
+    """Extend the draft's claim before each send, so slow fan-outs are not taken over midway."""
+    async with async_session_maker() as db:
+        if not await DraftRepo(db).extend_publish_lease(draft_id, owner=owner, lease_sec=settings.publish_lease_sec):
+            raise PublishLeaseLost(f"draft {draft_id} is no longer claimed by {owner}")
+
+
+async def configured_destinations(srepo: SettingRepo) -> list[Destination]:
+    """DESTINATIONS, or the single DESTINATION_CHANNEL with the EXTERNAL_* button."""
+    raw = await srepo.get("DESTINATIONS")
+    configured = parse_destinations(raw if raw is not None else settings.destinations)
+    if configured:
+        bot_user = await srepo.get("EXTERNAL_BOT_USERNAME")
+        btn_text = await srepo.get("EXTERNAL_BUTTON_TEXT")
+        return [
+            Destination(chat=d.chat, button_text=d.button_text or btn_text, bot_username=d.bot_username or bot_user)
+            for d in configured
+        ]
     dest = await srepo.get("DESTINATION_CHANNEL")
     destination = dest or settings.destination_channel
     if not destination:
-        logger.warning("DESTINATION_CHANNEL is not set")
+        return []
+    return [
+        Destination(
+            chat=str(destination),
+            button_text=await srepo.get("EXTERNAL_BUTTON_TEXT"),
+            bot_username=await srepo.get("EXTERNAL_BOT_USERNAME"),
+        )
+    ]
+
+
+async def _fan_out(
+    db: AsyncSession, publisher: ChannelPublisher, d: Draft, targets: list[Destination], *, owner: str
+) -> list[str]:
+    """Publish ``d`` to ``targets``; returns the destinations that failed.
+
+    The first destination uploads the images; the others are posted concurrently with its
+    file_ids. Every success is recorded in ``draft_publications``; the requeued draft's retry
+    skips those destinations. The publish lease is renewed before every send.
+    """
+    raw = d.image_paths_json or "[]"
+    image_paths = json.loads(raw) if isinstance(raw, str) else []
+    if not isinstance(image_paths, list):
+        image_paths = []
+    # Read the draft up front: a rolled back duplicate in pubs.add() expires it.
+    draft_id, caption, compiled, trace_parent = d.id, d.caption, d.compiled_caption, d.trace_parent
+    token = f"p_{draft_id}"
+    pubs = DraftPublicationRepo(db)
+
+    async def post(dest: Destination, file_ids: list[str] | None) -> PublishResult:
+        with span("publish", parent=trace_parent, draft_id=draft_id, destination=dest.chat):
+            await _renew_lease(draft_id, owner)
+            return await publisher.publish(
+                destination=dest.chat,
+                caption=caption,
+                image_paths=image_paths,
+                token=token,
+                bot_username=dest.bot_username or None,
+                button_text=dest.button_text or None,
+                compiled=compiled,
+                file_ids=file_ids,
+            )
+
+    failed: list[str] = []
+    first, *others = targets
+    try:
+        result = await post(first, None)
+        await pubs.add(draft_id, first.chat, result.message_id)
+        file_ids = result.file_ids
+    except Exception as e:
+        logger.exception("Publish failed for draft %s to %s", draft_id, first.chat)
+        record_failure("publish", e)
+        failed.append(first.chat)
+        file_ids = None
+
+    results = await asyncio.gather(*(post(dest, file_ids) for dest in others), return_exceptions=True)
+    for dest, res in zip(others, results):
+        if isinstance(res, BaseException):
+            logger.error("Publish failed for draft %s to %s: %s", draft_id, dest.chat, res)
+            record_failure("publish", res)
+            failed.append(dest.chat)
+        else:
+            await pubs.add(draft_id, dest.chat, res.message_id)
+    return failed
+
+
+async def _publish_failed(repo: DraftRepo, draft_id: int, *, owner: str, attempts: int, published: bool) -> None:
+    """Requeue the draft with backoff; after PUBLISH_MAX_ATTEMPTS, settle on its final status.
+
+    ``published`` tells whether some destination already has the post: such a draft ends as
+    "partially_published" rather than "failed".
+    """
+    attempts += 1
+    if attempts < settings.publish_max_attempts:
+        delay = settings.publish_retry_base_sec * 2 ** (attempts - 1)
+        retry_at = datetime.utcnow() + timedelta(seconds=delay)
+        if await repo.retry_publish(draft_id, owner=owner, attempts=attempts, retry_at=retry_at):
+            logger.warning("Publish: draft %s failed (attempt %d), retrying in %.0fs", draft_id, attempts, delay)
+        return
+    status = "partially_published" if published else "failed"
+    logger.error("Publish: draft %s gave up after %d attempts (%s)", draft_id, attempts, status)
+    await repo.finish_publish(draft_id, owner=owner, status=status)
+
+
+@in_flight("publish")
+async def publish_queue_tick(*, db: AsyncSession, bot: Bot) -> int:
+    logger.info("Publish tick started")
+    srepo = SettingRepo(db)
+    destinations = await configured_destinations(srepo)
+    if not destinations:
+        logger.warning("No destination: set DESTINATIONS or DESTINATION_CHANNEL")
         return 0
 
     repo = DraftRepo(db)
-    drafts = await repo.list_approved_unpublished(limit=settings.publish_batch_size)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    drafts = await repo.claim_for_publish(settings.publish_batch_size, owner=owner, lease_sec=settings.publish_lease_sec)
     if not drafts:
         logger.info("Publish tick: queue empty")
         return 0
 
     publisher = ChannelPublisher(bot)
-    
-    bot_user = await srepo.get("EXTERNAL_BOT_USERNAME")
-    btn_text = await srepo.get("EXTERNAL_BUTTON_TEXT")
     sent = 0
-    for d in drafts:
+    for draft_id, d in [(d.id, d) for d in drafts]:
+        attempts, done = 0, set[str]()
         try:
-            raw = d.image_paths_json or "[]"
-            image_paths = json.loads(raw) if isinstance(raw, str) else []
-            if not isinstance(image_paths, list):
-                image_paths = []
-            token = f"p_{d.id}"
-            await publisher.publish(
-                destination=destination,
-                caption=d.caption,
-                image_paths=image_paths,
-                token=token,
-                bot_username=bot_user or None,
-                button_text=btn_text or None,
-            )
-            await repo.set_status(d.id, "published")
+            # A rollback while publishing an earlier draft (duplicate record, failed ledger
+            # write) expires every loaded draft; reload before touching attributes.
+            await db.refresh(d)
+            approved_at, attempts = d.approved_at, d.publish_attempts or 0
+            wanted = {c.strip() for c in (d.destinations or "").split(",") if c.strip()}
+            done = await DraftPublicationRepo(db).destinations_done(draft_id)
+            targets = [t for t in destinations if (not wanted or t.chat in wanted) and t.chat not in done]
+            if not targets and not done:
+                logger.warning("Publish: draft %s routes to %s, none of them is configured", draft_id, sorted(wanted))
+                await repo.finish_publish(draft_id, owner=owner, status="failed")
+                continue
+            started = time.monotonic()
+            failed = await _fan_out(db, publisher, d, targets, owner=owner) if targets else []
+            if failed:
+                published = bool(done) or len(failed) < len(targets)
+                await _publish_failed(repo, draft_id, owner=owner, attempts=attempts, published=published)
+                continue
+            if not await repo.finish_publish(draft_id, owner=owner, status="published"):
+                logger.warning("Publish: lease on draft %s expired while publishing", draft_id)
             sent += 1
-        except Exception:
-            logger.exception("Publish failed for draft %s", d.id)
-            await repo.set_status(d.id, "failed")
+            stages = {"publish": time.monotonic() - started}
+            if approved_at:
+                stages["publish_wait"] = (datetime.utcnow() - approved_at).total_seconds()
+            await record_stage_timings(db, draft_id, stages)
+        except Exception as e:
+            logger.exception("Publish failed for draft %s", draft_id)
+            record_failure("publish", e)
+            await _publish_failed(repo, draft_id, owner=owner, attempts=attempts, published=bool(done))
     logger.info("Publish tick finished: published=%s", sent)
     return sent
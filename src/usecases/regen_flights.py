@@ -0,0 +1,147 @@
+"""Per-draft single-flight regeneration.
+
+A double tap or two reviewers pressing regen at once used to run two full KIE+OpenAI
+pipelines on the same draft (last writer wins). Here every draft has at most one running
+regeneration per process:
+
+- a request whose mode is already covered by the running one attaches to it;
+- otherwise the running one is cancelled and superseded by a regeneration of the union of
+  both modes (e.g. "regen_img" running + "regen_cap" clicked -> "regen_all").
+
+The regeneration runs in its own task and DB session, so it does not depend on the
+lifetime of the callback handler that started it. Across processes (webhook workers) a
+running regeneration holds the lease ``regen:<draft_id>``; a click landing on another
+worker attaches to it (that worker renders the result) and cannot supersede it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from src.common.config import settings
+from src.infra.db.base import async_session_maker
+from src.infra.db.repositories import LeaseRepo
+from src.infra.metrics.metrics import REGEN_REQUESTS_TOTAL
+from src.usecases.regenerate import regenerate_draft
+
+logger = logging.getLogger(__name__)
+
+Progress = Callable[[str], Awaitable[None]]
+
+_PARTS = {"regen_img": {"img"}, "regen_cap": {"cap"}, "regen_all": {"img", "cap"}}
+
+
+def _mode_of(parts: set[str]) -> str:
+    if parts == {"img"}:
+        return "regen_img"
+    if parts == {"cap"}:
+        return "regen_cap"
+    return "regen_all"
+
+
+@dataclass(frozen=True)
+class RegenOutcome:
+    ok: bool
+    mode: str
+    # True when this request attached to a regeneration started by another click.
+    joined: bool = False
+    # True when a newer request cancelled this one; the newer request reports the result.
+    superseded: bool = False
+
+
+@dataclass
+class _Flight:
+    mode: str
+    task: asyncio.Task
+
+
+_flights: dict[int, _Flight] = {}
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def _lease(draft_id: int) -> bool:
+    async with async_session_maker() as db:
+        return await LeaseRepo(db).acquire(f"regen:{draft_id}", owner=_owner(), ttl_sec=settings.regen_lease_sec)
+
+
+async def _run(draft_id: int, mode: str, reference_image_urls: list[str] | None, progress: Progress | None) -> bool:
+    try:
+        async with async_session_maker() as db:
+            return await regenerate_draft(
+                db=db,
+                draft_id=draft_id,
+                mode=mode,
+                reference_image_urls=reference_image_urls,
+                progress=progress,
+            )
+    finally:
+        # A superseding flight (already registered) keeps the lease.
+        flight = _flights.get(draft_id)
+        if flight is None or flight.task is asyncio.current_task():
+            try:
+                async with async_session_maker() as db:
+                    await LeaseRepo(db).release(f"regen:{draft_id}", owner=_owner())
+            except Exception:
+                logger.exception("Regen: failed to release lease draft_id=%s", draft_id)
+
+
+async def regenerate_single_flight(
+    *,
+    draft_id: int,
+    mode: str,
+    reference_image_urls: list[str] | None = None,
+    progress: Progress | None = None,
+) -> RegenOutcome:
+    """Regenerate ``draft_id``, coalescing with a regeneration already running for it."""
+    if mode not in _PARTS:
+        mode = "regen_all"
+    parts = _PARTS[mode]
+    current = _flights.get(draft_id)
+    if (current is None or current.task.done()) and not await _lease(draft_id):
+        REGEN_REQUESTS_TOTAL.labels(outcome="joined").inc()
+        logger.info("Regen: draft_id=%s is regenerating in another process", draft_id)
+        return RegenOutcome(ok=False, mode=mode, joined=True)
+    # Re-read after the await; from here on nothing yields until the flight is registered.
+    current = _flights.get(draft_id)
+    joined = False
+    if current and not current.task.done():
+        running = _PARTS[current.mode]
+        if parts <= running:
+            joined = True
+            REGEN_REQUESTS_TOTAL.labels(outcome="joined").inc()
+            logger.info("Regen: draft_id=%s mode=%s joins running %s", draft_id, mode, current.mode)
+        else:
+            mode = _mode_of(parts | running)
+            logger.info("Regen: draft_id=%s %s superseded by %s", draft_id, current.mode, mode)
+            REGEN_REQUESTS_TOTAL.labels(outcome="superseded").inc()
+            current.task.cancel()
+            current = None
+    else:
+        current = None
+
+    if current is None:
+        task = asyncio.create_task(_run(draft_id, mode, reference_image_urls, progress))
+        current = _Flight(mode=mode, task=task)
+        _flights[draft_id] = current
+        REGEN_REQUESTS_TOTAL.labels(outcome="started").inc()
+
+    flight = current
+    try:
+        # shield: a cancelled handler must not cancel the shared regeneration.
+        ok = await asyncio.shield(flight.task)
+    except asyncio.CancelledError:
+        if flight.task.cancelled():
+            return RegenOutcome(ok=False, mode=flight.mode, joined=joined, superseded=True)
+        raise
+    finally:
+        if _flights.get(draft_id) is flight and flight.task.done():
+            _flights.pop(draft_id, None)
+    return RegenOutcome(ok=bool(ok), mode=flight.mode, joined=joined)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import logging
 from pathlib import Path
+from typing import Awaitable, Callable
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -10,6 +11,9 @@ from src.common.templates import DEFAULT_KIE_REGEN_TEMPLATE, DEFAULT_REWRITE_TEM
 from src.infra.db.repositories import DraftRepo, PromptTokenRepo, SettingRepo
 from src.infra.kie.client import KIEInsufficientCreditsError, KieClient
 from src.infra.openai.rewriter import OpenAIRewriter
+from src.infra.metrics.metrics import in_flight, record_failure
+from src.infra.resilience.breaker import CircuitOpenError
+from src.infra.tracing.tracer import span, traced
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +29,16 @@ async def _get_setting(db: AsyncSession, key: str, default: str) -> str:
     return default
 
 
+async def _report(progress: Callable[[str], Awaitable[None]] | None, stage: str) -> None:
+    """Progress is cosmetic (review message updates): never let it break regeneration."""
+    if progress is None:
+        return
+    try:
+        await progress(stage)
+    except Exception:
+        logger.warning("Regen: progress callback failed stage=%s", stage, exc_info=True)
+
+
 def _format_template(template: str, *, original_text: str) -> str:
     """Safely format templates that may include braces."""
     try:
@@ -33,12 +47,15 @@ def _format_template(template: str, *, original_text: str) -> str:
         return template + "\n\nИсходный текст: " + (original_text or "")
 
 
+@in_flight("regen")
+@traced("regen.draft")
 async def regenerate_draft(
     *,
     db: AsyncSession,
     draft_id: int,
     mode: str = "regen_all",
     reference_image_urls: list[str] | None = None,
+    progress: Callable[[str], Awaitable[None]] | None = None,
 ) -> bool:
     """Regenerate draft content.
 
@@ -47,6 +64,8 @@ async def regenerate_draft(
       - regen_cap: regenerate ONLY caption/prompt (keep images)
       - regen_all: regenerate both images and caption/prompt
 
+    ``progress`` is awaited with "kie", "openai" and "save" as the stages start.
+
     Returns True if something was updated.
     """
 
@@ -74,6 +93,7 @@ async def regenerate_draft(
         )
         kie_prompt = _format_template(kie_template, original_text=original_text)
 
+        await _report(progress, "kie")
         kie = KieClient()
         try:
             out_dir = Path("data/media") / f"draft_{d.source_chat_id}_{d.source_message_id}_regen"
@@ -84,23 +104,29 @@ async def regenerate_draft(
                 len(reference_image_urls or []),
                 settings.kie_model,
             )
-            new_paths = await kie.generate(
-                prompt=kie_prompt,
-                out_dir=str(out_dir),
-                n=1,
-                image_urls=reference_image_urls,
-                output_format=settings.kie_output_format,
-                image_size=settings.kie_image_size,
-            )
+            with span("kie.generate", ref_images=len(reference_image_urls or [])):
+                new_paths = await kie.generate(
+                    prompt=kie_prompt,
+                    out_dir=str(out_dir),
+                    n=1,
+                    image_urls=reference_image_urls,
+                    output_format=settings.kie_output_format,
+                    image_size=settings.kie_image_size,
+                )
             new_paths = (new_paths or [])[:1]
             if new_paths:
                 image_paths = new_paths
                 updated = True
             logger.info("Regen: KIE done draft_id=%s images=%s", draft_id, len(new_paths or []))
+        except CircuitOpenError as e:
+            logger.warning("Regen: KIE skipped draft_id=%s: %s", draft_id, e)
+            record_failure("kie", e)
         except KIEInsufficientCreditsError as e:
             logger.error("Regen: KIE credits insufficient draft_id=%s err=%s", draft_id, e)
+            record_failure("kie", e)
         except Exception as e:
             logger.exception("Regen: KIE failed draft_id=%s err=%s", draft_id, e)
+            record_failure("kie", e)
         finally:
             try:
                 await kie.close()
@@ -117,6 +143,7 @@ async def regenerate_draft(
     caption = d.caption
     promptika_prompt = d.image_prompt
     if mode in {"regen_cap", "regen_all"}:
+        await _report(progress, "openai")
         rewriter = OpenAIRewriter()
         rewrite_template = await _get_setting(
             db,
@@ -143,8 +170,12 @@ async def regenerate_draft(
             promptika_prompt = rr.promptika_prompt
             updated = True
             logger.info("Regen: OpenAI caption done draft_id=%s", draft_id)
+        except CircuitOpenError as e:
+            logger.warning("Regen: OpenAI caption skipped draft_id=%s: %s", draft_id, e)
+            record_failure("openai", e)
         except Exception as e:
             logger.exception("Regen: OpenAI caption failed draft_id=%s err=%s", draft_id, e)
+            record_failure("openai", e)
 
     # -----------------------------
     # 3) Persist only if something changed
@@ -157,6 +188,7 @@ async def regenerate_draft(
         caption = d.caption
         promptika_prompt = d.image_prompt
 
+    await _report(progress, "save")
     await drepo.update_content(
         draft_id,
         caption=caption,
@@ -6,6 +6,7 @@ from aiogram import Bot
 from src.common.config import settings
 from src.infra.db.repositories import DraftRepo, SettingRepo
 from src.infra.telegram.notifier import AdminNotifier
+from src.infra.tracing.tracer import span
 
 async def send_to_review(*, db: AsyncSession, bot: Bot, draft_id: int) -> None:
     repo = DraftRepo(db)
@@ -20,10 +21,16 @@ async def send_to_review(*, db: AsyncSession, bot: Bot, draft_id: int) -> None:
 
     image_paths = json.loads(d.image_paths_json)
     notifier = AdminNotifier(bot)
-    msg_id = await notifier.send_draft(
-        chat_id=chat_id,
-        draft_id=d.id,
-        caption=d.caption,
-        image_paths=image_paths,
-    )
+    with span("review.send", parent=d.trace_parent, draft_id=d.id):
+        if d.status == "choosing":
+            msg_id = await notifier.send_candidates(chat_id=chat_id, draft_id=d.id, image_paths=image_paths)
+            await repo.set_review_message(d.id, chat_id=chat_id, message_id=msg_id)
+            return
+        msg_id = await notifier.send_draft(
+            chat_id=chat_id,
+            draft_id=d.id,
+            caption=d.caption,
+            image_paths=image_paths,
+            compiled=d.compiled_caption,
+        )
     await repo.set_review_message(d.id, chat_id=chat_id, message_id=msg_id)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.infra.db.repositories import DraftTimingRepo
+
+logger = logging.getLogger(__name__)
+
+# Ledger stages in pipeline order: (key, label). kie_polls is a count, the rest are seconds.
+STAGES: list[tuple[str, str]] = [
+    ("capture_delay", "Захват"),
+    ("queue_wait", "Очередь ingest"),
+    ("kie", "KIE"),
+    ("kie_polls", "KIE опросы"),
+    ("openai", "OpenAI"),
+    ("to_review", "До модерации"),
+    ("approval_wait", "Ожидание одобрения"),
+    ("publish_wait", "Ожидание публикации"),
+    ("publish", "Публикация"),
+]
+COUNT_STAGES = {"kie_polls"}
+
+
+async def record_stage_timings(db: AsyncSession, draft_id: int, stages: dict[str, float]) -> None:
+    """Write stage timings to the draft's ledger; never fails the calling pipeline step."""
+    try:
+        await DraftTimingRepo(db).record(draft_id, stages)
+    except Exception:
+        logger.exception("Failed to record stage timings draft_id=%s stages=%s", draft_id, sorted(stages))
+        # The caller keeps using the session (e.g. the publish tick's draft loop).
+        try:
+            await db.rollback()
+        except Exception:
+            logger.exception("Failed to roll back after stage timings draft_id=%s", draft_id)
+
+
+def _fmt(stage: str, v: float) -> str:
+    if stage in COUNT_STAGES:
+        return f"{v:.0f}"
+    if v < 60:
+        return f"{v:.1f}с"
+    if v < 3600:
+        return f"{v / 60:.1f}м"
+    return f"{v / 3600:.1f}ч"
+
+
+async def stage_stats_report(db: AsyncSession) -> str:
+    """Panel report: p50/p95 per stage over the last day and week."""
+    now = datetime.utcnow()
+    stats = await DraftTimingRepo(db).percentiles({"day": now - timedelta(days=1), "week": now - timedelta(days=7)})
+    if not stats["week"]:
+        return "📈 Статистика\n\nЗа последнюю неделю данных нет."
+
+    lines = ["📈 Статистика (p50 / p95)", "", "Стадия: сутки | неделя"]
+    for key, label in STAGES:
+        cells = []
+        for period in ("day", "week"):
+            row = stats[period].get(key)
+            cells.append(f"{_fmt(key, row[1])} / {_fmt(key, row[2])} (n={row[0]})" if row else "—")
+        lines.append(f"• {label}: {cells[0]} | {cells[1]}")
+    return "\n".join(lines)